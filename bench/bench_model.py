@@ -0,0 +1,324 @@
+"""Micro-benchmarks for the hot paths in biljettbokning.model.
+
+Every benchmark runs over several carriage sizes (rows per carriage) or fleet
+sizes (trains or bookings) and the best time per operation is reported in
+nanoseconds. Results can be saved as a JSON baseline and later compared
+against, failing when an operation got slower than the allowed threshold.
+
+Examples:
+    python bench/bench_model.py --save bench/baseline.json
+    python bench/bench_model.py --compare bench/baseline.json --threshold 0.25
+"""
+
+import argparse
+from datetime import datetime
+from functools import partial
+import io
+import json
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+from typing import Callable, Optional
+
+from biljettbokning.model import (
+    Booking,
+    Bookings,
+    Carriage,
+    Fleet,
+    Train,
+    booked_seats,
+    save_trains,
+)
+from biljettbokning.terminal import Terminal
+
+CARRIAGE_ROWS = (5, 25, 100)
+FLEET_SIZES = (1, 10, 100)
+
+# A benchmark takes a size and returns (function to time, operations per call)
+Benchmark = Callable[[int], tuple[Callable[[], object], int]]
+
+
+def full_carriage(rows: int) -> Carriage:
+    car = Carriage("3+3", rows)
+    for seat_num in range(1, car.total_seats + 1):
+        car.book_passenger(f"Passagerare {seat_num}", seat_num)
+    return car
+
+
+def make_train(number: int, rows: int = 10, carriages: int = 4) -> Train:
+    return Train(
+        number,
+        datetime(2030, 1, 1, 12, 0),
+        datetime(2030, 1, 1, 15, 0),
+        "Stockholm C",
+        "Göteborg C",
+        [Carriage("3+3", rows, i + 1) for i in range(carriages)],
+    )
+
+
+def bench_get_seat_num(rows: int):
+    car = Carriage("3+3", rows)
+    seats = list(range(1, car.total_seats + 1))
+
+    def run():
+        for seat_num in seats:
+            car.get_seat_num(seat_num)
+
+    return run, len(seats)
+
+
+def bench_get_seat_name(rows: int):
+    car = full_carriage(rows)
+    # Worst case, the last seat
+    name = f"Passagerare {car.total_seats}"
+    return lambda: car.get_seat_name(name), 1
+
+
+def bench_remaining_seats(rows: int):
+    car = full_carriage(rows)
+    return lambda: car.remaining_seats, 1
+
+
+def bench_book_passenger(rows: int):
+    def run():
+        car = Carriage("3+3", rows)
+        for seat_num in range(1, car.total_seats + 1):
+            car.book_passenger("Passagerare", seat_num)
+
+    return run, rows * 6
+
+
+def bench_terminal_repr(rows: int):
+    train = make_train(1, rows)
+    for car in train.carriages:
+        for seat_num in range(1, car.total_seats + 1, 3):
+            car.book_passenger("Passagerare", seat_num)
+    return train.terminal_repr, 1
+
+
+def bench_snapshot(rows: int):
+    train = make_train(1, rows)
+    seat = train.carriages[0].get_seat_num(1)
+
+    def run():
+        # One carriage changed, the others are shared with the last version
+        seat.passenger_name = None if seat.is_booked() else "Passagerare"
+        train.snapshot()
+
+    return run, 1
+
+
+def bench_booking_str(_: int):
+    booking = Booking("Passagerare", 12, 3, make_train(1))
+    return booking.__str__, 1
+
+
+def bench_bookings_remove(size: int):
+    # size is the number of trains, with 10 bookings each
+    trains = [make_train(num) for num in range(size)]
+    bookings = Bookings()
+    for train in trains:
+        for seat_num in range(1, 11):
+            bookings.append(Booking("Passagerare", seat_num, 1, train))
+    last = bookings[len(bookings) - 1]
+
+    def run():
+        bookings.remove(last.train.number, last.carriage, last.seat)
+        bookings.append(last)
+
+    return run, 1
+
+
+def bench_passenger_search(size: int):
+    # size is the number of trains, every seat booked
+    fleet = Fleet([make_train(num) for num in range(size)])
+    for train in fleet:
+        for car in train.carriages:
+            for seat_num in range(1, car.total_seats + 1):
+                car.book_passenger(f"Passagerare {train.number} {seat_num}", seat_num)
+    return lambda: fleet.passengers.search("passagerare 1 1", limit=10), 1
+
+
+def bench_booked_seats(size: int):
+    # size is the number of trains, every third seat booked
+    trains = [make_train(num) for num in range(size)]
+    for train in trains:
+        for car in train.carriages:
+            for seat_num in range(1, car.total_seats + 1, 3):
+                car.book_passenger("Passagerare", seat_num)
+    return lambda: sum(1 for _ in booked_seats(trains)), size
+
+
+def bench_serialize(size: int):
+    trains = [make_train(num) for num in range(size)]
+
+    def run():
+        # A fresh directory each time, measures writing and not replacing
+        root = tempfile.mkdtemp()
+        for train in trains:
+            train.serialize(root)
+
+    return run, size
+
+
+def bench_save_trains(size: int):
+    trains = [make_train(num) for num in range(size)]
+    root = tempfile.mkdtemp()
+    save_trains(trains, root)
+    seat = trains[0].carriages[0].get_seat_num(1)
+
+    def run():
+        # One carriage of one train changed since the last save
+        seat.passenger_name = None if seat.is_booked() else "Passagerare"
+        save_trains(trains, root)
+
+    return run, 1
+
+
+def bench_from_file(size: int, codec: Optional[str] = None):
+    root = tempfile.mkdtemp()
+    for num in range(size):
+        make_train(num).serialize(root, codec)
+    paths = [f"{root}/train_{num}" for num in range(size)]
+
+    def run():
+        for path in paths:
+            Train.from_file(path)
+
+    return run, size
+
+
+def bench_terminal_batch(size: int):
+    # size is the number of commands, booking and unbooking every seat in turn
+    term = Terminal([make_train(152)])
+    seats = [(c, s) for c in range(1, 5) for s in range(1, 61)]
+    script = [f"boka 152 {c} {s} P{c}-{s}" for c, s in seats]
+    script += [f"avboka 152 {c} {s}" for c, s in seats]
+    script = (script * (size // len(script) + 1))[:size]
+    # Ends with every seat free, whatever size is
+    script += [f"avboka 152 {c} {s}" for c, s in seats]
+
+    return lambda: term.batch(script, io.StringIO()), len(script)
+
+
+BENCHMARKS: dict[str, tuple[Benchmark, str, tuple[int, ...]]] = {
+    "Carriage.get_seat_num": (bench_get_seat_num, "rows", CARRIAGE_ROWS),
+    "Carriage.get_seat_name": (bench_get_seat_name, "rows", CARRIAGE_ROWS),
+    "Carriage.remaining_seats": (bench_remaining_seats, "rows", CARRIAGE_ROWS),
+    "Carriage.book_passenger": (bench_book_passenger, "rows", CARRIAGE_ROWS),
+    "Train.terminal_repr": (bench_terminal_repr, "rows", CARRIAGE_ROWS),
+    "Train.snapshot": (bench_snapshot, "rows", CARRIAGE_ROWS),
+    "Booking.__str__": (bench_booking_str, "n", (1,)),
+    "Bookings.remove": (bench_bookings_remove, "trains", FLEET_SIZES),
+    "PassengerIndex.search": (bench_passenger_search, "trains", FLEET_SIZES),
+    "booked_seats": (bench_booked_seats, "trains", FLEET_SIZES),
+    "Train.serialize": (bench_serialize, "trains", FLEET_SIZES),
+    "save_trains": (bench_save_trains, "trains", FLEET_SIZES),
+    "Terminal.batch": (bench_terminal_batch, "commands", (480, 2400)),
+    "Train.from_file": (bench_from_file, "trains", FLEET_SIZES),
+    "Train.from_file(zlib)": (
+        partial(bench_from_file, codec="zlib"),
+        "trains",
+        FLEET_SIZES,
+    ),
+    "Train.from_file(lzma)": (
+        partial(bench_from_file, codec="lzma"),
+        "trains",
+        FLEET_SIZES,
+    ),
+}
+
+
+def measure(func: Callable[[], object], ops: int, repeat: int) -> float:
+    """Best time per operation in nanoseconds."""
+    timer = timeit.Timer(func)
+    # Pick a number of loops that takes about 0.2 s
+    loops, _ = timer.autorange()
+    return min(timer.repeat(repeat, loops)) / loops / ops * 1e9
+
+
+def run_all(pattern: str, repeat: int) -> dict[str, float]:
+    """Run every benchmark whose name contains pattern."""
+    results: dict[str, float] = {}
+    random.seed(0)
+    for name, (bench, param, sizes) in BENCHMARKS.items():
+        if pattern not in name:
+            continue
+        for size in sizes:
+            key = f"{name}[{param}={size}]"
+            func, ops = bench(size)
+            results[key] = measure(func, ops, repeat)
+            print(f"{key:<40} {results[key]:>14.1f} ns/op", file=sys.stderr)
+    return results
+
+
+def compare(baseline: dict[str, float], current: dict[str, float], threshold):
+    """Print a comparison and return the keys that regressed past threshold."""
+    regressed = []
+    for key, value in current.items():
+        if key not in baseline:
+            print(f"{key:<40} {'ny':>8}")
+            continue
+        ratio = value / baseline[key]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressed.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<40} {ratio:>7.2f}x{flag}")
+    # In the baseline but not measured now, renamed or removed
+    for key in baseline:
+        if key not in current:
+            print(f"{key:<40} {'saknas':>8}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--save", help="Save the results as a JSON baseline")
+    parser.add_argument("--compare", help="Compare against a JSON baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown as a fraction (default: 0.25)",
+    )
+    parser.add_argument("--filter", default="", help="Only run matching benchmarks")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    tempfile.tempdir = work_dir
+    try:
+        results = run_all(args.filter, args.repeat)
+    finally:
+        tempfile.tempdir = None
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "python": sys.version.split()[0],
+                    "platform": platform.platform(),
+                    "unit": "ns/op",
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressed = compare(baseline, results, args.threshold)
+        if regressed:
+            print(f"{len(regressed)} operation(er) blev långsammare än tillåtet")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""Load generator for the booking system.
+
+Builds a seeded synthetic fleet and lets N concurrent clients run a
+mix of single bookings, group bookings, unbookings by name and seat map
+renders against it. Throughput and p50/p95/p99 latency per operation are
+written as JSON so that releases can be compared.
+
+Targets:
+    inproc  clients are threads calling Fleet directly
+    server  clients are asyncio tasks using BookingClient against a
+            BookingServer (started locally unless --port is given)
+
+Example:
+    python bench/loadgen.py --target server --clients 32 --requests 20000 \\
+        --mix book=50,group=15,unbook=20,render=15 --output result.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import threading
+import time
+from typing import Optional
+
+from biljettbokning.generator import FleetConfig, generate
+from biljettbokning.model import Fleet
+from biljettbokning.server import BookingClient, BookingServer
+
+OPERATIONS = ("book", "group", "unbook", "render")
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    """Parse 'book=50,group=15,...' into normalised weights."""
+    weights: dict[str, float] = {}
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        if op not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {op}")
+        weights[op] = float(weight)
+
+    total = sum(weights.values())
+    if total <= 0:
+        raise argparse.ArgumentTypeError("The mix needs a positive weight")
+    return {op: weight / total for op, weight in weights.items()}
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def make_fleet(num_trains: int, seed: int) -> Fleet:
+    """Synthetic fleet, reproducible for a given seed."""
+    return Fleet(list(generate(num_trains, FleetConfig(seed=seed))))
+
+
+class Recorder:
+    """Collects latencies (in seconds) and error counts per operation."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {op: [] for op in OPERATIONS}
+        self.errors: dict[str, int] = {op: 0 for op in OPERATIONS}
+
+    def merge(self, other: "Recorder") -> None:
+        for op in OPERATIONS:
+            self.latencies[op].extend(other.latencies[op])
+            self.errors[op] += other.errors[op]
+
+    def report(self, elapsed: float) -> dict:
+        operations = {}
+        for op in OPERATIONS:
+            values = sorted(self.latencies[op])
+            if not values:
+                continue
+            operations[op] = {
+                "count": len(values),
+                "errors": self.errors[op],
+                "throughput_ops_s": len(values) / elapsed,
+                "mean_ms": 1000 * sum(values) / len(values),
+                "p50_ms": 1000 * percentile(values, 0.50),
+                "p95_ms": 1000 * percentile(values, 0.95),
+                "p99_ms": 1000 * percentile(values, 0.99),
+                "max_ms": 1000 * values[-1],
+            }
+
+        total = sum(len(values) for values in self.latencies.values())
+        return {
+            "elapsed_s": elapsed,
+            "total_ops": total,
+            "throughput_ops_s": total / elapsed,
+            "operations": operations,
+        }
+
+
+class Client:
+    """State of one simulated client: its random source and its bookings."""
+
+    def __init__(self, client_num: int, seed: int, trains: list[dict], mix):
+        self.num = client_num
+        self.rng = random.Random(seed * 1_000_003 + client_num)
+        self.trains = trains
+        self.ops = list(mix.keys())
+        self.weights = list(mix.values())
+        # (train number, carriage index, name) of bookings still held
+        self.held: list[tuple[int, int, str]] = []
+        self.counter = 0
+        self.recorder = Recorder()
+
+    def next_op(self) -> str:
+        op = self.rng.choices(self.ops, self.weights)[0]
+        # Nothing to unbook yet, book instead
+        if op == "unbook" and not self.held:
+            return "book"
+        return op
+
+    def name(self) -> str:
+        self.counter += 1
+        return f"Klient {self.num} Passagerare {self.counter}"
+
+    def pick_seat(self) -> tuple[int, int, int]:
+        """Random (train number, carriage index, seat number)."""
+        train = self.rng.choice(self.trains)
+        car_num = self.rng.randrange(len(train["seats"]))
+        return train["number"], car_num, self.rng.randint(1, train["seats"][car_num])
+
+    def pop_held(self) -> tuple[int, int, str]:
+        return self.held.pop(self.rng.randrange(len(self.held)))
+
+
+def requests_for(client_num: int, args) -> int:
+    """Requests client_num sends, the first clients take the remainder."""
+    per_client, remainder = divmod(args.requests, args.clients)
+    return per_client + (client_num < remainder)
+
+
+def train_layouts(fleet: Fleet) -> list[dict]:
+    """Train numbers and seats per carriage, all a client needs to know."""
+    return [
+        {"number": t.number, "seats": [car.total_seats for car in t.carriages]}
+        for t in fleet
+    ]
+
+
+def run_inproc(fleet: Fleet, args) -> dict:
+    """Run the clients as threads calling the fleet directly."""
+    layouts = train_layouts(fleet)
+    clients = [Client(i, args.seed, layouts, args.mix) for i in range(args.clients)]
+
+    def work(client: Client):
+        for _ in range(requests_for(client.num, args)):
+            op = client.next_op()
+            started = time.perf_counter()
+            try:
+                if op == "book":
+                    train_num, car_num, seat_num = client.pick_seat()
+                    name = client.name()
+                    fleet.book(train_num, car_num, seat_num, name)
+                    client.held.append((train_num, car_num, name))
+                elif op == "group":
+                    train_num, car_num, seat_num = client.pick_seat()
+                    names = [client.name() for _ in range(client.rng.randint(2, 5))]
+                    fleet.book_group(train_num, car_num, seat_num, names)
+                    client.held.extend((train_num, car_num, name) for name in names)
+                elif op == "unbook":
+                    fleet.unbook_passenger(*client.pop_held())
+                else:
+                    fleet.get_train(client.pick_seat()[0]).terminal_repr()
+            except (KeyError, IndexError, ValueError):
+                client.recorder.errors[op] += 1
+            client.recorder.latencies[op].append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=work, args=(c,)) for c in clients]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    recorder = Recorder()
+    for client in clients:
+        recorder.merge(client.recorder)
+    return recorder.report(elapsed)
+
+
+async def run_clients(host: str, port: int, layouts: list[dict], args) -> dict:
+    """Run the clients as asyncio tasks against a BookingServer."""
+    clients = [Client(i, args.seed, layouts, args.mix) for i in range(args.clients)]
+
+    async def work(client: Client):
+        async with BookingClient(host, port) as http:
+            for _ in range(requests_for(client.num, args)):
+                op = client.next_op()
+                started = time.perf_counter()
+                try:
+                    if op == "book":
+                        train_num, car_num, seat_num = client.pick_seat()
+                        name = client.name()
+                        await http.book(train_num, car_num + 1, seat_num, name)
+                        client.held.append((train_num, car_num, name))
+                    elif op == "group":
+                        train_num, car_num, seat_num = client.pick_seat()
+                        names = [client.name() for _ in range(client.rng.randint(2, 5))]
+                        await http.book_group(train_num, car_num + 1, seat_num, names)
+                        client.held.extend((train_num, car_num, n) for n in names)
+                    elif op == "unbook":
+                        train_num, car_num, name = client.pop_held()
+                        await http.unbook_passenger(train_num, car_num + 1, name)
+                    else:
+                        await http.seat_map(client.pick_seat()[0])
+                except BookingClient.Error:
+                    client.recorder.errors[op] += 1
+                client.recorder.latencies[op].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(work(client) for client in clients))
+    elapsed = time.perf_counter() - started
+
+    recorder = Recorder()
+    for client in clients:
+        recorder.merge(client.recorder)
+    return recorder.report(elapsed)
+
+
+def run_server(fleet: Optional[Fleet], args) -> dict:
+    """Run against an external server, or one started in a background thread."""
+    if args.port is not None:
+        # The fleet layout is read from the server itself
+        async def external():
+            async with BookingClient(args.host, args.port) as http:
+                layouts = [
+                    {
+                        "number": t["number"],
+                        "seats": [
+                            car["total_seats"]
+                            for car in (await http.seat_map(t["number"]))["carriages"]
+                        ],
+                    }
+                    for t in await http.search()
+                ]
+            return await run_clients(args.host, args.port, layouts, args)
+
+        return asyncio.run(external())
+
+    assert fleet is not None
+    loop = asyncio.new_event_loop()
+    server = BookingServer(fleet)
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        return asyncio.run(
+            run_clients(server.host, server.port, train_layouts(fleet), args)
+        )
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=("inproc", "server"), default="inproc")
+    parser.add_argument("--trains", type=int, default=50, help="Trains in the fleet")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=10_000, help="Total requests")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default="book=50,group=15,unbook=20,render=15",
+        help="Weights per operation (book, group, unbook, render)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument(
+        "--port", type=int, help="Use a running server instead of starting one"
+    )
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+    if isinstance(args.mix, str):
+        args.mix = parse_mix(args.mix)
+
+    fleet = None if args.port is not None else make_fleet(args.trains, args.seed)
+
+    if args.target == "inproc":
+        if fleet is None:
+            parser.error("--port can only be used with --target server")
+        result = run_inproc(fleet, args)
+    else:
+        result = run_server(fleet, args)
+
+    report = {
+        "config": {
+            "target": args.target,
+            "trains": args.trains,
+            "clients": args.clients,
+            "requests": args.requests,
+            "mix": args.mix,
+            "seed": args.seed,
+        },
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        **result,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Startup time of the package's entry points.
+
+Every entry point is imported in a fresh interpreter, several times, and the
+best import time is reported. Also shows if tkinter was loaded, which only the
+GUI should do.
+
+Example:
+    python bench/startup.py --repeat 10
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+ENTRY_POINTS = (
+    "biljettbokning",
+    "biljettbokning.model",
+    "biljettbokning.terminal",
+    "biljettbokning.importer",
+    "biljettbokning.generator",
+    "biljettbokning.server",
+    "biljettbokning.shard",
+    "biljettbokning.memory",
+    "biljettbokning.app",
+)
+
+# Measured inside the child so that process creation is not part of the time
+_CHILD = """
+import sys, time
+started = time.perf_counter()
+{imports}
+print(time.perf_counter() - started, "tkinter" in sys.modules)
+"""
+
+
+def import_time(module: str, repeat: int) -> tuple[float, bool]:
+    """Best seconds to import module in a new interpreter, and if it loaded Tk."""
+    code = _CHILD.format(imports=f"import {module}" if module else "")
+    best = float("inf")
+    loads_tk = False
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        ).stdout.split()
+        best = min(best, float(out[0]))
+        loads_tk = out[1] == "True"
+    return best, loads_tk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Skriv ut som JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for module in ENTRY_POINTS:
+        seconds, loads_tk = import_time(module, args.repeat)
+        results[module] = {"ms": 1000 * seconds, "tkinter": loads_tk}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for module, result in results.items():
+        tk = "  (tkinter)" if result["tkinter"] else ""
+        print(f"{module:<28} {result['ms']:>8.1f} ms{tk}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,27 @@
 import sys
-from typing import NoReturn
-from biljettbokning.app import App
+from typing import TYPE_CHECKING, NoReturn
+
+# The GUI is only imported when it is used, so that the model, storage and
+# terminal entry points start without loading tkinter and the widgets.
+if TYPE_CHECKING:
+    from biljettbokning.app import App
 
 
 def launch() -> NoReturn:
+    from biljettbokning.app import App  # pylint: disable=C0415,W0621
+
     app = App()
     app.mainloop()
     sys.exit(1)
 
 
+def __getattr__(name: str):
+    if name == "App":
+        from biljettbokning.app import App  # pylint: disable=C0415,W0621
+
+        return App
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == "__main__":
     launch()
@@ -0,0 +1,225 @@
+"""Load factor analytics for a whole fleet.
+
+Works on the occupancy bitmask of every Carriage (Carriage.occupied) instead of
+on Seat objects, so the work grows with the number of carriages and not with
+the number of seats. Aggregates are computed with NumPy when it is installed
+and with plain Python otherwise, both give the same numbers.
+
+Reported are the load factor (booked / total seats) of the fleet, per train,
+per route and per departure hour, and for every seating configuration a
+heatmap of how often each position (row, seat in row) is booked.
+
+Usage:
+    python -m biljettbokning.analytics <katalog med sparade tåg> [--json]
+"""
+
+import argparse
+from collections import defaultdict
+import json
+from typing import Any, Iterable, Optional
+
+from biljettbokning.model import Carriage, Fleet, Train
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+
+# Byte value -> its 8 bits spread out to one 32 bit counter each, summing
+# spread bytes counts the set bits of every position in parallel
+_LANE = 32
+_SPREAD = [
+    sum(1 << (_LANE * i) for i in range(8) if byte >> i & 1) for byte in range(256)
+]
+
+
+def _ratio(booked: float, total: float) -> float:
+    return booked / total if total else 0.0
+
+
+class Occupancy:
+    """Occupancy of a fleet as flat per carriage arrays.
+
+    Attributes:
+        trains (list[Train]): The trains, in the order of their index
+        booked (list[int]): Booked seats per carriage
+        total (list[int]): Seats per carriage
+        train_index (list[int]): Index in trains of the train of each carriage
+        layouts (dict[str, list[Carriage]]): Carriages per seating configuration
+
+    Instance methods:
+        per_train() -> dict[int, float]: Load factor per train number
+        per_route() -> dict[str, float]: Load factor per "start -> dest"
+        per_hour() -> dict[int, float]: Load factor per departure hour
+        heatmap(layout) -> list[list[float]]: Booked fraction per row and seat
+        report() -> dict: All of the above and totals
+    """
+
+    def __init__(self, trains: Iterable[Train], use_numpy: Optional[bool] = None):
+        """Collect the occupancy of the trains.
+
+        Args:
+            trains (Iterable[Train]): Trains to analyse
+            use_numpy (Optional[bool]): Force NumPy on or off (default: if installed)
+        """
+        if use_numpy and np is None:
+            raise ImportError("NumPy is not installed")
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+
+        self.trains = list(trains)
+        self.booked: list[int] = []
+        self.total: list[int] = []
+        self.train_index: list[int] = []
+        self.layouts: dict[str, list[Carriage]] = defaultdict(list)
+
+        for index, train in enumerate(self.trains):
+            for car in train.carriages:
+                self.booked.append(car.occupied.bit_count())
+                self.total.append(car.total_seats)
+                self.train_index.append(index)
+                self.layouts[car.seating_configuration].append(car)
+
+    def _sum_by(self, keys: list[int], size: int) -> tuple[list[float], list[float]]:
+        """Booked and total seats summed per key, keys given per carriage."""
+        if self.use_numpy:
+            booked = np.bincount(keys, weights=self.booked, minlength=size)
+            total = np.bincount(keys, weights=self.total, minlength=size)
+            return booked.tolist(), total.tolist()
+
+        booked_sums = [0.0] * size
+        total_sums = [0.0] * size
+        for key, booked, total in zip(keys, self.booked, self.total):
+            booked_sums[key] += booked
+            total_sums[key] += total
+        return booked_sums, total_sums
+
+    def _grouped(self, group_of_train: list[Any]) -> dict[Any, float]:
+        """Load factor per group, given the group of every train."""
+        groups = list(dict.fromkeys(group_of_train))
+        ids = {group: i for i, group in enumerate(groups)}
+        keys = [ids[group_of_train[index]] for index in self.train_index]
+        booked, total = self._sum_by(keys, len(groups))
+        return {group: _ratio(booked[i], total[i]) for i, group in enumerate(groups)}
+
+    def per_train(self) -> dict[int, float]:
+        return self._grouped([train.number for train in self.trains])
+
+    def per_route(self) -> dict[str, float]:
+        return self._grouped(
+            [f"{train.start} -> {train.dest}" for train in self.trains]
+        )
+
+    def per_hour(self) -> dict[int, float]:
+        return dict(
+            sorted(self._grouped([t.departure.hour for t in self.trains]).items())
+        )
+
+    def heatmap(self, layout: str) -> list[list[float]]:
+        """Fraction of the carriages with the layout that have each seat booked.
+
+        Carriages have different numbers of rows, each row is divided by the
+        number of carriages that have it.
+        """
+        carriages = self.layouts[layout]
+        width = carriages[0].total_seats_in_row
+        num_rows = max(car.num_rows for car in carriages)
+
+        # Number of carriages with at least r + 1 rows
+        having = [0] * num_rows
+        for car in carriages:
+            having[car.num_rows - 1] += 1
+        for r in range(num_rows - 2, -1, -1):
+            having[r] += having[r + 1]
+
+        size = (num_rows * width + 7) // 8
+        if self.use_numpy:
+            data = b"".join(car.occupied.to_bytes(size, "little") for car in carriages)
+            bits = np.unpackbits(
+                np.frombuffer(data, dtype=np.uint8).reshape(len(carriages), size),
+                axis=1,
+                bitorder="little",
+            )[:, : num_rows * width]
+            counts = bits.sum(axis=0).tolist()
+        else:
+            lanes = [0] * size
+            for car in carriages:
+                for k, byte in enumerate(car.occupied.to_bytes(size, "little")):
+                    if byte:
+                        lanes[k] += _SPREAD[byte]
+            mask = (1 << _LANE) - 1
+            counts = [
+                (lanes[p >> 3] >> (_LANE * (p & 7))) & mask
+                for p in range(num_rows * width)
+            ]
+
+        return [
+            [counts[r * width + c] / having[r] for c in range(width)]
+            for r in range(num_rows)
+        ]
+
+    def report(self) -> dict[str, Any]:
+        booked, total = sum(self.booked), sum(self.total)
+        return {
+            "fleet": {
+                "trains": len(self.trains),
+                "booked": booked,
+                "seats": total,
+                "load_factor": _ratio(booked, total),
+            },
+            "trains": self.per_train(),
+            "routes": self.per_route(),
+            "hours": self.per_hour(),
+            "heatmaps": {
+                layout: self.heatmap(layout) for layout in sorted(self.layouts)
+            },
+        }
+
+
+def occupancy_report(trains: Iterable[Train], use_numpy: Optional[bool] = None) -> dict:
+    """Load factors of the fleet, see Occupancy.report."""
+    return Occupancy(trains, use_numpy).report()
+
+
+def format_report(report: dict, top: int = 10) -> str:
+    """Human readable text of a report from occupancy_report."""
+    fleet = report["fleet"]
+    lines = [
+        "Beläggning",
+        "",
+        f"{fleet['trains']} tåg, {fleet['booked']} av {fleet['seats']} platser bokade "
+        f"({100 * fleet['load_factor']:.1f} %)",
+        "",
+        "Per avgångstimme:",
+    ]
+    for hour, load in report["hours"].items():
+        lines.append(f"  {hour:02}:00  {100 * load:5.1f} %  {'#' * round(20 * load)}")
+
+    lines += ["", f"Mest belagda sträckor (topp {top}):"]
+    routes = sorted(report["routes"].items(), key=lambda item: item[1], reverse=True)
+    for route, load in routes[:top]:
+        lines.append(f"  {100 * load:5.1f} %  {route}")
+
+    for layout, rows in report["heatmaps"].items():
+        lines += ["", f"Bokade platser per position, {layout}:"]
+        for r, row in enumerate(rows, 1):
+            lines.append(f"  rad {r:>2}: " + " ".join(f"{100 * v:3.0f}" for v in row))
+
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Beläggning för alla tåg")
+    parser.add_argument("directory", help="Katalog med sparade tåg")
+    parser.add_argument("--json", action="store_true", help="Skriv ut som JSON")
+    parser.add_argument("--no-numpy", action="store_true", help="Räkna utan NumPy")
+    args = parser.parse_args()
+
+    fleet = Fleet.from_directory(args.directory)
+    report = occupancy_report(fleet, False if args.no_numpy else None)
+
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,29 @@ import glob
 import os
 import random
 import sys
+from typing import Any, Callable, Optional
 import tkinter as tk
 from tkinter import messagebox
 from tkinter import filedialog
 from tkinter import ttk
 
+from biljettbokning import analytics, compression
+from biljettbokning.commandlog import (
+    CommandLog,
+    is_waitlist_change,
+    waitlist_carriage,
+)
+from biljettbokning.memory import fleet_report, format_report
+from biljettbokning.metrics import METRICS, dump_path, timer
+from biljettbokning.tracing import Watchdog, instrument_dialogs, span, traced
 from biljettbokning.widgets.bookingpopup import BookingPopup
 from biljettbokning.widgets.menuframe import MenuFrame
-from biljettbokning.model import Booking, Bookings, Train
+from biljettbokning.model import Booking, Bookings, Train, booked_seats, save_trains
+from biljettbokning.names import NAMES
+from biljettbokning.passengers import PassengerIndex
+from biljettbokning.widgets.progresspopup import ProgressPopup
 from biljettbokning.widgets.unbookingpopup import UnbookingPopup
+from biljettbokning.worker import Cancelled, Job, Worker
 
 
 class App(tk.Tk):
@@ -20,6 +34,9 @@ class App(tk.Tk):
     Attributes:
         trains (list[Train]): list of all trains in the current run
         bookings (list[Booking]): list of all active bookings made in the current run
+        command_log (CommandLog): bookings and unbookings made in the popups, for undo/redo
+        worker (Worker): Runs loading, saving and printing without freezing the window
+        passengers (PassengerIndex): Prefix index of the passengers of all trains, for search as you type
     """
 
     def __init__(self):
@@ -27,12 +44,30 @@ class App(tk.Tk):
 
         # Bind the exit function to window close button.
         self.protocol("WM_DELETE_WINDOW", self.exit)
+        # Write a metrics snapshot on demand
+        self.bind("<F12>", lambda _: self.dump_metrics())
+        # Show memory used by trains and bookings
+        self.bind("<F11>", lambda _: self.memory_report())
+        # Show load factors of the trains
+        self.bind("<F10>", lambda _: self.occupancy_report())
+        # Undo and redo bookings, from any window
+        self.bind_all("<Control-z>", lambda _: self.undo())
+        self.bind_all("<Control-y>", lambda _: self.redo())
+
+        # Report callbacks and freezes that block the main loop
+        instrument_dialogs()
+        self.watchdog = Watchdog(self)
+        self.watchdog.start()
+        # File I/O happens here, results come back through after()
+        self.worker = Worker(self)
 
         # Minimise
         self.withdraw()
 
         self.trains: list[Train] = []
         self.bookings = Bookings()
+        self.command_log = CommandLog()
+        self.passengers = PassengerIndex()
 
         # Create popup to ask wether to load trains
         self.popup = tk.Toplevel()
@@ -60,6 +95,8 @@ class App(tk.Tk):
     def finish_window(self):
         """Cleanup after trains have been loaded/randomised."""
         self.trains.sort()
+        for train in self.trains:
+            self.passengers.watch(train)
         self.popup.grab_release()
         self.popup.destroy()
         self.deiconify()
@@ -67,10 +104,50 @@ class App(tk.Tk):
         self.menu_frame = MenuFrame(self)
         self.menu_frame.pack(expand=True, fill="both")
 
+    def run_in_background(
+        self, func: Callable[..., Any], *args, title: str, on_done: Callable[[Any], Any]
+    ) -> Job:
+        """Run func(job, *args) on the worker while a progress popup is shown.
+
+        on_done gets the result on the main loop. Errors are shown to the user,
+        a cancelled job only closes the popup.
+        """
+        popup = ProgressPopup(self, title)
+
+        def done(result):
+            popup.destroy()
+            on_done(result)
+
+        def failed(error: BaseException):
+            popup.destroy()
+            if not isinstance(error, Cancelled):
+                messagebox.showerror("Något gick fel!", str(error))
+
+        popup.job = self.worker.submit(
+            func,
+            *args,
+            description=title,
+            on_done=done,
+            on_error=failed,
+            on_progress=popup.update_progress,
+        )
+        return popup.job
+
+    @traced()
     def load_trains(self):
-        """Ask where the trains are and load them into App."""
+        """Ask where the trains are and load them into App in the background."""
         load_dir = filedialog.askdirectory(mustexist=True)
+        if not load_dir:
+            return
+
+        self.run_in_background(
+            self.read_trains, load_dir, title="Läser tåg", on_done=self.trains_loaded
+        )
 
+    @staticmethod
+    def read_trains(job: Job, load_dir: str) -> tuple[list[Train], int, Bookings]:
+        """Runs on the worker, returns the trains that have not departed, the
+        number of departed trains and the bookings on the rest."""
         # Collect all directories in the specified place
         # Each is a train
         train_paths = [
@@ -80,18 +157,25 @@ class App(tk.Tk):
         ]
 
         # Load trains
-        for train_path in train_paths:
-            self.trains.append(Train.from_file(train_path))
+        trains = []
+        with timer("load", "App.load_trains"):
+            for done, train_path in enumerate(train_paths, 1):
+                trains.append(Train.from_file(train_path))
+                job.progress(done, len(train_paths))
 
-        # Get amount of trains
-        cur_trains_amount = len(self.trains)
         # Remove all departed
-        self.trains = [
-            train for train in self.trains if train.departure > datetime.now()
-        ]
+        departing = [train for train in trains if train.departure > datetime.now()]
+        # Bookings made in earlier runs, on the trains that are left
+        bookings = Bookings.load(load_dir, departing)
+        return departing, len(trains) - len(departing), bookings
+
+    @traced()
+    def trains_loaded(self, loaded: tuple[list[Train], int, Bookings]):
+        """Replace departed trains with random ones and show the main menu."""
+        self.trains, departed, self.bookings = loaded
 
         # If departed trains exist
-        if (cur_trains_amount - len(self.trains)) > 0:
+        if departed > 0:
             # Get all already used train numbers
             cur_nums = [train.number for train in self.trains]
             # Get all possible nums
@@ -100,13 +184,15 @@ class App(tk.Tk):
             for num in cur_nums:
                 nums.remove(num)
             # Take enough nums
-            new_nums = random.sample(nums, cur_trains_amount - len(self.trains))
+            new_nums = random.sample(nums, departed)
             # Make new trains
-            for num in new_nums:
-                self.trains.append(Train.random(num))
+            with span("random trains"):
+                for num in new_nums:
+                    self.trains.append(Train.random(num))
 
         # Cleanup
-        self.finish_window()
+        with span("main menu"):
+            self.finish_window()
 
     def rand_trains(self):
         """Populate the train list with random trains"""
@@ -174,54 +260,76 @@ class App(tk.Tk):
         exit_button = ttk.Button(window, text="Tillbaka", command=window.destroy)
         exit_button.grid(column=2, row=1, padx=(5, 10), pady=5)
 
+    @traced()
     def output_all_tickets(self, window):
         """Ask for destination and print all tickets to specified folder"""
         dir_path = filedialog.askdirectory()
-        # "The unholy indent" iterates over every seat in the current app state and prints them to files
-        # Givet that tehre are bookings in them
-        for train in self.trains:
-            for car_num, car in enumerate(train.carriages):
-                for seat in car._flat_seats:  # pylint: disable=W0212
-                    if seat.is_booked():
-                        with open(
-                            # Make filepath as Tåg NN - YYYY-MM-DD HH.MM - Name Namesson - seat car.txt
-                            # Last part is for guaranteed uniqueness
-                            os.path.join(
-                                dir_path,
-                                f"Tåg {train.number}"
-                                " - "
-                                f"{train.departure.isoformat(" ", "minutes").replace(":", "")}"
-                                " - "
-                                f"{seat.passenger_name}"
-                                f" - {seat.number} {car_num+1}.txt",
-                            ),
-                            "w",
-                            encoding="utf-8",
-                        ) as f:
-                            f.write(
-                                str(
-                                    Booking(
-                                        (
-                                            seat.passenger_name
-                                            if seat.passenger_name
-                                            else ""  # Only for type securty, never happens (is_booked == True) # noqa
-                                        ),
-                                        seat.number,
-                                        car_num,
-                                        train,
-                                    )
-                                )
-                            )
-
         # Remove popup
         window.destroy()
+        if not dir_path:
+            return
 
+        self.run_in_background(
+            self.write_all_tickets,
+            dir_path,
+            list(self.trains),
+            title="Skriver biljetter",
+            on_done=lambda _: None,
+        )
+
+    @staticmethod
+    def write_all_tickets(job: Job, dir_path: str, trains: list[Train]) -> None:
+        """Runs on the worker, writes a ticket for every booked seat of the trains."""
+        # Only the booked seats are visited, see booked_seats
+        for done, train in enumerate(trains, 1):
+            for seat in booked_seats([train]):
+                booking = seat.booking()
+                # Leg bookings are told apart by their stops
+                legs = (
+                    f" {booking.from_stop}-{booking.to_stop}"
+                    if booking.from_stop
+                    else ""
+                )
+                with open(
+                    # Make filepath as Tåg NN - YYYY-MM-DD HH.MM - Name Namesson - seat car.txt
+                    # Last part is for guaranteed uniqueness
+                    os.path.join(
+                        dir_path,
+                        f"Tåg {seat.train.number}"
+                        " - "
+                        f"{seat.train.departure.isoformat(" ", "minutes").replace(":", "")}"
+                        " - "
+                        f"{booking.name}"
+                        f" - {booking.seat} {booking.carriage}{legs}.txt",
+                    ),
+                    "w",
+                    encoding="utf-8",
+                ) as f:
+                    f.write(str(booking))
+            job.progress(done, len(trains))
+
+    @traced()
     def output_current_tickets(self, window):
         """Ask user for destination and output only the tickets that are stored in the apps current run."""
         dir_path = filedialog.askdirectory(mustexist=True)
+        # Destroy popup
+        window.destroy()
+        if not dir_path:
+            return
 
+        self.run_in_background(
+            self.write_tickets,
+            dir_path,
+            list(self.bookings),
+            title="Skriver biljetter",
+            on_done=lambda _: None,
+        )
+
+    @staticmethod
+    def write_tickets(job: Job, dir_path: str, bookings: list[Booking]) -> None:
+        """Runs on the worker, writes a ticket for every booking."""
         # Iterate over bookings and print
-        for booking in self.bookings:
+        for done, booking in enumerate(bookings, 1):
             with open(
                 # Make filepath as Tåg NN - YYYY-MM-DD HH.MM - Name Namesson - seat car.txt
                 # Last part is for guaranteed uniqueness
@@ -238,19 +346,149 @@ class App(tk.Tk):
                 encoding="utf-8",
             ) as f:
                 f.write(str(booking))
+            job.progress(done, len(bookings))
+
+    def apply_change(
+        self,
+        train_num: int,
+        carriage_num: int,
+        seat_num: int,
+        expected: Optional[str],
+        name: Optional[str],
+    ):
+        """Set a seat and its booking, for the command log (see Fleet.apply_change)."""
+        train = next(train for train in self.trains if train.number == train_num)
+        if is_waitlist_change(seat_num):
+            queue = waitlist_carriage(carriage_num, seat_num)
+            if expected:
+                train.waitlist.take(expected, queue)
+            if name:
+                train.waitlist.push_front(name, queue)
+            return
+        seat = train.carriages[carriage_num].get_seat_num(seat_num)
+        if seat.name_id != NAMES.lookup(expected):
+            raise ValueError(f"Seat {seat_num} has changed")
+
+        if expected:
+            try:
+                self.bookings.remove(train_num, carriage_num + 1, seat_num)
+            except ValueError:
+                pass
+            # Not through the train, undo must not hand the seat to the waitlist
+            train.carriages[carriage_num].unbook_seat(seat_num)
+        if name:
+            train.book_passenger(carriage_num, seat_num, name)
+            self.bookings.append(
+                Booking(name, seat_num, carriage_num + 1, train.snapshot())
+            )
 
-        # Destroy popup
-        window.destroy()
+    def undo(self):
+        """Undo the latest booking or unbooking."""
+        self._replay(self.command_log.undo, "Inget att ångra.")
+
+    def redo(self):
+        """Redo the latest undone booking or unbooking."""
+        self._replay(self.command_log.redo, "Inget att göra om.")
+
+    def _replay(self, operation, nothing_message: str):
+        try:
+            operation(self)
+        except IndexError:
+            messagebox.showinfo("Ångra", nothing_message)
+            return
+        except ValueError:
+            messagebox.showerror(
+                "Kan inte ångra!", "Platsen har ändrats sedan dess, ändra den manuellt."
+            )
+            return
 
+        # Show the change in open popups
+        for window in self.winfo_children():
+            if hasattr(window, "seat_map"):
+                window.seat_map.refresh()  # type: ignore
+
+    def dump_metrics(self):
+        """Write a snapshot of the recorded metrics to file."""
+        if not METRICS.enabled:
+            messagebox.showinfo(
+                "Mätning avstängd",
+                "Sätt miljövariabeln BILJETTBOKNING_METRICS för att mäta anrop.",
+            )
+            return
+
+        path = dump_path() or filedialog.asksaveasfilename(
+            defaultextension=".prom",
+            filetypes=[("Prometheus", "*.prom"), ("JSON", "*.json")],
+        )
+        if path:
+            METRICS.dump(path)
+
+    def memory_report(self):
+        """Show how much memory the trains and bookings of this run use."""
+        report = format_report(fleet_report(self.trains, self.bookings))
+        messagebox.showinfo("Minnesanvändning", report)
+
+    def occupancy_report(self):
+        """Show the load factors of the trains of this run."""
+        report = analytics.format_report(analytics.occupancy_report(self.trains))
+        messagebox.showinfo("Beläggning", report)
+
+    @traced()
     def exit(self):
-        """Ask wether to save trains and close the program."""
-        save_trains = messagebox.askyesno("Spara tåg?", "Vill du spara tågen?")
+        """Ask wether to save trains and close the program.
 
-        if save_trains:
-            save_dir = filedialog.askdirectory()
-            for train in self.trains:
-                train.serialize(save_dir)
+        Saving runs in the background, the program closes when it is done and
+        stays open if it is cancelled or fails.
+        """
+        save = messagebox.askyesno("Spara tåg?", "Vill du spara tågen?")
 
+        if save:
+            save_dir = filedialog.askdirectory()
+            try:
+                codec = compression.default_codec()
+            except ValueError as e:
+                messagebox.showerror(
+                    "Ogiltig komprimering!",
+                    f"{compression.ENV_VARIABLE} kan inte användas ({e}).",
+                )
+                return
+            # Empty if the user cancelled, only changed trains are written
+            if save_dir:
+                self.run_in_background(
+                    self.save_all,
+                    save_dir,
+                    codec,
+                    list(self.trains),
+                    self.bookings,
+                    title="Sparar tåg",
+                    on_done=lambda _: self.close(),
+                )
+                return
+
+        self.close()
+
+    @staticmethod
+    def save_all(
+        job: Job,
+        save_dir: str,
+        codec: Optional[str],
+        trains: list[Train],
+        bookings: Bookings,
+    ) -> None:
+        """Runs on the worker, saves the changed trains and the bookings."""
+        with timer("save", "App.exit"):
+            save_trains(trains, save_dir, codec=codec, progress=job.progress)
+            bookings.save(save_dir, codec)
+
+    def close(self):
+        """Close the program without asking."""
+        self.worker.shutdown()
+
+        # Keep the metrics of this run if they are being recorded
+        if METRICS.enabled and dump_path():
+            METRICS.dump(dump_path())  # type: ignore
+
+        self.watchdog.stop()
         self.destroy()
         sys.exit(0)
 
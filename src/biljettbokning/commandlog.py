@@ -0,0 +1,253 @@
+"""Log of booking operations with undo and redo.
+
+Every operation is stored as the seats it changed, one Change per seat:
+(train number, carriage index starting at 0, seat number, old name, new name),
+where a name of None is an empty seat. A booking is (t, c, s, None, name), an
+unbooking (t, c, s, name, None) and a group booking one operation of several
+changes. Undoing applies the changes backwards with old and new swapped.
+
+A seat freed by an unbooking may go to a passenger from the train's waitlist.
+Taking them off the waitlist is a change too, of the seat number WAITLIST_SEAT
+(their queue was for the carriage) or WAITLIST_ANY_SEAT (for any carriage):
+(t, c, WAITLIST_SEAT, name, None) takes name off the head of the queue and its
+inverse puts them back first. See unbooking.
+
+The log applies changes through a target with the method
+    apply_change(train_num, carriage_num, seat_num, expected, name)
+which sets the seat to name if it currently holds expected (Fleet and App).
+
+Listeners get every operation as it is done, undone or redone, with the
+changes that were actually applied, which makes the log usable as an audit
+or replication stream (see JsonLinesWriter and replay). They are called in
+the order the operations were recorded. Callers holding carriage locks record
+with flush=False and call flush once the locks are released, so that slow
+listeners (file I/O) never block bookings.
+"""
+
+from collections import deque
+import json
+import threading
+from typing import IO, Callable, Iterable, Optional, Protocol
+
+from biljettbokning.waitlist import WaitlistEntry
+
+Change = tuple[int, int, int, Optional[str], Optional[str]]
+
+# Seat numbers of changes to the head of a waitlist queue, never real seats
+WAITLIST_SEAT = 0
+WAITLIST_ANY_SEAT = -1
+
+# Called with "do", "undo" or "redo" and the applied changes
+Listener = Callable[[str, tuple[Change, ...]], None]
+
+
+class ChangeTarget(Protocol):
+    def apply_change(
+        self,
+        train_num: int,
+        carriage_num: int,
+        seat_num: int,
+        expected: Optional[str],
+        name: Optional[str],
+    ) -> None: ...
+
+
+def waitlist_carriage(carriage_num: int, seat_num: int) -> Optional[int]:
+    """The waitlist queue a change with WAITLIST_SEAT or WAITLIST_ANY_SEAT is about."""
+    return carriage_num if seat_num == WAITLIST_SEAT else None
+
+
+def is_waitlist_change(seat_num: int) -> bool:
+    return seat_num in (WAITLIST_SEAT, WAITLIST_ANY_SEAT)
+
+
+def unbooking(
+    train_num: int,
+    carriage_num: int,
+    seat_num: int,
+    name: Optional[str],
+    waiting: Optional[WaitlistEntry],
+) -> list[Change]:
+    """Changes of unbooking name, whose seat went to waiting from the waitlist.
+
+    Args:
+        name (Optional[str]): Passenger who had the seat, None if it was empty
+        waiting (Optional[WaitlistEntry]): Entry taken off the waitlist, if any
+    """
+    changes: list[Change] = []
+    if name:
+        changes.append((train_num, carriage_num, seat_num, name, None))
+    if waiting is not None:
+        queue = WAITLIST_ANY_SEAT if waiting.carriage_num is None else WAITLIST_SEAT
+        changes.append((train_num, carriage_num, queue, waiting.name, None))
+        changes.append((train_num, carriage_num, seat_num, None, waiting.name))
+    return changes
+
+
+def inverse(changes: tuple[Change, ...]) -> tuple[Change, ...]:
+    """Changes that undo changes, in reverse order."""
+    return tuple((t, c, s, new, old) for t, c, s, old, new in reversed(changes))
+
+
+def apply_changes(target: ChangeTarget, changes: Iterable[Change]) -> None:
+    """Apply all changes or, if one fails, none of them.
+
+    Raises:
+        ValueError: If a seat does not hold the expected name
+    """
+    applied: list[Change] = []
+    try:
+        for change in changes:
+            target.apply_change(*change)
+            applied.append(change)
+    except Exception:
+        for change in inverse(tuple(applied)):
+            target.apply_change(*change)
+        raise
+
+
+class CommandLog:
+    """Undo and redo stacks of booking operations.
+
+    Attributes:
+        limit (int): Number of operations that can be undone at most
+
+    Instance methods:
+        record(changes, flush) -> None: Add an operation that was just done
+        flush() -> None: Hand recorded operations to the listeners
+        undo(target) -> tuple[Change, ...]: Undo the latest operation
+        redo(target) -> tuple[Change, ...]: Redo the latest undone operation
+        subscribe(listener) -> None: Get every operation as it happens
+    """
+
+    def __init__(self, limit: int = 1000):
+        self.limit = limit
+        self._undo: deque[tuple[Change, ...]] = deque(maxlen=limit)
+        self._redo: list[tuple[Change, ...]] = []
+        self._listeners: list[Listener] = []
+        # Operations not yet handed to the listeners, in order
+        self._pending: deque[tuple[str, tuple[Change, ...]]] = deque()
+        self._lock = threading.Lock()
+        # Held while calling listeners, keeps the operations in order
+        self._flush_lock = threading.Lock()
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def subscribe(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    def _notify(self, kind: str, changes: tuple[Change, ...]) -> None:
+        with self._lock:
+            self._pending.append((kind, changes))
+        self.flush()
+
+    def flush(self) -> None:
+        """Hand every recorded operation not handed yet to the listeners."""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        return
+                    kind, changes = self._pending.popleft()
+                for listener in self._listeners:
+                    listener(kind, changes)
+
+    def record(self, changes: Iterable[Change], flush: bool = True) -> None:
+        """Add an operation that was just done, which makes redo impossible.
+
+        Args:
+            changes (Iterable[Change]): The changes of the operation
+            flush (bool): Notify the listeners now, else the caller calls flush
+                once it has released its locks (default: True)
+        """
+        changes = tuple(changes)
+        if not changes:
+            return
+        with self._lock:
+            self._undo.append(changes)
+            self._redo.clear()
+            self._pending.append(("do", changes))
+        if flush:
+            self.flush()
+
+    def undo(self, target: ChangeTarget) -> tuple[Change, ...]:
+        """Undo the latest operation on target and return the applied changes.
+
+        Raises:
+            IndexError: If there is nothing to undo
+            ValueError: If a seat changed since, the operation stays undoable
+        """
+        with self._lock:
+            if not self._undo:
+                raise IndexError("Nothing to undo")
+            changes = self._undo.pop()
+
+        # Applying takes carriage locks, which must not be taken inside ours
+        try:
+            apply_changes(target, inverse(changes))
+        except Exception:
+            with self._lock:
+                self._undo.append(changes)
+            raise
+
+        with self._lock:
+            self._redo.append(changes)
+        self._notify("undo", inverse(changes))
+        return inverse(changes)
+
+    def redo(self, target: ChangeTarget) -> tuple[Change, ...]:
+        """Redo the latest undone operation on target and return the applied changes.
+
+        Raises:
+            IndexError: If there is nothing to redo
+            ValueError: If a seat changed since, the operation stays redoable
+        """
+        with self._lock:
+            if not self._redo:
+                raise IndexError("Nothing to redo")
+            changes = self._redo.pop()
+
+        try:
+            apply_changes(target, changes)
+        except Exception:
+            with self._lock:
+                self._redo.append(changes)
+            raise
+
+        with self._lock:
+            self._undo.append(changes)
+        self._notify("redo", changes)
+        return changes
+
+    def __len__(self) -> int:
+        return len(self._undo)
+
+
+class JsonLinesWriter:
+    """Listener writing every operation as a line of JSON, for audit or replication."""
+
+    def __init__(self, out: IO[str]):
+        self.out = out
+        self._lock = threading.Lock()
+
+    def __call__(self, kind: str, changes: tuple[Change, ...]) -> None:
+        line = json.dumps({"op": kind, "changes": changes}, ensure_ascii=False)
+        with self._lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+
+def replay(target: ChangeTarget, lines: Iterable[str]) -> int:
+    """Apply a stream written by JsonLinesWriter to target, return the operations."""
+    count = 0
+    for line in lines:
+        if line.strip():
+            apply_changes(target, (tuple(c) for c in json.loads(line)["changes"]))
+            count += 1
+    return count
@@ -0,0 +1,83 @@
+"""Optional compression of the saved trains and bookings.
+
+Saved fleets are mostly empty seats and the same layout data over and over,
+which compresses well. A codec is chosen when saving and recorded next to the
+data, loading reads it from there:
+
+    None    no compression (default), the files are plain pickles and JSON
+    "zlib"  DEFLATE in a gzip container (.gz), fast
+    "lzma"  LZMA (.xz), smaller files, slower to write
+
+Compressed files are read as a stream, so loading never holds more than a
+buffer of compressed data in memory besides the objects being built. The
+codec of the app is set with the environment variable BILJETTBOKNING_CODEC.
+
+When metrics are enabled the compression ratio of every written file is
+recorded as the value compression_ratio and the time to read a file in the
+read category, both keyed by the file name (e.g. train_152/carriage_0.pickle.gz),
+see biljettbokning.metrics.
+"""
+
+import gzip
+import os
+from pathlib import Path
+from typing import IO, Optional
+
+from biljettbokning.metrics import METRICS
+
+try:
+    import lzma
+except ImportError:  # pragma: no cover - depends on how Python was built
+    lzma = None  # type: ignore
+
+CODECS = (None, "zlib", "lzma")
+
+# Appended to the file name, so files of different codecs never mix
+SUFFIXES = {None: "", "zlib": ".gz", "lzma": ".xz"}
+
+ENV_VARIABLE = "BILJETTBOKNING_CODEC"
+
+
+def check_codec(codec: Optional[str]) -> None:
+    """Raise if the codec is unknown or not available in this Python.
+
+    Raises:
+        ValueError: If the codec can not be used
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec: {codec}")
+    if codec == "lzma" and lzma is None:
+        raise ValueError("This Python was built without lzma support")
+
+
+def default_codec() -> Optional[str]:
+    """The codec set in the environment variable, None if it is unset or empty."""
+    codec = os.environ.get(ENV_VARIABLE) or None
+    check_codec(codec)
+    return codec
+
+
+def compress(data: bytes, codec: Optional[str], name: str = "") -> bytes:
+    """Compress data with a codec, recording the ratio under name if metrics are on."""
+    if codec is None:
+        return data
+    check_codec(codec)
+    if codec == "zlib":
+        # mtime=0 so the same data always gives the same file
+        compressed = gzip.compress(data, compresslevel=6, mtime=0)
+    else:
+        compressed = lzma.compress(data)
+
+    if METRICS.enabled and name:
+        METRICS.set_value("compression_ratio", name, len(data) / len(compressed))
+    return compressed
+
+
+def open_stream(path: Path, codec: Optional[str]) -> IO[bytes]:
+    """Open a file written with compress for reading, decompressing as it is read."""
+    check_codec(codec)
+    if codec == "zlib":
+        return gzip.open(path, "rb")
+    if codec == "lzma":
+        return lzma.open(path, "rb")
+    return open(path, "rb")
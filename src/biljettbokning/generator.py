@@ -0,0 +1,230 @@
+"""Seeded generation of large synthetic fleets.
+
+Unlike Train.random, every value comes from a seeded random.Random, so the same
+seed and configuration always gives the same trains. Trains are made in chunks
+of consecutive train numbers, each chunk seeded from (seed, chunk index), which
+makes the result independent of how many processes share the work. Chunks can
+be written straight to the storage format by worker processes, so fleets of
+100 000+ trains never have to fit in memory.
+
+Usage:
+    python -m biljettbokning.generator <katalog> --count 100000 --seed 1 --occupancy 0.4
+"""  # noqa
+
+import argparse
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import accumulate
+from multiprocessing import Pool
+import random
+import time
+from typing import Iterator, Optional
+
+from biljettbokning.model import Carriage, Train
+
+FIRST_NAMES = (
+    "Anna",
+    "Bertil",
+    "Cecilia",
+    "David",
+    "Elin",
+    "Filip",
+    "Greta",
+    "Hugo",
+    "Ida",
+    "Johan",
+    "Karin",
+    "Lars",
+    "Maja",
+    "Nils",
+    "Olivia",
+    "Per",
+)
+LAST_NAMES = (
+    "Andersson",
+    "Berg",
+    "Carlsson",
+    "Dahl",
+    "Eriksson",
+    "Forsberg",
+    "Gustafsson",
+    "Holm",
+    "Johansson",
+    "Karlsson",
+    "Lind",
+    "Nilsson",
+    "Persson",
+    "Svensson",
+)
+
+# Relative number of departures per hour of the day
+UNIFORM_HOURS = (1.0,) * 24
+RUSH_HOURS = (0.1,) * 5 + (1, 3, 4, 4, 2) + (1.5,) * 6 + (3, 4, 4, 2) + (1, 1, 0.5, 0.2)
+DEPARTURE_PROFILES = {"uniform": UNIFORM_HOURS, "rush": RUSH_HOURS}
+
+
+@dataclass(frozen=True)
+class FleetConfig:
+    """What the generated trains look like.
+
+    Attributes:
+        seed (int): Seed, the same config always gives the same trains
+        layouts (tuple[str, ...]): Seating configurations to choose from
+        carriages (tuple[int, int]): Min and max carriages per train
+        rows (tuple[int, int]): Min and max rows per carriage
+        first_day (datetime): Midnight of the first day with departures
+        days (int): Number of days the departures are spread over
+        hour_weights (tuple[float, ...]): Relative departures per hour, 24 values
+        duration (tuple[int, int]): Min and max travel time in minutes
+        occupancy (float): Fraction of the seats that are booked, 0 to 1
+    """
+
+    seed: int = 0
+    layouts: tuple[str, ...] = ("2+2", "3+2", "2+3", "3+3")
+    carriages: tuple[int, int] = (3, 5)
+    rows: tuple[int, int] = (7, 13)
+    first_day: datetime = datetime(2030, 1, 1)
+    days: int = 7
+    hour_weights: tuple[float, ...] = UNIFORM_HOURS
+    duration: tuple[int, int] = (60, 300)
+    occupancy: float = 0.0
+
+
+def make_train(number: int, rng: random.Random, config: FleetConfig) -> Train:
+    """One train drawn from rng according to config."""
+    hour_weights = list(accumulate(config.hour_weights))
+    departure = config.first_day + timedelta(
+        days=rng.randrange(config.days),
+        hours=rng.choices(range(24), cum_weights=hour_weights)[0],
+        minutes=rng.randrange(0, 60, 5),
+    )
+    arrival = departure + timedelta(minutes=rng.randint(*config.duration))
+    start, dest = rng.sample(Train.DESTINATIONS, 2)
+
+    layout = rng.choice(config.layouts)
+    carriages = [
+        Carriage(layout, rng.randint(*config.rows), i + 1)
+        for i in range(rng.randint(*config.carriages))
+    ]
+
+    for car in carriages:
+        seats = car._flat_seats  # pylint: disable=protected-access
+        for index in rng.sample(
+            range(len(seats)), round(config.occupancy * len(seats))
+        ):
+            seats[index].passenger_name = (
+                f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            )
+
+    return Train(number, departure, arrival, start, dest, carriages)
+
+
+def generate_chunk(
+    chunk: int, count: int, config: FleetConfig, chunk_size: int, first_number: int
+) -> list[Train]:
+    """The trains of one chunk, the same no matter which process makes it."""
+    rng = random.Random(f"{config.seed}:{chunk}")
+    start = chunk * chunk_size
+    return [
+        make_train(first_number + index, rng, config)
+        for index in range(start, min(start + chunk_size, count))
+    ]
+
+
+def generate(
+    count: int,
+    config: FleetConfig = FleetConfig(),
+    chunk_size: int = 1000,
+    first_number: int = 1,
+) -> Iterator[Train]:
+    """Yield count trains numbered from first_number, one chunk at a time."""
+    for chunk in range((count + chunk_size - 1) // chunk_size):
+        yield from generate_chunk(chunk, count, config, chunk_size, first_number)
+
+
+def _write_chunk(args: tuple) -> int:
+    directory, chunk, count, config, chunk_size, first_number = args
+    trains = generate_chunk(chunk, count, config, chunk_size, first_number)
+    for train in trains:
+        train.serialize(directory)
+    return len(trains)
+
+
+def write_fleet(
+    directory: str,
+    count: int,
+    config: FleetConfig = FleetConfig(),
+    chunk_size: int = 1000,
+    first_number: int = 1,
+    processes: Optional[int] = None,
+) -> int:
+    """Generate trains and save them in directory, chunks in parallel.
+
+    Args:
+        directory (str): Existing directory to save the trains in
+        count (int): Number of trains
+        config (FleetConfig): What the trains look like
+        chunk_size (int): Trains per chunk
+        first_number (int): Number of the first train
+        processes (Optional[int]): Worker processes, 1 to work in this process
+            (default: one per CPU)
+
+    Returns:
+        int: Number of trains written
+    """
+    jobs = [
+        (directory, chunk, count, config, chunk_size, first_number)
+        for chunk in range((count + chunk_size - 1) // chunk_size)
+    ]
+    if processes == 1:
+        return sum(map(_write_chunk, jobs))
+
+    with Pool(processes) as pool:
+        return sum(pool.imap_unordered(_write_chunk, jobs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generera många syntetiska tåg")
+    parser.add_argument("directory", help="Katalog att spara tågen i")
+    parser.add_argument("--count", type=int, default=1000, help="Antal tåg")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--layouts",
+        default="2+2,3+2,2+3,3+3",
+        help="Kommaseparerade stolskonfigurationer",
+    )
+    parser.add_argument("--occupancy", type=float, default=0.0, help="Andel bokade")
+    parser.add_argument(
+        "--departures", choices=sorted(DEPARTURE_PROFILES), default="uniform"
+    )
+    parser.add_argument("--first-day", default="2030-01-01", help="Första avgångsdag")
+    parser.add_argument("--days", type=int, default=7, help="Antal avgångsdagar")
+    parser.add_argument("--first-number", type=int, default=1, help="Första tågnummer")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--processes", type=int, help="Antal processer")
+    args = parser.parse_args()
+
+    config = FleetConfig(
+        seed=args.seed,
+        layouts=tuple(args.layouts.split(",")),
+        first_day=datetime.fromisoformat(args.first_day),
+        days=args.days,
+        hour_weights=DEPARTURE_PROFILES[args.departures],
+        occupancy=args.occupancy,
+    )
+
+    started = time.perf_counter()
+    written = write_fleet(
+        args.directory,
+        args.count,
+        config,
+        args.chunk_size,
+        args.first_number,
+        args.processes,
+    )
+    elapsed = time.perf_counter() - started
+    print(f"{written} tåg på {elapsed:.1f} s ({written / elapsed:.0f} tåg/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Streaming import of passenger manifests from CSV.
+
+Every row is train number, carriage number (starting at 1), seat number or
+"auto", and passenger name. Instead of "auto" the seat can be a preference,
+"fönster", "gång" or "bord" (or window, aisle, table), which takes the first
+free seat of that kind in the carriage, or any free seat if there is none.
+A header row with those column names is optional.
+Rows are read one at a time and buffered per train; a train's buffer is
+applied as one batch when it is full, or when the total buffer is, so memory
+stays bounded however large the file is. The trains touched are written to
+disk once, after the last row.
+
+Usage:
+    python -m biljettbokning.importer manifest.csv --trains <katalog> [--save <katalog>]
+"""  # noqa
+
+import argparse
+import csv
+from dataclasses import dataclass, field
+import sys
+from typing import IO, Iterable, Optional
+
+from biljettbokning.model import (
+    PREFERENCE_NAMES,
+    PREFERENCES,
+    Carriage,
+    Fleet,
+)
+
+AUTO_SEAT = "auto"
+HEADER = ("train", "carriage", "seat", "name")
+
+# A parsed row: (row number, train number, carriage index, seat number or None for auto, name, preference)  # noqa
+Row = tuple[int, int, int, Optional[int], str, Optional[str]]
+
+
+@dataclass
+class ImportReport:
+    """Result of an import.
+
+    Attributes:
+        rows (int): Number of data rows read
+        booked (int): Number of passengers booked
+        errors (list[tuple[int, str]]): (row number, message) for every failed row
+        trains (set[int]): Numbers of the trains that got bookings
+    """
+
+    rows: int = 0
+    booked: int = 0
+    errors: list[tuple[int, str]] = field(default_factory=list)
+    trains: set[int] = field(default_factory=set)
+
+
+def _parse(row_num: int, row: list[str]) -> Row:
+    """Parse a CSV row.
+
+    Raises:
+        ValueError: If the row is malformed
+    """
+    if len(row) != 4:
+        raise ValueError(f"Expected 4 columns, got {len(row)}")
+
+    train, carriage, seat, name = (value.strip() for value in row)
+    if not name:
+        raise ValueError("Name is missing")
+
+    seat = seat.lower()
+    preference = PREFERENCE_NAMES.get(seat, seat if seat in PREFERENCES else None)
+    auto = seat == AUTO_SEAT or preference is not None
+
+    return (
+        row_num,
+        int(train),
+        int(carriage) - 1,
+        None if auto else int(seat),
+        name,
+        preference,
+    )
+
+
+def _free_seat(car: Carriage, preference: Optional[str]) -> int:
+    """Lowest free seat with the preference, or any free seat if there is none.
+
+    Raises:
+        ValueError: If the carriage is full
+    """
+    mask = car.free_mask(preference) or car.free_mask()
+    if not mask:
+        raise ValueError("Carriage is full")
+    return (mask & -mask).bit_length()
+
+
+def _apply(fleet: Fleet, train_num: int, rows: list[Row], report: ImportReport):
+    """Book a batch of rows for one train, recording an error per failed row."""
+    try:
+        train = fleet.get_train(train_num)
+    except KeyError as e:
+        report.errors.extend((row[0], e.args[0]) for row in rows)
+        return
+
+    # One round of locking for the whole batch
+    with train.locked(range(len(train.carriages))):
+        for row_num, _, car_num, seat_num, name, preference in rows:
+            try:
+                if not 0 <= car_num < len(train.carriages):
+                    raise IndexError(f"Invalid carriage number {car_num + 1}")
+                if seat_num is None:
+                    seat_num = _free_seat(train.carriages[car_num], preference)
+                fleet.book(train_num, car_num, seat_num, name, flush=False)
+            except (IndexError, ValueError) as e:
+                report.errors.append((row_num, str(e)))
+                continue
+            report.booked += 1
+            report.trains.add(train_num)
+    # Listeners run once per batch and without the locks
+    fleet.log.flush()
+
+
+def import_rows(
+    fleet: Fleet,
+    lines: Iterable[str],
+    batch_size: int = 500,
+    max_buffered: int = 10_000,
+) -> ImportReport:
+    """Book every passenger of a CSV manifest into the fleet.
+
+    Args:
+        fleet (Fleet): Fleet to book into
+        lines (Iterable[str]): CSV text, e.g. an open file
+        batch_size (int): Rows per train applied together
+        max_buffered (int): Rows kept in memory at most before flushing
+
+    Returns:
+        ImportReport: Counts and per row errors
+    """
+    report = ImportReport()
+    buffers: dict[int, list[Row]] = {}
+    buffered = 0
+
+    for row_num, row in enumerate(csv.reader(lines), 1):
+        if not row or (
+            row_num == 1 and tuple(v.strip().lower() for v in row) == HEADER
+        ):
+            continue
+        report.rows += 1
+
+        try:
+            parsed = _parse(row_num, row)
+        except ValueError as e:
+            report.errors.append((row_num, str(e)))
+            continue
+
+        buffer = buffers.setdefault(parsed[1], [])
+        buffer.append(parsed)
+        buffered += 1
+
+        if len(buffer) >= batch_size:
+            _apply(fleet, parsed[1], buffers.pop(parsed[1]), report)
+            buffered -= len(buffer)
+        elif buffered >= max_buffered:
+            # Flush the largest buffer to stay within the limit
+            largest = max(buffers, key=lambda num: len(buffers[num]))
+            buffered -= len(buffers[largest])
+            _apply(fleet, largest, buffers.pop(largest), report)
+
+    for train_num, rows in buffers.items():
+        _apply(fleet, train_num, rows, report)
+
+    report.errors.sort()
+    return report
+
+
+def import_csv(
+    fleet: Fleet,
+    path: str,
+    save_dir: Optional[str] = None,
+    codec: Optional[str] = None,
+    **kwargs,
+) -> ImportReport:
+    """Import a CSV file and, if save_dir is given, save the fleet once.
+
+    Only the touched trains are written, together with the bookings (see Fleet.save).
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        report = import_rows(fleet, f, **kwargs)
+
+    if save_dir is not None:
+        fleet.save(save_dir, codec=codec)
+
+    return report
+
+
+def write_errors(report: ImportReport, out: IO[str]) -> None:
+    """Write the per row errors as CSV (row, error)."""
+    writer = csv.writer(out)
+    writer.writerow(("row", "error"))
+    writer.writerows(report.errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importera passagerarlistor (CSV)")
+    parser.add_argument(
+        "manifest",
+        help="CSV med tåg, vagn, stol (eller auto, fönster, gång, bord), namn",
+    )
+    parser.add_argument("--trains", required=True, help="Katalog med sparade tåg")
+    parser.add_argument("--save", help="Spara ändrade tåg hit (standard: --trains)")
+    parser.add_argument("--errors", help="Skriv fel per rad till denna CSV-fil")
+    parser.add_argument(
+        "--codec", choices=["zlib", "lzma"], help="Komprimera de sparade tågen"
+    )
+    args = parser.parse_args()
+
+    fleet = Fleet.from_directory(args.trains)
+    report = import_csv(fleet, args.manifest, args.save or args.trains, args.codec)
+
+    if args.errors:
+        with open(args.errors, "w", encoding="utf-8", newline="") as f:
+            write_errors(report, f)
+    else:
+        write_errors(report, sys.stderr)
+
+    print(
+        f"{report.rows} rader, {report.booked} bokade, {len(report.errors)} fel, "
+        f"{len(report.trains)} tåg sparade"
+    )
+    sys.exit(1 if report.errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Memory accounting for fleets, trains and bookings.
+
+Sizes are found by walking objects with sys.getsizeof, every object is counted
+once per walk. Allocating call sites are found with tracemalloc while loading
+a fleet from disk.
+
+Usage:
+    python -m biljettbokning.memory <directory with saved trains> [--top 10]
+"""
+
+import argparse
+from collections.abc import Iterable
+import json
+import sys
+import tracemalloc
+from typing import Any, Callable, Optional
+
+from biljettbokning.model import Booking, Fleet, Train
+from biljettbokning.names import NAMES
+
+# Shared or immutable objects that are not part of what is measured
+_SKIPPED_TYPES = (type, type(sys), type(len), type(lambda: 0))
+
+# Attributes pointing back to an owner, the owner is not part of the object
+_BACK_REFERENCES = frozenset({"_carriage"})
+
+
+def deep_sizeof(obj: Any, seen: Optional[set[int]] = None) -> int:
+    """Bytes used by obj and everything reachable from it.
+
+    Args:
+        obj (Any): Object to measure
+        seen (Optional[set[int]]): Ids of objects already counted, shared between
+            calls to measure several objects without counting anything twice
+    """
+    if seen is None:
+        seen = set()
+
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SKIPPED_TYPES):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif isinstance(current, (str, bytes, int, float, bool)) or current is None:
+            continue
+        else:
+            if hasattr(current, "__dict__"):
+                attrs = vars(current)
+                seen.add(id(attrs))
+                total += sys.getsizeof(attrs)
+                for key, value in attrs.items():
+                    stack.append(key)
+                    if key not in _BACK_REFERENCES:
+                        stack.append(value)
+            for slot in getattr(type(current), "__slots__", ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+
+    return total
+
+
+def _stats(objects: Iterable[Any]) -> dict[str, float]:
+    """Count, total and mean size of objects measured one by one."""
+    sizes = [deep_sizeof(obj) for obj in objects]
+    return {
+        "count": len(sizes),
+        "total_bytes": sum(sizes),
+        "mean_bytes": sum(sizes) / len(sizes) if sizes else 0,
+    }
+
+
+def fleet_report(trains: list[Train], bookings: Iterable[Booking] = ()) -> dict:
+    """Memory used by the trains and bookings, per kind of object and in total.
+
+    The per kind numbers include everything an object references (a Train
+    includes its carriages and seats). The totals count shared objects once,
+    so bookings_bytes is only what the bookings hold on top of the trains, for
+    example deep copied trains. Passenger names are stored once in the name
+    table, counted as names_bytes.
+    """
+    bookings = list(bookings)
+    carriages = [car for train in trains for car in train.carriages]
+    seats = [
+        seat
+        for car in carriages
+        for seat in car._flat_seats  # pylint: disable=protected-access
+    ]
+
+    seen: set[int] = set()
+    trains_bytes = deep_sizeof(trains, seen)
+    bookings_bytes = deep_sizeof(bookings, seen)
+    names_bytes = NAMES.nbytes()
+
+    return {
+        "per_object": {
+            "Seat": _stats(seats),
+            "Carriage": _stats(carriages),
+            "Train": _stats(trains),
+            "Booking": _stats(bookings),
+        },
+        "totals": {
+            "trains_bytes": trains_bytes,
+            "bookings_bytes": bookings_bytes,
+            "names_bytes": names_bytes,
+            "total_bytes": trains_bytes + bookings_bytes + names_bytes,
+        },
+    }
+
+
+def top_allocations(func: Callable[[], Any], top: int = 10) -> tuple[Any, list[dict]]:
+    """Run func under tracemalloc and return its result and the top call sites.
+
+    Returns:
+        tuple: (result of func, [{"site", "bytes", "count"}, ...] largest first)
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    try:
+        result = func()
+        after = tracemalloc.take_snapshot()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    ignored = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ]
+    stats = after.filter_traces(ignored).compare_to(
+        before.filter_traces(ignored), "lineno"
+    )
+    sites = [
+        {
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "bytes": stat.size_diff,
+            "count": stat.count_diff,
+        }
+        for stat in stats
+        if stat.size_diff > 0
+    ]
+    return result, sites[:top]
+
+
+def format_report(report: dict) -> str:
+    """Human readable text of a report from fleet_report."""
+    lines = ["Minnesanvändning", ""]
+    for kind, stats in report["per_object"].items():
+        lines.append(
+            f"{kind:<10} {stats['count']:>8} st  "
+            f"{stats['mean_bytes']:>10.0f} B/st  {stats['total_bytes']:>12} B"
+        )
+
+    totals = report["totals"]
+    lines += [
+        "",
+        f"Tåg totalt:       {totals['trains_bytes']:>12} B",
+        f"Bokningar utöver: {totals['bookings_bytes']:>12} B",
+        f"Namn:             {totals.get('names_bytes', 0):>12} B",
+        f"Totalt:           {totals['total_bytes']:>12} B",
+    ]
+
+    if report.get("top_allocations"):
+        lines += ["", "Största allokeringar vid inläsning:"]
+        for site in report["top_allocations"]:
+            lines.append(f"{site['bytes']:>12} B {site['count']:>8} st  {site['site']}")
+
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rapport över minnesanvändning")
+    parser.add_argument("directory", help="Katalog med sparade tåg")
+    parser.add_argument("--top", type=int, default=10, help="Antal allokeringsplatser")
+    parser.add_argument("--json", action="store_true", help="Skriv ut som JSON")
+    args = parser.parse_args()
+
+    fleet, sites = top_allocations(
+        lambda: Fleet.from_directory(args.directory), args.top
+    )
+    report = fleet_report(fleet.trains, fleet.bookings)
+    report["top_allocations"] = sites
+
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Call counters and latency histograms for booking operations.
+
+Operations are grouped in categories (book, unbook, lookup, render, load, save,
+and read for single files) and recorded per function. Besides latencies, the latest value of measurements
+such as the compression ratio of a saved file can be recorded per key.
+
+Only the outermost timed call of a category is recorded, so a booking made by
+Fleet.book that calls Carriage.book_passenger is counted once, under Fleet.book.
+
+Recording is off by default, the timed decorator then only costs one attribute
+check per call. Enable it with METRICS.enable() or by setting the environment
+variable BILJETTBOKNING_METRICS to the file the app should write a snapshot to
+(.json for JSON, anything else for the Prometheus text format).
+
+Example:
+    @timed("book")
+    def book_passenger(...): ...
+
+    with timer("save", "App.exit"):
+        ...
+
+    METRICS.dump("metrics.prom")
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Optional
+
+# Upper bounds of the histogram buckets in seconds, the last bucket is +Inf
+BUCKETS = (
+    0.000_005,
+    0.000_01,
+    0.000_025,
+    0.000_05,
+    0.000_1,
+    0.000_25,
+    0.000_5,
+    0.001,
+    0.002_5,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+ENV_VARIABLE = "BILJETTBOKNING_METRICS"
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, also counting calls and errors."""
+
+    __slots__ = ("count", "errors", "total", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+    def quantile(self, fraction: float) -> float:
+        """Estimated quantile, the upper bound of the bucket it falls in."""
+        if self.count == 0:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, amount in zip(BUCKETS, self.buckets):
+            seen += amount
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """Registry of histograms keyed by (category, operation).
+
+    Attributes:
+        enabled (bool): If observations are recorded
+
+    Instance methods:
+        enable() -> None / disable() -> None: Turn recording on or off
+        observe(category, operation, seconds, error) -> None: Record one call
+        set_value(name, key, value) -> None: Record the latest value of a measurement
+        snapshot() -> dict: All data as plain dicts
+        to_prometheus() -> str: Prometheus text format of the snapshot
+        dump(path) -> None: Write a snapshot as JSON (.json) or Prometheus text
+        reset() -> None: Forget everything recorded
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._histograms: dict[tuple[str, str], Histogram] = {}
+        self._values: dict[tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._values.clear()
+
+    def observe(
+        self, category: str, operation: str, seconds: float, error: bool = False
+    ) -> None:
+        """Record one call of operation that took the given time."""
+        with self._lock:
+            histogram = self._histograms.get((category, operation))
+            if histogram is None:
+                histogram = self._histograms[(category, operation)] = Histogram()
+            histogram.observe(seconds, error)
+
+    def set_value(self, name: str, key: str, value: float) -> None:
+        """Record the latest value of the measurement name for key, e.g. a file."""
+        with self._lock:
+            self._values[(name, key)] = value
+
+    def snapshot(self) -> dict[str, Any]:
+        """Copy of all recorded data, grouped by category and operation."""
+        result: dict[str, dict[str, Any]] = {}
+        with self._lock:
+            for (category, operation), h in sorted(self._histograms.items()):
+                result.setdefault(category, {})[operation] = {
+                    "count": h.count,
+                    "errors": h.errors,
+                    "total_seconds": h.total,
+                    "p50_seconds": h.quantile(0.50),
+                    "p95_seconds": h.quantile(0.95),
+                    "p99_seconds": h.quantile(0.99),
+                    "buckets": dict(
+                        zip([str(b) for b in BUCKETS] + ["+Inf"], h.buckets)
+                    ),
+                }
+            values: dict[str, dict[str, float]] = {}
+            for (name, key), value in sorted(self._values.items()):
+                values.setdefault(name, {})[key] = value
+        return {"timestamp": time.time(), "operations": result, "values": values}
+
+    def to_prometheus(self) -> str:
+        """All histograms in the Prometheus text exposition format."""
+        name = "biljettbokning_operation_seconds"
+        lines = [
+            f"# HELP {name} Latency of booking system operations.",
+            f"# TYPE {name} histogram",
+        ]
+        errors = []
+
+        with self._lock:
+            for (category, operation), h in sorted(self._histograms.items()):
+                labels = f'category="{category}",operation="{operation}"'
+                cumulative = 0
+                for bound, amount in zip(BUCKETS, h.buckets):
+                    cumulative += amount
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"{name}_sum{{{labels}}} {h.total}")
+                lines.append(f"{name}_count{{{labels}}} {h.count}")
+                errors.append(
+                    f"biljettbokning_operation_errors_total{{{labels}}} {h.errors}"
+                )
+            values = sorted(self._values.items())
+
+        lines.append("# HELP biljettbokning_operation_errors_total Calls that raised.")
+        lines.append("# TYPE biljettbokning_operation_errors_total counter")
+        lines.extend(errors)
+
+        for value_name in sorted({value_name for (value_name, _), _ in values}):
+            lines.append(f"# TYPE biljettbokning_{value_name} gauge")
+            lines.extend(
+                f'biljettbokning_{value_name}{{key="{key}"}} {value}'
+                for (other, key), value in values
+                if other == value_name
+            )
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        """Write a snapshot to path, as JSON if it ends with .json else Prometheus text."""  # noqa
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                json.dump(self.snapshot(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+
+
+METRICS = Metrics()
+if os.environ.get(ENV_VARIABLE):
+    METRICS.enable()
+
+
+def dump_path() -> Optional[str]:
+    """Where snapshots should be written, from the environment variable."""
+    return os.environ.get(ENV_VARIABLE) or None
+
+
+# Categories being timed on the current thread, see _outermost
+_active = threading.local()
+
+
+@contextmanager
+def _outermost(category: str):
+    """Yield True unless a call of the category is already timed on this thread."""
+    active = _active.__dict__.setdefault("categories", set())
+    if category in active:
+        yield False
+        return
+    active.add(category)
+    try:
+        yield True
+    finally:
+        active.discard(category)
+
+
+def timed(category: str, operation: Optional[str] = None):
+    """Decorator recording every call of the function when metrics are enabled.
+
+    Calls made while another call of the same category is timed on the thread
+    are not recorded, see the module docstring.
+
+    Args:
+        category (str): book, unbook, lookup, render, load, save or read
+        operation (Optional[str]): Name to record under (default: qualified name)
+    """
+
+    def decorator(func):
+        name = operation or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return func(*args, **kwargs)
+
+            with _outermost(category) as outermost:
+                if not outermost:
+                    return func(*args, **kwargs)
+
+                started = time.perf_counter()
+                error = True
+                try:
+                    result = func(*args, **kwargs)
+                    error = False
+                    return result
+                finally:
+                    METRICS.observe(
+                        category, name, time.perf_counter() - started, error
+                    )
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def timer(category: str, operation: str):
+    """Record the time spent in a block, like timed for functions."""
+    if not METRICS.enabled:
+        yield
+        return
+
+    with _outermost(category) as outermost:
+        if not outermost:
+            yield
+            return
+
+        started = time.perf_counter()
+        error = True
+        try:
+            yield
+            error = False
+        finally:
+            METRICS.observe(category, operation, time.perf_counter() - started, error)
@@ -1,6 +1,38 @@
-"""Data model for train booking system"""
-
-from datetime import datetime, timedelta
+"""Data model for train booking system
+
+Thread safety:
+    Every Carriage has its own reentrant lock (Carriage.lock) which guards its
+    seats. Single seat operations take the lock of their carriage only, so
+    threads working on different carriages or trains never wait for each other.
+    Operations that need several carriage locks at once (group bookings) must
+    acquire them in ascending order of (train number, carriage index), which
+    is what Train.locked does. Following that order everywhere makes deadlocks
+    impossible.
+
+Versions:
+    Train.snapshot() returns an immutable TrainVersion of the train's current
+    state which readers can walk for as long as they like without locks while
+    bookings go on. Carriage versions are cached and shared between train
+    versions until the carriage changes, so a snapshot only copies the
+    carriages that changed since the last one.
+
+Names:
+    Seats and bookings store passenger names as integer ids from the shared
+    table NAMES (see biljettbokning.names) and compare the ids.
+
+Seat attributes:
+    Which seats are window, aisle and table seats depends only on the layout
+    (seating configuration and number of rows). seat_attributes computes the
+    bitmasks of a layout once, and combined with Carriage.occupied they answer
+    queries like "free window seats" with a few integer operations.
+"""
+
+from bisect import insort
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, contextmanager, suppress
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from functools import cache, cached_property
 import itertools
 import os
 from pathlib import Path
@@ -9,33 +41,256 @@ import pickle
 import random
 import re
 import math
-from typing import Optional
+import tempfile
+import threading
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+
+from biljettbokning import compression
+from biljettbokning.commandlog import (
+    Change,
+    CommandLog,
+    is_waitlist_change,
+    unbooking,
+    waitlist_carriage,
+)
+from biljettbokning.metrics import timed, timer
+from biljettbokning.names import NAMES
+from biljettbokning.passengers import PassengerIndex
+from biljettbokning.waitlist import Waitlist, WaitlistEntry
+
+WINDOW = "window"
+AISLE = "aisle"
+TABLE = "table"
+PREFERENCES = (WINDOW, AISLE, TABLE)
+
+# Preferences by their names in the interfaces
+PREFERENCE_NAMES = {"fönster": WINDOW, "gång": AISLE, "bord": TABLE}
+
+
+class SeatAttributes(NamedTuple):
+    """Bitmasks of the seats of a layout with each attribute, bit n - 1 is seat n.
+
+    Attributes:
+        all (int): Every seat
+        window (int): The outermost seat on each side of a row
+        aisle (int): The seats next to the aisle
+        table (int): The seats of the two middle rows, which face each other over tables
+    """  # noqa
+
+    all: int
+    window: int
+    aisle: int
+    table: int
+
+    def mask(self, preference: Optional[str] = None) -> int:
+        """Mask of the seats with the preference, all seats if None.
+
+        Raises:
+            ValueError: If the preference is unknown
+        """
+        if preference is None:
+            return self.all
+        if preference not in PREFERENCES:
+            raise ValueError(f"Unknown seat preference {preference}")
+        return getattr(self, preference)
+
+    def of_seat(self, seat_num: int) -> list[str]:
+        """The attributes of a seat."""
+        return [
+            pref for pref in PREFERENCES if getattr(self, pref) >> (seat_num - 1) & 1
+        ]
+
+
+@cache
+def seat_attributes(seating_configuration: str, num_rows: int) -> SeatAttributes:
+    """Attribute bitmasks of a layout, computed once per layout.
+
+    Args:
+        seating_configuration (str): 'x+y' as in Carriage
+        num_rows (int): Number of rows
+    """
+    left, right = (int(val) for val in seating_configuration.split("+"))
+    width = left + right
+
+    def columns(*cols: int) -> int:
+        # The given columns in every row, rows do not overlap so no carries
+        row = sum(1 << col for col in set(cols))
+        return row * sum(1 << (r * width) for r in range(num_rows))
+
+    window = columns(*([0] if left else []), *([width - 1] if right else []))
+    aisle = columns(*([left - 1] if left else []), *([left] if right else []))
+
+    first_table_row = max(0, num_rows // 2 - 1)
+    table = 0
+    for row in range(first_table_row, min(num_rows, first_table_row + 2)):
+        table |= ((1 << width) - 1) << (row * width)
+
+    return SeatAttributes((1 << (width * num_rows)) - 1, window, aisle, table)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """Replace a file so that readers find the old or the new contents, never a mix.
+
+    The data goes to a temporary file in the same directory which is then
+    renamed over path, renaming within a file system is atomic.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
+
+
+def seats_in_mask(mask: int) -> list[int]:
+    """Seat numbers of the set bits of a seat bitmask, in ascending order."""
+    seats = []
+    while mask:
+        lowest = mask & -mask
+        seats.append(lowest.bit_length())
+        mask ^= lowest
+    return seats
+
+
+def leg_mask(first: int, last: int) -> int:
+    """Bitmask of the segments travelled from stop index first to stop index last.
+
+    Segment i runs from stop i to stop i + 1.
+    """
+    return (1 << last) - (1 << first)
 
 
 class Seat:
     """A seat in a Carriage with a number and an optional passenger name.
 
+    A seat is either booked for the whole trip (passenger_name) or for one or
+    more legs that do not overlap (legs), see Train.stops.
+
     Attributes:
         number (int): The seat number
         passenger_name (str): The name of the passenger in the seat (default: "")
+        name_id (int): Id of the passenger name in NAMES, 0 if the seat is free
+        legs (tuple[tuple[int, int, int], ...]): (first stop, last stop, name id) of every leg booking
+        legs_mask (int): Bitmask of the segments booked by legs
 
     Instance methods:
         is_booked() -> bool: Return if the seat is booked
+        is_free_for(first, last) -> bool: Return if the seat is free between two stops
         unbook() -> None: Remove the passenger from the seat
-    """
+        book_leg(first, last, name) -> None: Book the seat between two stops
+        unbook_leg(first) -> str: Remove the leg booking boarding at a stop
+    """  # noqa
+
+    # Almost all seats never get a leg booking, they share these
+    legs: tuple[tuple[int, int, int], ...] = ()
+    legs_mask = 0
+
+    def __init__(
+        self,
+        number: int,
+        passenger_name: Optional[str] = None,
+        carriage: Optional["Carriage"] = None,
+    ):
+        """Make a new seat with the specified number and if applicable the passenger name (default: "").
 
-    def __init__(self, number: int, passenger_name: Optional[str] = None):
-        """Make a new seat with the specified number and if applicable the passenger name (default: "")."""
+        The carriage, if given, is told about every change of passenger.
+        """  # noqa
         self.number = number
-        self.passenger_name = passenger_name
+        self._carriage = carriage
+        self.name_id = NAMES.intern(passenger_name)
+
+    @property
+    def passenger_name(self) -> Optional[str]:
+        return NAMES.name(self.name_id)
+
+    @passenger_name.setter
+    def passenger_name(self, value: Optional[str]):
+        old_id = self.name_id
+        self.name_id = NAMES.intern(value)
+        if self._carriage is not None:
+            self._carriage._seat_changed(self.number, self.is_booked())
+            observer = self._carriage.name_observer
+            if observer is not None and old_id != self.name_id:
+                observer(self.number, old_id, self.name_id)
 
     def is_booked(self) -> bool:
-        """Return True if there is a passenger in the seat, else False."""
-        return bool(self.passenger_name)
+        """Return True if there is a passenger in the seat for any part of the trip, else False."""  # noqa
+        return self.name_id != 0 or self.legs_mask != 0
+
+    def is_free_for(self, first: int, last: int) -> bool:
+        """Return True if no passenger has the seat between stop indices first and last."""  # noqa
+        return self.name_id == 0 and not self.legs_mask & leg_mask(first, last)
 
     def unbook(self) -> None:
         self.passenger_name = None
 
+    def book_leg(self, first: int, last: int, name: str) -> None:
+        """Book the seat from stop index first to stop index last.
+
+        Raises:
+            ValueError: If the seat is taken on any of the segments
+        """
+        if not self.is_free_for(first, last):
+            raise ValueError(f"Seat {self.number} is already booked on that leg")
+        self._set_legs(self.legs + ((first, last, NAMES.intern(name)),))
+        if self._carriage is not None:
+            self._carriage._leg_changed(self.number, first, last, True)
+
+    def unbook_leg(self, first: int) -> str:
+        """Remove the leg booking boarding at stop index first and return its name.
+
+        Raises:
+            KeyError: If no leg booking boards there
+        """
+        for leg in self.legs:
+            if leg[0] == first:
+                break
+        else:
+            raise KeyError(f"No leg booking from stop {first} in seat {self.number}")
+
+        self._set_legs(tuple(other for other in self.legs if other is not leg))
+        if self._carriage is not None:
+            self._carriage._leg_changed(self.number, leg[0], leg[1], False)
+        return NAMES.name(leg[2]) or ""
+
+    def _set_legs(self, legs: tuple[tuple[int, int, int], ...]) -> None:
+        self.legs = legs
+        self.legs_mask = 0
+        for first, last, _ in legs:
+            self.legs_mask |= leg_mask(first, last)
+
+    def __getstate__(self):
+        """Same state as before seats knew their carriage, which sets it on load.
+
+        The name is stored rather than its id, ids are only valid in one process.
+        Leg bookings are only stored if there are any.
+        """
+        state = {"number": self.number, "passenger_name": self.passenger_name}
+        if self.legs:
+            state["legs"] = [
+                (first, last, NAMES.name(name_id)) for first, last, name_id in self.legs
+            ]
+        return state
+
+    def __setstate__(self, state):
+        self.number = state["number"]
+        self.name_id = NAMES.intern(state.get("passenger_name"))
+        self._carriage = None
+        if state.get("legs"):
+            self._set_legs(
+                tuple(
+                    (first, last, NAMES.intern(name))
+                    for first, last, name in state["legs"]
+                )
+            )
+
     def __repr__(self):
         return str(self.number) if not self.is_booked() else "*" * len(str(self.number))
 
@@ -45,6 +300,12 @@ class Carriage:
 
     Attributes:
         number (int): The carriage number
+        occupied (int): Bitmask of the booked seats, bit n - 1 is set if seat n is booked
+        leg_occupied (list[int]): Per segment, bitmask of the seats booked on it by leg bookings
+        version (int): Number of seat changes so far, identifies the state of the seats
+        dirty (bool): True if the seats changed since the carriage was last saved or loaded
+        name_observer (Optional[Callable[[int, int, int], None]]): Called with (seat number, old name id, new name id) when a passenger changes, see PassengerIndex
+        lock (threading.RLock): Guards the seats of the carriage, see the module docstring
         seating_configuration (str): The seating config as 'x+y' where 0 <= x,y <= 9 for x,y: int
         num_rows (int): The number of rows in the carriage
         seats (list[tuple[list[Seat], list[Seat]]]): A list of tuples where each tuple contains a list of left and right seats in a row
@@ -57,15 +318,32 @@ class Carriage:
         get_seat_num(seat_num: int) -> Seat: Return the seat object for the given seat number in the carriage
         get_seat_name(passenger_name: str) -> Seat: Return the seat object for the given passenger name in the carriage
         book_passenger(name: str, seat_num: int) -> None: Books a passenger into the specified seat number
+        unbook_seat(seat_num: int) -> None: Remove the passenger from the specified seat
+        unbook_passenger(passenger_name: str) -> int: Remove the passenger with the specified name
+        snapshot() -> CarriageVersion: Immutable copy of the current state, cached until the next change
+        free_mask(preference: Optional[str]) -> int: Bitmask of the free seats with a preference
+        free_seats(preference: Optional[str]) -> list[int]: Numbers of the free seats with a preference
+        free_mask_for(first, last, preference) -> int: Bitmask of the seats free between two stops
+        book_leg(name, seat_num, first, last) -> None: Book a seat between two stops
+        unbook_leg(seat_num, first) -> str: Remove the leg booking boarding at a stop
     """  # noqa pylint: disable=line-too-long
 
-    def __init__(self, seating_configuration: str, num_rows: int):
+    def __init__(self, seating_configuration: str, num_rows: int, number: int = 1):
         """Create a new empty carriage with the specified seating configuration.
 
         Args:
             seating_configuration (str): seating_configuration in the format 'x+y' where 0 <= x,y <= 9 for x,y: int
             num_rows (int): The number of rows in the carriage
+            number (int): The carriage number (default: 1)
         """  # noqa
+        self.number = number
+        self.occupied = 0
+        self.leg_occupied: list[int] = []
+        self.version = 0
+        self._saved_version: Optional[int] = None
+        self.name_observer: Optional[Callable[[int, int, int], None]] = None
+        self._snapshot: Optional[CarriageVersion] = None
+        self.lock = threading.RLock()
         self.seating_configuration = seating_configuration
         self.num_rows = num_rows
 
@@ -85,12 +363,12 @@ class Carriage:
             left = []
             for _ in range(self.num_left_seats):
                 seat_num += 1
-                left.append(Seat(seat_num))
+                left.append(Seat(seat_num, carriage=self))
 
             right = []
             for _ in range(self.num_right_seats):
                 seat_num += 1
-                right.append(Seat(seat_num))
+                right.append(Seat(seat_num, carriage=self))
             self.seats.append((left, right))
 
         self.total_seats = len(self._flat_seats)
@@ -122,9 +400,65 @@ class Carriage:
     @property
     def remaining_seats(self) -> int:
         """Number of seats were seat.is_booked => False"""
-        return self.total_seats - len(
-            list(filter(lambda s: s.is_booked(), self._flat_seats))
-        )
+        return self.total_seats - self.occupied.bit_count()
+
+    @property
+    def attributes(self) -> SeatAttributes:
+        """Attribute bitmasks of the carriage's layout, shared by equal layouts."""
+        return seat_attributes(self.seating_configuration, self.num_rows)
+
+    def free_mask(self, preference: Optional[str] = None) -> int:
+        """Bitmask of the free seats with the preference (WINDOW, AISLE, TABLE or None for any).
+
+        Raises:
+            ValueError: If the preference is unknown
+        """  # noqa
+        return self.attributes.mask(preference) & ~self.occupied
+
+    def free_seats(self, preference: Optional[str] = None) -> list[int]:
+        """Numbers of the free seats with the preference, see free_mask."""
+        return seats_in_mask(self.free_mask(preference))
+
+    def free_mask_for(
+        self, first: int, last: int, preference: Optional[str] = None
+    ) -> int:
+        """Bitmask of the seats with the preference that are free from stop index first to last.
+
+        A seat is free if it has no whole trip booking and no leg booking on any
+        of the segments in between.
+
+        Raises:
+            ValueError: If the preference is unknown
+        """  # noqa
+        legs_any = 0
+        on_leg = 0
+        for segment, mask in enumerate(self.leg_occupied):
+            legs_any |= mask
+            if first <= segment < last:
+                on_leg |= mask
+        # Seats booked but not by legs are booked for the whole trip
+        whole_trip = self.occupied & ~legs_any
+        return self.attributes.mask(preference) & ~(whole_trip | on_leg)
+
+    def _seat_changed(self, seat_num: int, booked: bool) -> None:
+        """Called by the seats whenever their passenger changes."""
+        self.version += 1
+        if booked:
+            self.occupied |= 1 << (seat_num - 1)
+        else:
+            self.occupied &= ~(1 << (seat_num - 1))
+
+    def _leg_changed(self, seat_num: int, first: int, last: int, booked: bool) -> None:
+        """Called by the seats whenever a leg is booked or unbooked."""
+        bit = 1 << (seat_num - 1)
+        if len(self.leg_occupied) < last:
+            self.leg_occupied.extend([0] * (last - len(self.leg_occupied)))
+        for segment in range(first, last):
+            if booked:
+                self.leg_occupied[segment] |= bit
+            else:
+                self.leg_occupied[segment] &= ~bit
+        self._seat_changed(seat_num, self.get_seat_num(seat_num).is_booked())
 
     def get_seat_num(self, seat_num: int) -> Seat:
         """Return the seat object for the given seat number in the carriage
@@ -138,7 +472,7 @@ class Carriage:
         Raises:
             IndexError: If the seat number is invalid
         """
-        if seat_num < 1 or seat_num > len(self._flat_seats):
+        if seat_num < 1 or seat_num > self.total_seats:
             raise IndexError(f"Invalid seat number {seat_num}")
 
         # Total row width
@@ -160,6 +494,7 @@ class Carriage:
 
         return self.seats[row - 1][1][row_index - 1 - self.num_left_seats]
 
+    @timed("lookup")
     def get_seat_name(self, passenger_name: str) -> Seat:
         """Return the seat object for the given passenger name in the carriage
 
@@ -173,10 +508,14 @@ class Carriage:
             KeyError: If no seat is found for the passenger
             ValueError: If multiple seats are found for the passenger
         """
+        # A name without an id was never booked anywhere
+        name_id = NAMES.lookup(passenger_name)
+        if not name_id:
+            raise KeyError(f"No seat found for passenger {passenger_name}")
 
         # Get all matches
         seat_filter = filter(
-            lambda s: s.passenger_name == passenger_name,
+            lambda s: s.name_id == name_id,
             self._flat_seats,
         )
 
@@ -191,6 +530,7 @@ class Carriage:
         # Only one match possible, return
         return matches[0]
 
+    @timed("book")
     def book_passenger(self, name: str, seat_num: int) -> None:
         """Books a passenger into the specified seat number.
 
@@ -209,19 +549,143 @@ class Carriage:
         except IndexError as e:
             raise IndexError(f"Invalid seat number {seat_num}") from e
 
-        # Check booking status
-        if seat.is_booked():
-            raise ValueError(f"Seat {seat_num} is already booked")
+        # Check and set must happen under the lock, otherwise two threads can
+        # both see the seat as free and book it
+        with self.lock:
+            # Check booking status
+            if seat.is_booked():
+                raise ValueError(f"Seat {seat_num} is already booked")
 
-        # Perform booking
-        seat.passenger_name = name
+            # Perform booking
+            seat.passenger_name = name
+
+    @timed("unbook")
+    def unbook_seat(self, seat_num: int) -> None:
+        """Remove the passenger from the specified seat, if any.
+
+        Raises:
+            IndexError: If the seat number is invalid
+        """
+        seat = self.get_seat_num(seat_num)
+        with self.lock:
+            seat.unbook()
+
+    @timed("book")
+    def book_leg(self, name: str, seat_num: int, first: int, last: int) -> None:
+        """Book a passenger into a seat from stop index first to stop index last.
+
+        Raises:
+            IndexError: If the seat number is invalid
+            ValueError: If the stops are not in order or the seat is taken on the way
+        """
+        if not 0 <= first < last:
+            raise ValueError(f"Invalid leg from stop {first} to stop {last}")
+        seat = self.get_seat_num(seat_num)
+        with self.lock:
+            seat.book_leg(first, last, name)
+
+    @timed("unbook")
+    def unbook_leg(self, seat_num: int, first: int) -> str:
+        """Remove the leg booking of a seat that boards at stop index first, return its name.
+
+        Raises:
+            IndexError: If the seat number is invalid
+            KeyError: If there is no such leg booking
+        """  # noqa
+        seat = self.get_seat_num(seat_num)
+        with self.lock:
+            return seat.unbook_leg(first)
+
+    @timed("unbook")
+    def unbook_passenger(self, passenger_name: str) -> int:
+        """Remove the passenger with the specified name and return the freed seat number.
+
+        Raises:
+            KeyError: If no seat is found for the passenger
+            ValueError: If multiple seats are found for the passenger
+        """
+        with self.lock:
+            seat = self.get_seat_name(passenger_name)
+            seat.unbook()
+        return seat.number
+
+    def snapshot(self) -> "CarriageVersion":
+        """Immutable copy of the seats, the same object until a seat changes."""
+        with self.lock:
+            if self._snapshot is None or self._snapshot.version != self.version:
+                self._snapshot = CarriageVersion(
+                    self.number,
+                    self.seating_configuration,
+                    self.num_rows,
+                    self.num_left_seats,
+                    self.num_right_seats,
+                    tuple(
+                        (
+                            tuple(
+                                SeatVersion(s.number, s.name_id, s.legs) for s in left
+                            ),
+                            tuple(
+                                SeatVersion(s.number, s.name_id, s.legs) for s in right
+                            ),
+                        )
+                        for left, right in self.seats
+                    ),
+                    self.occupied,
+                    self.version,
+                )
+            return self._snapshot
+
+    @property
+    def dirty(self) -> bool:
+        return self.version != self._saved_version
+
+    def __getstate__(self):
+        """Locks can not be pickled or copied, leave it out, and the cached version."""
+        state = self.__dict__.copy()
+        del state["lock"]
+        state.pop("_snapshot", None)
+        state.pop("_saved_version", None)
+        state.pop("name_observer", None)
+        return state
+
+    def __setstate__(self, state):
+        """Restore from pickle with a new lock, older pickles lack a number.
+
+        The seats are reconnected to the carriage and the occupancy bitmasks
+        are rebuilt from them. A restored carriage is not dirty.
+        """
+        state.setdefault("number", 1)
+        state.setdefault("version", 0)
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+        self._snapshot = None
+        self.name_observer = None
+        self.occupied = 0
+        self.leg_occupied = []
+        for seat in self._flat_seats:
+            seat._carriage = self  # pylint: disable=protected-access
+            if seat.is_booked():
+                self.occupied |= 1 << (seat.number - 1)
+            for first, last, _ in seat.legs:
+                self._leg_changed(seat.number, first, last, True)
+        self.version = state["version"]
+        self._saved_version = self.version
 
     def __str__(self):
         return f"Carriage: {self.seating_configuration} with {self.num_rows} rows"
 
 
 class Train:
-    """Represents a train with carriages, a number and destination and arrival times and cities respectively."""  # noqa
+    """Represents a train with carriages, a number and destination and arrival times and cities respectively.
+
+    The train calls at stops, from start to dest. Segment i is the part of the
+    trip between stop i and stop i + 1. Seats can be booked for the whole trip
+    or for a leg between two stops, which frees the seat for the other segments.
+
+    Passengers that do not get a seat can wait in the train's waitlist. A seat
+    unbooked through unbook_seat or unbook_passenger goes straight to the
+    passenger who has waited longest for its carriage.
+    """  # noqa
 
     DESTINATIONS = [
         "Stockholm C",
@@ -256,6 +720,7 @@ class Train:
         start: str,
         dest: str,
         carriages: Optional[list[Carriage]] = None,
+        stops: Optional[list[str]] = None,
     ):
         """Make new Train.
 
@@ -266,6 +731,10 @@ class Train:
             start (str): Starting city
             dest (str): Destination city
             carriages (Optional[list[Carriage]], optional): Carriages to be added if applicable. Defaults to None.
+            stops (Optional[list[str]], optional): All stops in order, from start to dest. Defaults to [start, dest].
+
+        Raises:
+            ValueError: If stops does not run from start to dest
         """  # noqa
         self.number = number
         self.departure = departure
@@ -274,6 +743,19 @@ class Train:
         self.dest = dest
         self.carriages: list[Carriage] = carriages if carriages is not None else []
 
+        self.stops = stops if stops is not None else [start, dest]
+        if len(self.stops) < 2 or (self.stops[0], self.stops[-1]) != (start, dest):
+            raise ValueError("Stops must run from start to dest")
+
+        self.waitlist = Waitlist()
+
+        # What was last saved or loaded and where, see dirty
+        self._saved_json: Optional[dict] = None
+        self._saved_root: Optional[Path] = None
+        self._saved_codec: Optional[str] = None
+        self._snapshot: Optional[TrainVersion] = None
+
+    @timed("book")
     def book_passenger(
         self, carriage: int, seat_number: int, passenger_name: str
     ) -> None:
@@ -292,35 +774,175 @@ class Train:
         car = self.carriages[carriage]
         car.book_passenger(passenger_name, seat_number)
 
-    def unbook_passenger(self, carriage_num: int, name: str) -> None:
+    @timed("book")
+    def book_passengers(self, seats: Iterable[tuple[int, int, str]]) -> None:
+        """Book several seats, possibly in different carriages, all or nothing.
+
+        Args:
+            seats (Iterable[tuple[int, int, str]]): (carriage index, seat number, passenger name) for each booking
+
+        Raises:
+            ValueError: If any of the seats is already booked or appears twice, nothing is booked
+            IndexError: If any carriage number and/or seat number is invalid, nothing is booked
+        """  # noqa
+        seats = list(seats)
+
+        with self.locked(car_num for car_num, _, _ in seats):
+            # Validate everything before the first booking is made
+            wanted = set()
+            for car_num, seat_num, _ in seats:
+                if self.carriages[car_num].get_seat_num(seat_num).is_booked():
+                    raise ValueError(f"Seat {seat_num} is already booked")
+                if (car_num, seat_num) in wanted:
+                    raise ValueError(f"Seat {seat_num} requested twice")
+                wanted.add((car_num, seat_num))
+
+            for car_num, seat_num, name in seats:
+                self.carriages[car_num].book_passenger(name, seat_num)
+
+    def leg(self, from_stop: str, to_stop: str) -> tuple[int, int]:
+        """Stop indices of a leg of the trip.
+
+        Raises:
+            ValueError: If a stop is not on the trip or they are in the wrong order
+        """
+        try:
+            first, last = self.stops.index(from_stop), self.stops.index(to_stop)
+        except ValueError as e:
+            raise ValueError(f"Train {self.number} does not stop there") from e
+        if first >= last:
+            raise ValueError(f"{from_stop} is not before {to_stop}")
+        return first, last
+
+    @timed("book")
+    def book_leg(
+        self,
+        carriage: int,
+        seat_number: int,
+        passenger_name: str,
+        from_stop: str,
+        to_stop: str,
+    ) -> None:
+        """Book a passenger into a seat from one stop to another.
+
+        Raises:
+            ValueError: If the seat is taken on the leg or the stops are invalid
+            IndexError: If carriage number and/or seat number is invalid
+        """
+        first, last = self.leg(from_stop, to_stop)
+        self.carriages[carriage].book_leg(passenger_name, seat_number, first, last)
+
+    def free_seats_for(
+        self, from_stop: str, to_stop: str, preference: Optional[str] = None
+    ) -> list[tuple[int, int]]:
+        """(carriage index, seat number) of every seat free from one stop to another.
+
+        Raises:
+            ValueError: If the stops or the preference are invalid
+        """
+        first, last = self.leg(from_stop, to_stop)
+        return [
+            (car_num, seat_num)
+            for car_num, car in enumerate(self.carriages)
+            for seat_num in seats_in_mask(car.free_mask_for(first, last, preference))
+        ]
+
+    @contextmanager
+    def locked(self, carriage_nums: Iterable[int]):
+        """Hold the locks of the specified carriages, taken in the documented lock order.
+
+        Args:
+            carriage_nums (Iterable[int]): Carriage indices, duplicates are allowed
+
+        Raises:
+            IndexError: If a carriage index is out of range
+        """  # noqa
+        # Validate first so that no lock is left taken on error
+        cars = [self.carriages[num] for num in sorted(set(carriage_nums))]
+        with ExitStack() as stack:
+            for car in cars:
+                stack.enter_context(car.lock)
+            yield
+
+    @timed("unbook")
+    def unbook_passenger(self, carriage_num: int, name: str) -> Optional[str]:
         """Unbook a passenger with the specified name from the specified carriage.
 
+        The freed seat goes to the first passenger in the waitlist for the carriage.
+
         Args:
             carriage (int): Carriage index to be unbooked from
             name (str): Name of passenger to be unbooked
 
+        Returns:
+            Optional[str]: Name of the waiting passenger who got the seat, if any
+
         Raises:
             KeyError: If no seat is found for the specified passenger
             ValueError: If multiple matches found
             IndexError: If carriage num is out of range
         """
 
-        # Try to get appropriate seat and unbook, get_seat_name raises errors on failure
-        seat = self.carriages[carriage_num].get_seat_name(name)
-        seat.unbook()
+        car = self.carriages[carriage_num]
+        with car.lock:
+            # Try to get appropriate seat and unbook, get_seat_name raises errors on failure
+            seat_num = car.unbook_passenger(name)
+            waiting = self.give_to_waiting(carriage_num, seat_num)
+        return waiting.name if waiting is not None else None
 
-    def unbook_seat(self, carriage_num: int, seat_num: int) -> None:
+    def unbook_seat(self, carriage_num: int, seat_num: int) -> Optional[str]:
         """Unbook the specified seat in the given carriage.
 
+        The freed seat goes to the first passenger in the waitlist for the carriage.
+
         Args:
             carriage_num (int): Number of the carriage
             seat_num (int): Seat to be unbooked
 
+        Returns:
+            Optional[str]: Name of the waiting passenger who got the seat, if any
+
+        Raises:
+            IndexError: If seat does not exist or carriage num out of range
+        """
+        waiting = self.free_seat(carriage_num, seat_num)
+        return waiting.name if waiting is not None else None
+
+    @timed("unbook")
+    def free_seat(self, carriage_num: int, seat_num: int) -> Optional[WaitlistEntry]:
+        """Like unbook_seat, but return the waitlist entry of who got the seat.
+
+        An empty seat stays empty, the waitlist is only asked when a passenger
+        was actually removed.
+
         Raises:
             IndexError: If seat does not exist or carriage num out of range
         """
-        # Try removing, invalid seat raises error from get_seat_num
-        self.carriages[carriage_num].get_seat_num(seat_num).unbook()
+        car = self.carriages[carriage_num]
+        with car.lock:
+            # Invalid seat raises error from get_seat_num
+            if not car.get_seat_num(seat_num).passenger_name:
+                return None
+            car.unbook_seat(seat_num)
+            return self.give_to_waiting(carriage_num, seat_num)
+
+    def give_to_waiting(
+        self, carriage_num: int, seat_num: int
+    ) -> Optional[WaitlistEntry]:
+        """Give a free seat to the next waiting passenger, if any, and return their entry.
+
+        Nothing happens if the seat is still booked, on a leg for instance.
+        """  # noqa
+        if not self.waitlist:
+            return None
+        car = self.carriages[carriage_num]
+        with car.lock:
+            if car.get_seat_num(seat_num).is_booked():
+                return None
+            waiting = self.waitlist.pop_entry_for(carriage_num)
+            if waiting is not None:
+                car.book_passenger(waiting.name, seat_num)
+        return waiting
 
     def __lt__(self, other) -> bool:
         """Comapare based on departure time."""
@@ -329,7 +951,36 @@ class Train:
             raise TypeError("Only supported for values of type Train.")
         return self.departure < other.departure
 
-    def serialize(self, root_path: str) -> None:
+    @property
+    def dirty(self) -> bool:
+        """True if the train changed since it was last saved or loaded."""
+        return self._saved_json != self._json() or any(
+            car.dirty for car in self.carriages
+        )
+
+    def needs_save(self, root_path: str, codec: Optional[str] = None) -> bool:
+        """True if saving to root_path with codec would change what is on disk."""
+        return (
+            self._saved_root != Path(root_path).resolve()
+            or self._saved_codec != codec
+            or self.dirty
+        )
+
+    def _json(self) -> dict:
+        # Make a dict representing the train
+        return {
+            "number": self.number,
+            "departure": self.departure.isoformat(),
+            "arrival": self.arrival.isoformat(),
+            "start": self.start,
+            "dest": self.dest,
+            "stops": self.stops,
+            "waitlist": self.waitlist.to_json(),
+            "num_carriages": len(self.carriages),
+        }
+
+    @timed("save")
+    def serialize(self, root_path: str, codec: Optional[str] = None) -> None:
         """Serializes the train to a directory named train_n where n is Train.number.
 
         Directory structure:
@@ -342,44 +993,66 @@ class Train:
                 ...
                 -carriage_n.pickle
 
+        With a codec the carriage files are compressed and get its suffix
+        (carriage_1.pickle.xz for lzma), train.json records the codec.
+
+        Every file is replaced atomically, so a crash leaves either the old or
+        the new file. If the train was last saved to or loaded from root_path
+        with the same codec, only the carriages that changed since are written.
+
         Args:
             root_path (str): Path to root directory
-        """
+            codec (Optional[str]): None, "zlib" or "lzma", see biljettbokning.compression
+
+        Raises:
+            ValueError: If the codec is unknown
+        """  # noqa
+        compression.check_codec(codec)
         root = Path(root_path)
 
         if root == Path.cwd():
             # In case the user cancels save, return
             return
 
-        # Make a dict representing the train
-        # "carriages" is a list of paths to the carriage pickle files
-        repr_dict = {
-            "number": self.number,
-            "departure": self.departure.isoformat(),
-            "arrival": self.arrival.isoformat(),
-            "start": self.start,
-            "dest": self.dest,
-            "num_carriages": len(self.carriages),
-        }
-
         # make a dir for this specific train
         train_dir = root / f"train_{self.number}"
-        if train_dir.exists():
-            os.system(
-                ("rmdir /s /q " if os.name == "nt" else "rmdir -r ") + str(train_dir)
-            )
-        os.mkdir(train_dir)
-
-        # append appropriate paths and pickle carriage to appropriate file
-        for i, carriage in enumerate(self.carriages):
-            carriage_path = train_dir / f"carriage_{i}.pickle"
+        same_place = (
+            self._saved_root == root.resolve()
+            and self._saved_codec == codec
+            and train_dir.is_dir()
+        )
+        train_dir.mkdir(parents=True, exist_ok=True)
 
-            with open(carriage_path, "wb") as f:
-                pickle.dump(carriage, f)
+        # Carriages first, train.json says how many there are and comes last
+        names = [
+            f"carriage_{i}.pickle{compression.SUFFIXES[codec]}"
+            for i in range(len(self.carriages))
+        ]
+        for carriage, name in zip(self.carriages, names):
+            if same_place and not carriage.dirty:
+                continue
+            # A consistent copy, compressed and written without holding the lock
+            with carriage.lock:
+                data = pickle.dumps(carriage)
+                version = carriage.version
+            data = compression.compress(data, codec, f"train_{self.number}/{name}")
+            _write_atomic(train_dir / name, data)
+            carriage._saved_version = version  # pylint: disable=protected-access
 
         # dump the dict
-        with open(train_dir / "train.json", "w", encoding="utf-8") as f:
-            json.dump(repr_dict, f)
+        repr_dict = self._json()
+        _write_atomic(
+            train_dir / "train.json",
+            json.dumps({**repr_dict, "codec": codec}).encode("utf-8"),
+        )
+        self._saved_json = repr_dict
+        self._saved_root = root.resolve()
+        self._saved_codec = codec
+
+        # Carriages that no longer exist or were saved with another codec
+        for path in train_dir.glob("carriage_*.pickle*"):
+            if path.name not in names:
+                path.unlink()
 
     def menu_text(self) -> str:
         """Get text representation for menu."""
@@ -410,12 +1083,13 @@ class Train:
         # Picka  seating configuration for the train
         config = random.choice(["2+2", "3+2", "2+3", "3+3"])
 
-        for _ in range(random.randint(3, 5)):
-            carriages.append(Carriage(config, random.randint(7, 13)))
+        for i in range(random.randint(3, 5)):
+            carriages.append(Carriage(config, random.randint(7, 13), i + 1))
 
         return Train(num, departure, arrival, start_dest[0], start_dest[1], carriages)
 
     @staticmethod
+    @timed("load")
     def from_file(directory_path: str):
         """Load train for the specified serialization directory."""
         path = Path(directory_path)
@@ -424,8 +1098,10 @@ class Train:
         with open(path / "train.json", "r", encoding="utf-8") as f:
             repr_dict: dict = json.load(f)
 
-        # Remove carriage amount
+        # Remove carriage amount, and the waitlist and codec which older files lack
         num_carriages = repr_dict.pop("num_carriages")
+        waitlist = repr_dict.pop("waitlist", [])
+        codec = repr_dict.pop("codec", None)
 
         # Convert times back into objects
         repr_dict["departure"] = datetime.fromisoformat(repr_dict["departure"])
@@ -433,16 +1109,211 @@ class Train:
 
         # Make train with the correct values
         train = Train(**repr_dict)
+        train.waitlist = Waitlist(waitlist)
 
+        suffix = compression.SUFFIXES[codec]
         for i in range(num_carriages):
-            # Unpickle carriages and load into train
-            with open(path / f"carriage_{i}.pickle", "rb") as f:
+            # Unpickle carriages and load into train, decompressing on the way
+            carriage_path = path / f"carriage_{i}.pickle{suffix}"
+            with (
+                # Keyed like the compression ratio written by serialize
+                timer("read", f"{path.name}/{carriage_path.name}"),
+                compression.open_stream(carriage_path, codec) as f,
+            ):
                 train.carriages.append(pickle.load(f))
 
+        # What is on disk now, only later changes make the train dirty
+        # pylint: disable=protected-access
+        train._saved_json = train._json()
+        train._saved_root = path.parent.resolve()
+        train._saved_codec = codec
         return train
 
+    def snapshot(self) -> "TrainVersion":
+        """Immutable version of the train's current state for lock free reading.
+
+        Unchanged carriages are shared with the previous version, and if no
+        carriage changed the previous version itself is returned.
+        """
+        with self.locked(range(len(self.carriages))):
+            carriages = tuple(car.snapshot() for car in self.carriages)
+
+        previous = self._snapshot
+        if (
+            previous is not None
+            and len(previous.carriages) == len(carriages)
+            and all(a is b for a, b in zip(previous.carriages, carriages))
+            and (previous.number, previous.departure, previous.arrival)
+            == (self.number, self.departure, self.arrival)
+            and (previous.start, previous.dest) == (self.start, self.dest)
+            and previous.stops == tuple(self.stops)
+        ):
+            return previous
+
+        self._snapshot = TrainVersion(
+            self.number,
+            self.departure,
+            self.arrival,
+            self.start,
+            self.dest,
+            carriages,
+            tuple(self.stops),
+        )
+        return self._snapshot
+
+    @timed("render")
     def terminal_repr(self) -> str:
         """Representation for terminal and main menu."""
+        return self.snapshot().terminal_repr()
+
+    def free_seats(self, preference: Optional[str] = None) -> list[tuple[int, int]]:
+        """(carriage index, seat number) of every free seat with the preference.
+
+        Raises:
+            ValueError: If the preference is unknown
+        """
+        return [
+            (car_num, seat_num)
+            for car_num, car in enumerate(self.carriages)
+            for seat_num in car.free_seats(preference)
+        ]
+
+
+def save_trains(
+    trains: Iterable[Train],
+    root_path: str,
+    max_workers: Optional[int] = None,
+    codec: Optional[str] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """Serialize the trains that changed since they were saved to or loaded from root_path.
+
+    The trains are written in parallel by a pool of threads, most of the time
+    goes to writing files which does not hold the GIL. If progress raises,
+    the trains not yet started are skipped and the exception is raised, every
+    train is either saved or left as it was.
+
+    Args:
+        trains (Iterable[Train]): Trains to save if they are dirty
+        root_path (str): Directory for the train_n directories, see Train.serialize
+        max_workers (Optional[int]): Number of threads (default: chosen by Python)
+        codec (Optional[str]): Compression, see biljettbokning.compression (default: none)
+        progress (Optional[Callable[[int, int], None]]): Called with (saved, to save) after every train
+
+    Returns:
+        int: Number of trains written
+    """  # noqa
+    compression.check_codec(codec)
+    dirty = [train for train in trains if train.needs_save(root_path, codec)]
+    if not dirty:
+        return 0
+
+    with ThreadPoolExecutor(max_workers, thread_name_prefix="save") as pool:
+        futures = [pool.submit(train.serialize, root_path, codec) for train in dirty]
+        try:
+            for saved, future in enumerate(as_completed(futures), 1):
+                # Raise the first error of a train, if any
+                future.result()
+                if progress is not None:
+                    progress(saved, len(dirty))
+        except BaseException:
+            pool.shutdown(cancel_futures=True)
+            raise
+    return len(dirty)
+
+
+class SeatVersion(NamedTuple):
+    """A seat as it was in a CarriageVersion."""
+
+    number: int
+    name_id: int
+    legs: tuple[tuple[int, int, int], ...] = ()
+
+    @property
+    def passenger_name(self) -> Optional[str]:
+        return NAMES.name(self.name_id)
+
+    def is_booked(self) -> bool:
+        return self.name_id != 0 or bool(self.legs)
+
+    def __repr__(self):
+        return str(self.number) if not self.is_booked() else "*" * len(str(self.number))
+
+
+@dataclass(frozen=True)
+class CarriageVersion:
+    """Immutable state of a Carriage, laid out like the carriage itself.
+
+    Attributes:
+        seats (tuple): Rows as (left seats, right seats) of SeatVersion
+        occupied (int): Bitmask of the booked seats, see Carriage.occupied
+        version (int): Carriage.version this is a copy of
+    """
+
+    number: int
+    seating_configuration: str
+    num_rows: int
+    num_left_seats: int
+    num_right_seats: int
+    seats: tuple[tuple[tuple[SeatVersion, ...], tuple[SeatVersion, ...]], ...]
+    occupied: int
+    version: int
+
+    @property
+    def total_seats_in_row(self) -> int:
+        return self.num_left_seats + self.num_right_seats
+
+    @property
+    def total_seats(self) -> int:
+        return self.num_rows * self.total_seats_in_row
+
+    @property
+    def remaining_seats(self) -> int:
+        return self.total_seats - self.occupied.bit_count()
+
+    @property
+    def flat_seats(self) -> list[SeatVersion]:
+        return list(itertools.chain(*itertools.chain(*self.seats)))
+
+    def get_seat_num(self, seat_num: int) -> SeatVersion:
+        """Seat by number, see Carriage.get_seat_num.
+
+        Raises:
+            IndexError: If the seat number is invalid
+        """
+        if seat_num < 1 or seat_num > self.total_seats:
+            raise IndexError(f"Invalid seat number {seat_num}")
+        row, index = divmod(seat_num - 1, self.total_seats_in_row)
+        if index < self.num_left_seats:
+            return self.seats[row][0][index]
+        return self.seats[row][1][index - self.num_left_seats]
+
+
+@dataclass(frozen=True)
+class TrainVersion:
+    """Immutable state of a Train at one point in time, see Train.snapshot.
+
+    Has the same attributes as Train, so it can be used wherever a train is
+    only read, for example in a Booking.
+    """
+
+    number: int
+    departure: datetime
+    arrival: datetime
+    start: str
+    dest: str
+    carriages: tuple[CarriageVersion, ...]
+    stops: tuple[str, ...] = ()
+
+    def menu_text(self) -> str:
+        return Train.menu_text(self)  # type: ignore
+
+    def terminal_repr(self) -> str:
+        """Representation for terminal and main menu, rendered once per version."""
+        return self._rendered
+
+    @cached_property
+    def _rendered(self) -> str:
         # Dim 0: each car
         # Dim 1: lines in the cars repr
         cars: list[list[str]] = []
@@ -497,16 +1368,43 @@ class Train:
 
 
 class Booking:
-    """A seat ticket booking abstraction for printing purposes."""
+    """A seat ticket booking abstraction for printing purposes.
+
+    The passenger name is stored as its id in NAMES (name_id) and looked up
+    when printed. A booking of a leg has the stops it is between, a booking of
+    the whole trip has None for both.
+    """
 
-    def __init__(self, name: str, seat_num: int, carriage_num: int, train: Train):
-        self.name = name
+    def __init__(
+        self,
+        name: str,
+        seat_num: int,
+        carriage_num: int,
+        train: Train,
+        from_stop: Optional[str] = None,
+        to_stop: Optional[str] = None,
+    ):
+        self.name_id = NAMES.intern(name)
         self.seat = seat_num
         self.carriage = carriage_num
         self.train = train
+        self.from_stop = from_stop
+        self.to_stop = to_stop
+
+    @property
+    def name(self) -> str:
+        return NAMES.name(self.name_id) or ""
 
+    @timed("render")
     def __str__(self):
         """Get representation for file or terminal printing."""
+        # Times are only known for the first and last stop
+        departure = f"{self.train.departure.time().isoformat("minutes")} {self.train.start}"  # noqa
+        if self.from_stop not in (None, self.train.start):
+            departure = str(self.from_stop)
+        arrival = f"{self.train.arrival.time().isoformat("minutes")} {self.train.dest}"
+        if self.to_stop not in (None, self.train.dest):
+            arrival = str(self.to_stop)
 
         # Add all lines with only information
         lines = [
@@ -515,11 +1413,11 @@ class Booking:
             "",
             f"den {self.train.departure.date().isoformat()}",
             "",
-            f"{self.train.departure.time().isoformat("minutes")} {self.train.start}",
+            departure,
             "|",
             "|",
             "v",
-            f"{self.train.arrival.time().isoformat("minutes")} {self.train.dest}",
+            arrival,
             "",
             f"{self.name}",
             f"Plats {self.seat}, vagn {self.carriage}",
@@ -563,8 +1461,9 @@ class Booking:
             [
                 self.carriage == other.carriage,
                 self.seat == other.seat,
-                self.name == other.name,
+                self.name_id == other.name_id,
                 self.train.number == other.train.number,
+                self.from_stop == other.from_stop,
             ]
         )
 
@@ -574,9 +1473,15 @@ class Bookings:
 
     Instance Methods:
         append(item: Booking): same as list.append
-        remove(train_num: int, carriage_num: int, seat_num: int): Remove booking with specified attributes, if it exists. Otherwise fail silently.
+        remove(train_num: int, carriage_num: int, seat_num: int, from_stop: Optional[str]): Remove booking with specified attributes, if it exists. Otherwise fail silently.
+        save(directory_path: str, codec: Optional[str]): Write the bookings to bookings.jsonl in a directory
+
+    Static methods:
+        load(directory_path: str, trains: Iterable[Train]) -> Bookings: Read bookings written by save
     """  # noqa
 
+    FILE_NAME = "bookings.jsonl"
+
     def __init__(self):
         """Make empty booking list."""
         self._bookings: list[Booking] = []
@@ -585,7 +1490,13 @@ class Bookings:
         """Add a Booking object."""
         self._bookings.append(item)
 
-    def remove(self, train_num: int, carriage_num: int, seat_num: int):
+    def remove(
+        self,
+        train_num: int,
+        carriage_num: int,
+        seat_num: int,
+        from_stop: Optional[str] = None,
+    ):
         """Remove a Booking object that matches the criteria.
 
         carriage_num starts from 1
@@ -594,6 +1505,7 @@ class Bookings:
             train_num (int): train_number
             carriage_num (int): carriage number (starts 1)
             seat_num (int): seat number (starts 1)
+            from_stop (Optional[str]): boarding stop of a leg booking, None for the whole trip
 
         Raises:
             ValueError: if more than one seat is found for the criteria (double booking)
@@ -604,7 +1516,12 @@ class Bookings:
         matching_carriages = list(
             filter(lambda b: b.carriage == carriage_num, matching_trains)
         )
-        matching_seats = list(filter(lambda b: b.seat == seat_num, matching_carriages))
+        matching_seats = list(
+            filter(
+                lambda b: b.seat == seat_num and b.from_stop == from_stop,
+                matching_carriages,
+            )
+        )
 
         # Only single matches allowed with same train-carriage combo
         if len(matching_seats) > 1:
@@ -639,3 +1556,743 @@ class Bookings:
 
     def __str__(self):
         return "\n\n".join(str(b) for b in self._bookings)
+
+    @timed("save")
+    def save(self, directory_path: str, codec: Optional[str] = None) -> None:
+        """Write the bookings to the directory, one JSON object per line.
+
+        The file is bookings.jsonl with the suffix of the codec, see
+        biljettbokning.compression, and is replaced atomically.
+        """
+        compression.check_codec(codec)
+        root = Path(directory_path)
+        name = Bookings.FILE_NAME + compression.SUFFIXES[codec]
+        lines = [
+            json.dumps(
+                {
+                    "train": b.train.number,
+                    "carriage": b.carriage,
+                    "seat": b.seat,
+                    "name": b.name,
+                    "from": b.from_stop,
+                    "to": b.to_stop,
+                }
+            )
+            + "\n"
+            for b in self._bookings
+        ]
+        data = compression.compress("".join(lines).encode("utf-8"), codec, name)
+        _write_atomic(root / name, data)
+
+        # A file saved with another codec would be found by load
+        for other, suffix in compression.SUFFIXES.items():
+            if other != codec:
+                (root / (Bookings.FILE_NAME + suffix)).unlink(missing_ok=True)
+
+    @staticmethod
+    @timed("load")
+    def load(directory_path: str, trains: Iterable[Train]) -> "Bookings":
+        """Read the bookings saved in a directory, empty if there are none.
+
+        The file is read one line at a time, so only the bookings themselves
+        are held in memory. Bookings on trains that are not in trains are
+        left out.
+        """
+        root = Path(directory_path)
+        by_number = {train.number: train for train in trains}
+        bookings = Bookings()
+        for codec, suffix in compression.SUFFIXES.items():
+            path = root / (Bookings.FILE_NAME + suffix)
+            if not path.exists():
+                continue
+            with timer("read", path.name), compression.open_stream(path, codec) as f:
+                for line in f:
+                    record = json.loads(line)
+                    train = by_number.get(record["train"])
+                    if train is None:
+                        continue
+                    bookings.append(
+                        Booking(
+                            record["name"],
+                            record["seat"],
+                            record["carriage"],
+                            train,
+                            record["from"],
+                            record["to"],
+                        )
+                    )
+            break
+        return bookings
+
+
+class BookedSeat(NamedTuple):
+    """A booked seat found by booked_seats, carriage is an index like in Fleet.
+
+    A leg booking has the stops it is between, a booking of the whole trip
+    has None for both.
+    """
+
+    train: TrainVersion
+    carriage: int
+    seat: int
+    name_id: int
+    from_stop: Optional[str] = None
+    to_stop: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return NAMES.name(self.name_id) or ""
+
+    def booking(self) -> Booking:
+        """The booking of the seat, for printing (carriage numbers start at 1)."""
+        return Booking(
+            self.name,
+            self.seat,
+            self.carriage + 1,
+            self.train,  # type: ignore
+            self.from_stop,
+            self.to_stop,
+        )
+
+
+def booked_seats(
+    trains: Iterable[Train],
+    start: Optional[str] = None,
+    dest: Optional[str] = None,
+    first_day: Optional[date] = None,
+    last_day: Optional[date] = None,
+    name: Optional[str] = None,
+) -> Iterator[BookedSeat]:
+    """Every booked seat of the trains matching the criteria, leg bookings included.
+
+    Trains are filtered before they are read, carriages without bookings are
+    skipped using their occupancy bitmask and only the booked seats in the
+    rest are looked at. Every train is read from a snapshot, so the seats of
+    a train are consistent with each other even while bookings go on.
+
+    Args:
+        trains (Iterable[Train]): Trains to look in
+        start (Optional[str]): Starting city, any if None
+        dest (Optional[str]): Destination city, any if None
+        first_day (Optional[date]): Earliest departure date, no limit if None
+        last_day (Optional[date]): Latest departure date, no limit if None
+        name (Optional[str]): Only seats booked by this passenger, anyone if None
+    """  # noqa
+    name_id = None
+    if name is not None:
+        name_id = NAMES.lookup(name)
+        if not name_id:
+            # Nobody ever had the name
+            return
+
+    for train in trains:
+        if (
+            (start is not None and train.start != start)
+            or (dest is not None and train.dest != dest)
+            or (first_day is not None and train.departure.date() < first_day)
+            or (last_day is not None and train.departure.date() > last_day)
+        ):
+            continue
+
+        version = train.snapshot()
+        for car_num, car in enumerate(version.carriages):
+            for seat_num in seats_in_mask(car.occupied):
+                seat = car.get_seat_num(seat_num)
+                if seat.name_id and name_id in (None, seat.name_id):
+                    yield BookedSeat(version, car_num, seat_num, seat.name_id)
+                for first, last, leg_name_id in seat.legs:
+                    if name_id in (None, leg_name_id):
+                        yield BookedSeat(
+                            version,
+                            car_num,
+                            seat_num,
+                            leg_name_id,
+                            version.stops[first],
+                            version.stops[last],
+                        )
+
+
+class Fleet:
+    """All trains of a run together with the bookings made on them.
+
+    Carriage numbers are indices (starting at 0) like in Train, booking records
+    are stored with carriage numbers starting at 1 like in Booking.
+
+    All methods are safe to call from several threads. Seats are guarded by the
+    carriage locks (see the module docstring), the booking records by a lock of
+    their own which is always taken last.
+
+    Attributes:
+        trains (list[Train]): All trains, sorted by departure
+        bookings (Bookings): All bookings made through the fleet
+        log (CommandLog): Every booking and unbooking, for undo, redo and audit
+        names (NameTable): Ids of the passenger names, shared with all trains (NAMES)
+        passengers (PassengerIndex): Prefix index of the passengers of all trains, for search as you type
+
+    Instance methods:
+        add(train: Train) -> None: Add a train to the fleet
+        get_train(number: int) -> Train: Get the train with the specified number
+        search(start, dest, day) -> list[Train]: Find trains matching the criteria
+        book(train_num, carriage_num, seat_num, name) -> Booking: Book a single seat
+        book_group(train_num, carriage_num, start_seat, names, allow_separate) -> list[Booking]: Book several passengers
+        book_preferred(train_num, name, preference, carriage_num, strict) -> Booking: Book the first free seat with a preference
+        book_leg(train_num, carriage_num, seat_num, name, from_stop, to_stop) -> Booking: Book a seat between two stops
+        unbook_leg(train_num, carriage_num, seat_num, from_stop) -> str: Unbook the leg booking boarding at a stop
+        unbook_seat(train_num, carriage_num, seat_num) -> Optional[str]: Unbook a seat, return who got it from the waitlist
+        wait(train_num, name, carriage_num) -> None: Put a passenger in a train's waitlist
+        unbook_passenger(train_num, carriage_num, name) -> int: Unbook a passenger by name
+        apply_change(train_num, carriage_num, seat_num, expected, name) -> None: Set a seat if it is unchanged
+        undo() -> tuple[Change, ...] / redo() -> tuple[Change, ...]: Undo or redo the latest operation
+        save(directory_path, max_workers) -> int: Write the trains that changed, see save_trains
+        booked_seats(train_num, start, dest, first_day, last_day, name) -> Iterator[BookedSeat]: Booked seats matching the criteria
+    """  # noqa
+
+    def __init__(self, trains: Optional[list[Train]] = None):
+        """Make a new fleet from the given trains (default: no trains)."""
+        self.trains: list[Train] = []
+        self.bookings = Bookings()
+        self.log = CommandLog()
+        self.names = NAMES
+        self.passengers = PassengerIndex()
+        self._by_number: dict[int, Train] = {}
+        self._bookings_lock = threading.Lock()
+
+        for train in trains if trains is not None else []:
+            self._register(train)
+            self.trains.append(train)
+        # One sort for all trains and all passengers instead of one insertion each
+        self.trains.sort()
+        self.passengers.watch_all(self.trains)
+
+    def add(self, train: Train) -> None:
+        """Add a train to the fleet and keep the trains sorted by departure.
+
+        Raises:
+            ValueError: If a train with the same number already exists
+        """
+        self._register(train)
+        # After the trains with the same departure, where a stable sort puts it
+        insort(self.trains, train)
+        self.passengers.watch(train)
+
+    def _register(self, train: Train) -> None:
+        """Make the train findable by number.
+
+        Raises:
+            ValueError: If a train with the same number already exists
+        """
+        if train.number in self._by_number:
+            raise ValueError(f"Train {train.number} already exists")
+        self._by_number[train.number] = train
+
+    def get_train(self, number: int) -> Train:
+        """Get the train with the specified number.
+
+        Raises:
+            KeyError: If no such train exists
+        """
+        try:
+            return self._by_number[number]
+        except KeyError as e:
+            raise KeyError(f"No train with number {number}") from e
+
+    def search(
+        self,
+        start: Optional[str] = None,
+        dest: Optional[str] = None,
+        day: Optional[date] = None,
+    ) -> list[Train]:
+        """Return all trains matching the given criteria in order of departure.
+
+        Args:
+            start (Optional[str]): Starting city, any if None
+            dest (Optional[str]): Destination city, any if None
+            day (Optional[date]): Departure date, any if None
+        """
+        return [
+            train
+            for train in self.trains
+            if (start is None or train.start == start)
+            and (dest is None or train.dest == dest)
+            and (day is None or train.departure.date() == day)
+        ]
+
+    @staticmethod
+    def _carriage(train: Train, carriage_num: int) -> Carriage:
+        """Get a carriage by index without Python's negative indexing.
+
+        Raises:
+            IndexError: If the carriage number is invalid
+        """
+        if not 0 <= carriage_num < len(train.carriages):
+            raise IndexError(f"Invalid carriage number {carriage_num}")
+        return train.carriages[carriage_num]
+
+    @timed("book")
+    def book(
+        self,
+        train_num: int,
+        carriage_num: int,
+        seat_num: int,
+        name: str,
+        flush: bool = True,
+    ) -> Booking:
+        """Book a passenger into a seat and record the booking.
+
+        Args:
+            flush (bool): Notify the log's listeners now, else the caller flushes
+                the log once it holds no carriage lock (default: True)
+
+        Raises:
+            KeyError: If the train does not exist
+            IndexError: If carriage number and/or seat number is invalid
+            ValueError: If the seat is already booked
+        """
+        train = self.get_train(train_num)
+        car = Fleet._carriage(train, carriage_num)
+
+        # The record must be in place before anyone can unbook the seat
+        with car.lock:
+            car.book_passenger(name, seat_num)
+
+            booking = Booking(name, seat_num, carriage_num + 1, train)
+            with self._bookings_lock:
+                self.bookings.append(booking)
+            self.log.record(
+                [(train_num, carriage_num, seat_num, None, name)], flush=False
+            )
+        if flush:
+            self.log.flush()
+        return booking
+
+    @timed("book")
+    def book_group(
+        self,
+        train_num: int,
+        carriage_num: int,
+        start_seat: int,
+        names: list[str],
+        allow_separate: bool = True,
+    ) -> list[Booking]:
+        """Book several passengers in one carriage, adjacent to each other if possible.
+
+        The passengers are placed from start_seat and onwards. If some of those seats
+        are taken the remaining passengers get the free seats closest after, and then
+        before, the first taken seat (as in the booking popup) given allow_separate.
+        Nothing is booked if the group can not be placed.
+
+        Raises:
+            KeyError: If the train does not exist
+            IndexError: If carriage number and/or start seat is invalid
+            ValueError: If the group does not fit in the carriage
+        """  # noqa
+        train = self.get_train(train_num)
+        car = Fleet._carriage(train, carriage_num)
+        # Validates start seat
+        car.get_seat_num(start_seat)
+
+        # Placement and booking must see the same seats
+        with car.lock:
+            if car.remaining_seats < len(names):
+                raise ValueError("Not enough seats left in the carriage")
+
+            seats = Fleet._place_group(car, start_seat, len(names), allow_separate)
+            train.book_passengers(
+                (carriage_num, seat_num, name) for name, seat_num in zip(names, seats)
+            )
+
+            bookings = [
+                Booking(name, seat_num, carriage_num + 1, train)
+                for name, seat_num in zip(names, seats)
+            ]
+            with self._bookings_lock:
+                for booking in bookings:
+                    self.bookings.append(booking)
+            self.log.record(
+                (
+                    (train_num, carriage_num, seat_num, None, name)
+                    for name, seat_num in zip(names, seats)
+                ),
+                flush=False,
+            )
+        self.log.flush()
+
+        return bookings
+
+    @timed("book")
+    def book_preferred(
+        self,
+        train_num: int,
+        name: str,
+        preference: Optional[str] = None,
+        carriage_num: Optional[int] = None,
+        strict: bool = False,
+    ) -> Booking:
+        """Book a passenger into the first free seat with the preference.
+
+        The carriage is searched, or the whole train from the first carriage if
+        carriage_num is None. If no seat has the preference any free seat is
+        taken, unless strict.
+
+        Args:
+            train_num (int): Train number
+            name (str): Passenger name
+            preference (Optional[str]): WINDOW, AISLE, TABLE or None for any seat
+            carriage_num (Optional[int]): Carriage index to search, None for all
+            strict (bool): Fail rather than ignore the preference
+
+        Raises:
+            KeyError: If the train does not exist
+            IndexError: If the carriage number is invalid
+            ValueError: If the preference is unknown or no seat is free
+        """
+        train = self.get_train(train_num)
+        if carriage_num is None:
+            car_nums = list(range(len(train.carriages)))
+        else:
+            car_nums = [carriage_num]
+        cars = [Fleet._carriage(train, num) for num in car_nums]
+
+        preferences = (
+            [preference] if strict or preference is None else [preference, None]
+        )
+        # The seat found must still be free when it is booked
+        booking = None
+        with train.locked(car_nums):
+            for pref in preferences:
+                for car_num, car in zip(car_nums, cars):
+                    mask = car.free_mask(pref)
+                    if mask:
+                        seat_num = (mask & -mask).bit_length()
+                        booking = self.book(
+                            train_num, car_num, seat_num, name, flush=False
+                        )
+                        break
+                if booking is not None:
+                    break
+
+        if booking is None:
+            raise ValueError("No free seat with the preference")
+        self.log.flush()
+        return booking
+
+    @timed("book")
+    def book_leg(
+        self,
+        train_num: int,
+        carriage_num: int,
+        seat_num: int,
+        name: str,
+        from_stop: str,
+        to_stop: str,
+    ) -> Booking:
+        """Book a passenger into a seat from one stop to another and record the booking.
+
+        Leg bookings are not in the command log, which only knows whole trips.
+
+        Raises:
+            KeyError: If the train does not exist
+            IndexError: If carriage number and/or seat number is invalid
+            ValueError: If the stops are invalid or the seat is taken on the leg
+        """  # noqa
+        train = self.get_train(train_num)
+        car = Fleet._carriage(train, carriage_num)
+
+        with car.lock:
+            train.book_leg(carriage_num, seat_num, name, from_stop, to_stop)
+            booking = Booking(
+                name, seat_num, carriage_num + 1, train, from_stop, to_stop
+            )
+            with self._bookings_lock:
+                self.bookings.append(booking)
+        return booking
+
+    @timed("unbook")
+    def unbook_leg(
+        self, train_num: int, carriage_num: int, seat_num: int, from_stop: str
+    ) -> str:
+        """Unbook the leg booking of a seat that boards at from_stop, return the name.
+
+        If that leaves the seat free for the whole trip it goes to the first
+        passenger in the train's waitlist, which is logged as an operation of
+        its own since the leg itself is not.
+
+        Raises:
+            KeyError: If the train or the leg booking does not exist
+            IndexError: If carriage number and/or seat number is invalid
+            ValueError: If the train does not stop at from_stop
+        """
+        train = self.get_train(train_num)
+        car = Fleet._carriage(train, carriage_num)
+        if from_stop not in train.stops:
+            raise ValueError(f"Train {train_num} does not stop at {from_stop}")
+        first = train.stops.index(from_stop)
+
+        with car.lock:
+            name = car.unbook_leg(seat_num, first)
+            with self._bookings_lock:
+                try:
+                    self.bookings.remove(
+                        train_num, carriage_num + 1, seat_num, from_stop
+                    )
+                except ValueError:
+                    pass
+
+                # The last leg freed the whole trip, which the waitlist waits for
+                waiting = train.give_to_waiting(carriage_num, seat_num)
+                if waiting is not None:
+                    self.bookings.append(
+                        Booking(waiting.name, seat_num, carriage_num + 1, train)
+                    )
+            self.log.record(
+                unbooking(train_num, carriage_num, seat_num, None, waiting),
+                flush=False,
+            )
+        self.log.flush()
+        return name
+
+    @staticmethod
+    def _place_group(
+        car: Carriage, start_seat: int, amount: int, allow_separate: bool
+    ) -> list[int]:
+        """Pick seats for a group without booking them.
+
+        Raises:
+            ValueError: If no placement is possible
+        """
+        seats: list[int] = []
+        # Take adjacent seats until the first taken one
+        for seat_num in range(start_seat, start_seat + amount):
+            if seat_num > car.total_seats or car.get_seat_num(seat_num).is_booked():
+                break
+            seats.append(seat_num)
+
+        if len(seats) == amount:
+            return seats
+
+        if not allow_separate:
+            raise ValueError("No adjacent seats available")
+
+        # Closest seats after the first taken seat, then before the starting seat
+        last_seat = start_seat + len(seats)
+        candidates = itertools.chain(
+            range(last_seat + 1, car.total_seats + 1), range(start_seat - 1, 0, -1)
+        )
+        for seat_num in candidates:
+            if len(seats) == amount:
+                break
+            if not car.get_seat_num(seat_num).is_booked():
+                seats.append(seat_num)
+
+        if len(seats) < amount:
+            raise ValueError("Not enough seats left in the carriage")
+
+        return seats
+
+    @timed("unbook")
+    def unbook_seat(
+        self, train_num: int, carriage_num: int, seat_num: int
+    ) -> Optional[str]:
+        """Unbook a seat and remove its booking record, if there is one.
+
+        If someone in the train's waitlist gets the seat they are booked and
+        recorded too, in the same operation of the command log.
+
+        Returns:
+            Optional[str]: Name of the waiting passenger who got the seat, if any
+
+        Raises:
+            KeyError: If the train does not exist
+            IndexError: If carriage number and/or seat number is invalid
+            Bookings.MultipleError: If the seat has more than one booking record
+        """
+        train = self.get_train(train_num)
+        car = Fleet._carriage(train, carriage_num)
+        # Validate before touching the records
+        car.get_seat_num(seat_num)
+
+        waiting = self._unbook_seat(train, carriage_num, seat_num)
+        self.log.flush()
+        return waiting
+
+    def _unbook_seat(
+        self, train: Train, carriage_num: int, seat_num: int
+    ) -> Optional[str]:
+        """Unbook a valid seat and log it without notifying the log's listeners.
+
+        The caller flushes the log once it holds no carriage lock.
+        """
+        car = train.carriages[carriage_num]
+        with car.lock:
+            name = car.get_seat_num(seat_num).passenger_name
+            with self._bookings_lock:
+                try:
+                    self.bookings.remove(train.number, carriage_num + 1, seat_num)
+                except ValueError:
+                    # Seat was not booked through this fleet, nothing to remove
+                    pass
+
+                waiting = train.free_seat(carriage_num, seat_num)
+                if waiting is not None:
+                    self.bookings.append(
+                        Booking(waiting.name, seat_num, carriage_num + 1, train)
+                    )
+
+            # Taking the waiting passenger off the waitlist is logged too, so
+            # that undo puts them back first in the queue
+            self.log.record(
+                unbooking(train.number, carriage_num, seat_num, name, waiting),
+                flush=False,
+            )
+        return waiting.name if waiting is not None else None
+
+    def wait(
+        self, train_num: int, name: str, carriage_num: Optional[int] = None
+    ) -> None:
+        """Put a passenger last in a train's waitlist for a carriage index, or any if None.
+
+        Raises:
+            KeyError: If the train does not exist
+            IndexError: If the carriage number is invalid
+        """  # noqa
+        train = self.get_train(train_num)
+        if carriage_num is not None:
+            Fleet._carriage(train, carriage_num)
+        train.waitlist.add(name, carriage_num)
+
+    @timed("unbook")
+    def unbook_passenger(self, train_num: int, carriage_num: int, name: str) -> int:
+        """Unbook a passenger by name and return the seat number that was freed.
+
+        Raises:
+            KeyError: If the train or passenger does not exist
+            ValueError: If multiple seats are booked with that name
+            IndexError: If carriage number is invalid
+        """
+        train = self.get_train(train_num)
+        car = Fleet._carriage(train, carriage_num)
+        # Hold the lock so that the seat found is the seat unbooked
+        with car.lock:
+            seat = car.get_seat_name(name)
+            self._unbook_seat(train, carriage_num, seat.number)
+        self.log.flush()
+        return seat.number
+
+    def apply_change(
+        self,
+        train_num: int,
+        carriage_num: int,
+        seat_num: int,
+        expected: Optional[str],
+        name: Optional[str],
+    ) -> None:
+        """Set the passenger of a seat (None to empty it) and its booking record.
+
+        Used by the command log, the change itself is not logged.
+
+        Raises:
+            KeyError: If the train does not exist
+            IndexError: If carriage number and/or seat number is invalid
+            ValueError: If the seat does not hold the expected passenger
+        """
+        train = self.get_train(train_num)
+        car = Fleet._carriage(train, carriage_num)
+        if is_waitlist_change(seat_num):
+            queue = waitlist_carriage(carriage_num, seat_num)
+            if expected:
+                train.waitlist.take(expected, queue)
+            if name:
+                train.waitlist.push_front(name, queue)
+            return
+        seat = car.get_seat_num(seat_num)
+
+        with car.lock, self._bookings_lock:
+            if seat.name_id != self.names.lookup(expected):
+                raise ValueError(f"Seat {seat_num} has changed")
+
+            if expected:
+                try:
+                    self.bookings.remove(train_num, carriage_num + 1, seat_num)
+                except ValueError:
+                    pass
+                car.unbook_seat(seat_num)
+            if name:
+                car.book_passenger(name, seat_num)
+                # Not train.snapshot(), that takes every carriage lock
+                self.bookings.append(Booking(name, seat_num, carriage_num + 1, train))
+
+    def undo(self) -> tuple[Change, ...]:
+        """Undo the latest booking operation, see CommandLog.undo."""
+        return self.log.undo(self)
+
+    def redo(self) -> tuple[Change, ...]:
+        """Redo the latest undone booking operation, see CommandLog.redo."""
+        return self.log.redo(self)
+
+    def booked_seats(
+        self,
+        train_num: Optional[int] = None,
+        start: Optional[str] = None,
+        dest: Optional[str] = None,
+        first_day: Optional[date] = None,
+        last_day: Optional[date] = None,
+        name: Optional[str] = None,
+    ) -> Iterator[BookedSeat]:
+        """Every booked seat matching the criteria, see booked_seats.
+
+        Raises:
+            KeyError: If there is no train with number train_num
+        """
+        trains = self.trains if train_num is None else [self.get_train(train_num)]
+        return booked_seats(trains, start, dest, first_day, last_day, name)
+
+    @staticmethod
+    @timed("load")
+    def from_directory(
+        directory_path: str, include: Optional[Callable[[int], bool]] = None
+    ) -> "Fleet":
+        """Load a fleet from a directory of serialized trains (see Train.serialize).
+
+        Args:
+            directory_path (str): Directory containing the train_n directories
+            include (Optional[Callable[[int], bool]]): Only load the trains whose
+                number this returns True for (default: load all)
+        """
+        root = Path(directory_path)
+        trains = []
+        for path in sorted(root.iterdir()):
+            if not path.is_dir():
+                continue
+            # Skip without reading anything if the number says so
+            number = path.name.removeprefix("train_")
+            if include is not None and number.isdigit() and not include(int(number)):
+                continue
+            trains.append(Train.from_file(str(path)))
+
+        fleet = Fleet(trains)
+        fleet.bookings = Bookings.load(directory_path, fleet.trains)
+        return fleet
+
+    def save(
+        self,
+        directory_path: str,
+        max_workers: Optional[int] = None,
+        codec: Optional[str] = None,
+    ) -> int:
+        """Write the trains that changed and the bookings to a directory.
+
+        See save_trains and Bookings.save.
+
+        Returns:
+            int: Number of trains written
+        """
+        written = save_trains(self.trains, directory_path, max_workers, codec)
+        with self._bookings_lock:
+            self.bookings.save(directory_path, codec)
+        return written
+
+    def __len__(self) -> int:
+        return len(self.trains)
+
+    def __iter__(self):
+        return iter(self.trains)
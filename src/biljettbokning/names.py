@@ -0,0 +1,84 @@
+"""Table of passenger names interned to integer ids.
+
+Seats, seat versions and bookings store the id of their passenger's name
+instead of the name, so every name is held once however many seats, bookings
+and train versions refer to it, and names are compared as integers. The string
+is only looked up for display, tickets and saving.
+
+Id 0 is reserved for no passenger. Ids are never reused or removed during a
+run, a name that is booked again gets its old id back. Saved carriages store
+the names themselves, so ids only have to be stable within a process.
+"""
+
+import sys
+import threading
+from typing import Optional
+
+
+class NameTable:
+    """Two way mapping between passenger names and integer ids.
+
+    Safe to use from several threads, reading never takes a lock.
+
+    Instance methods:
+        intern(name) -> int: Id of a name, adding the name if it is new
+        lookup(name) -> Optional[int]: Id of a name if it has one, without adding it
+        name(name_id) -> Optional[str]: The name of an id, None for id 0
+        nbytes() -> int: Memory used by the table and its names
+    """
+
+    def __init__(self):
+        self._names: list[Optional[str]] = [None]
+        self._ids: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def intern(self, name: Optional[str]) -> int:
+        """Id of name, 0 for None or an empty name."""
+        if not name:
+            return 0
+        name_id = self._ids.get(name)
+        if name_id is not None:
+            return name_id
+
+        with self._lock:
+            name_id = self._ids.get(name)
+            if name_id is None:
+                # The name must be resolvable before its id is handed out
+                self._names.append(name)
+                name_id = len(self._names) - 1
+                self._ids[name] = name_id
+            return name_id
+
+    def lookup(self, name: Optional[str]) -> Optional[int]:
+        """Id of name without interning it, None if no seat or booking ever had it."""
+        if not name:
+            return 0
+        return self._ids.get(name)
+
+    def name(self, name_id: int) -> Optional[str]:
+        """Name with the id, None for 0.
+
+        Raises:
+            IndexError: If the id was never handed out
+        """
+        return self._names[name_id]
+
+    def nbytes(self) -> int:
+        """Bytes used by the table, the names included."""
+        return (
+            sys.getsizeof(self._names)
+            + sys.getsizeof(self._ids)
+            + sum(sys.getsizeof(name) for name in self._ids)
+        )
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._ids
+
+
+# Names of every seat and booking in the process. Trains, carriages and bookings
+# also exist without a Fleet (the GUI and loaded pickles), so they share this
+# table rather than one per fleet
+NAMES = NameTable()
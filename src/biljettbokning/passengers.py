@@ -0,0 +1,196 @@
+"""Prefix index over the passengers of many trains, for search as you type.
+
+The index is a sorted list of (folded name, name, train, carriage, seat)
+entries. All names starting with a prefix are next to each other in it, so a
+query is a binary search for the first one followed by reading the matches,
+O(log n + results). Each train also has a sorted list of its own, so a search
+on one train never reads the matches on the others. Names are compared
+casefolded, "an" finds "Anna Andersson".
+
+The index keeps itself up to date: watch(train) indexes the passengers a
+train already has and makes its carriages report every later change of
+passenger (Carriage.name_observer). Carriage numbers are indices starting at
+0 like in Fleet. Only bookings of the whole trip are indexed, not legs.
+"""
+
+from bisect import bisect_left, insort
+import threading
+from typing import Iterable, NamedTuple, Optional, TYPE_CHECKING
+
+from biljettbokning.names import NAMES
+
+if TYPE_CHECKING:
+    from biljettbokning.model import Train
+
+
+class PassengerHit(NamedTuple):
+    """A passenger found in a PassengerIndex, carriage is an index."""
+
+    name: str
+    train: int
+    carriage: int
+    seat: int
+
+
+class PassengerIndex:
+    """Sorted index from passenger name prefixes to seats, see the module docstring.
+
+    Safe to use from several threads.
+
+    Instance methods:
+        watch(train) -> None: Index a train and follow its changes
+        watch_all(trains) -> None: Index many trains with one sort
+        add(name, train_num, carriage_num, seat_num) -> None: Index a passenger
+        remove(name, train_num, carriage_num, seat_num) -> None: Remove a passenger
+        search(prefix, limit, train_num) -> list[PassengerHit]: Passengers whose name starts with prefix
+        find(name, train_num) -> list[PassengerHit]: Passengers with exactly the name
+    """  # noqa
+
+    def __init__(self):
+        self._entries: list[tuple[str, str, int, int, int]] = []
+        self._by_train: dict[int, list[tuple[str, str, int, int, int]]] = {}
+        self._lock = threading.Lock()
+        # Serializes watch_all, whose changes wait in _pending meanwhile
+        self._watch_lock = threading.Lock()
+        self._pending: Optional[list] = None
+
+    def watch(self, train: "Train") -> None:
+        """Index the passengers of the train and every later change to them.
+
+        A carriage reports to one index only, the last one watching it.
+        """
+        self.watch_all([train])
+
+    def watch_all(self, trains: Iterable["Train"]) -> None:
+        """Index the passengers of many trains at once, see watch.
+
+        The entries are collected first and sorted once, so building the index
+        is O(n log n) rather than one insertion per passenger. Changes reported
+        while the trains are read are applied after the new entries.
+        """
+        with self._watch_lock:
+            with self._lock:
+                self._pending = []
+
+            new: list[tuple[str, str, int, int, int]] = []
+            for train in trains:
+                for carriage_num, carriage in enumerate(train.carriages):
+                    seats = carriage._flat_seats  # pylint: disable=protected-access
+                    with carriage.lock:
+                        for seat in seats:
+                            name = seat.passenger_name
+                            if name:
+                                new.append(
+                                    (
+                                        name.casefold(),
+                                        name,
+                                        train.number,
+                                        carriage_num,
+                                        seat.number,
+                                    )
+                                )
+                        carriage.name_observer = self._observer(
+                            train.number, carriage_num
+                        )
+
+            new.sort()
+            with self._lock:
+                # Sorting sorted runs is a linear merge
+                self._entries.extend(new)
+                self._entries.sort()
+                by_train: dict[int, list[tuple[str, str, int, int, int]]] = {}
+                for entry in new:
+                    by_train.setdefault(entry[2], []).append(entry)
+                for train_num, entries in by_train.items():
+                    existing = self._by_train.setdefault(train_num, [])
+                    existing.extend(entries)
+                    existing.sort()
+
+                pending, self._pending = self._pending, None
+                for change, entry in pending:
+                    change(entry)
+
+    def _observer(self, train_num: int, carriage_num: int):
+        def seat_changed(seat_num: int, old_id: int, new_id: int) -> None:
+            if old_id:
+                self.remove(NAMES.name(old_id) or "", train_num, carriage_num, seat_num)
+            if new_id:
+                self.add(NAMES.name(new_id) or "", train_num, carriage_num, seat_num)
+
+        return seat_changed
+
+    def add(self, name: str, train_num: int, carriage_num: int, seat_num: int) -> None:
+        entry = (name.casefold(), name, train_num, carriage_num, seat_num)
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((self._insert, entry))
+            else:
+                self._insert(entry)
+
+    def remove(
+        self, name: str, train_num: int, carriage_num: int, seat_num: int
+    ) -> None:
+        """Remove a passenger, nothing happens if it is not in the index."""
+        entry = (name.casefold(), name, train_num, carriage_num, seat_num)
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((self._delete, entry))
+            else:
+                self._delete(entry)
+
+    def _insert(self, entry: tuple[str, str, int, int, int]) -> None:
+        """Insert an entry, the caller holds the lock."""
+        insort(self._entries, entry)
+        insort(self._by_train.setdefault(entry[2], []), entry)
+
+    def _delete(self, entry: tuple[str, str, int, int, int]) -> None:
+        """Delete an entry if it is indexed, the caller holds the lock."""
+        for entries in (self._entries, self._by_train.get(entry[2], [])):
+            i = bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+
+    def search(
+        self,
+        prefix: str,
+        limit: Optional[int] = None,
+        train_num: Optional[int] = None,
+    ) -> list[PassengerHit]:
+        """Passengers whose name starts with prefix, ignoring case, sorted by name.
+
+        Args:
+            prefix (str): Start of the name, "" matches everyone
+            limit (Optional[int]): At most this many results (default: all)
+            train_num (Optional[int]): Only passengers on this train (default: all trains)
+        """  # noqa
+        key = prefix.casefold()
+        hits: list[PassengerHit] = []
+        with self._lock:
+            entries = self._entries_of(train_num)
+            for i in range(bisect_left(entries, (key,)), len(entries)):
+                folded, name, train, carriage, seat = entries[i]
+                if not folded.startswith(key) or len(hits) == limit:
+                    break
+                hits.append(PassengerHit(name, train, carriage, seat))
+        return hits
+
+    def find(self, name: str, train_num: Optional[int] = None) -> list[PassengerHit]:
+        """Passengers with exactly the name, optionally on one train."""
+        key = (name.casefold(), name)
+        hits: list[PassengerHit] = []
+        with self._lock:
+            entries = self._entries_of(train_num)
+            for i in range(bisect_left(entries, key), len(entries)):
+                if entries[i][:2] != key:
+                    break
+                hits.append(PassengerHit(*entries[i][1:]))
+        return hits
+
+    def _entries_of(self, train_num: Optional[int]) -> list:
+        """The sorted entries of a train, or of all trains if None."""
+        if train_num is None:
+            return self._entries
+        return self._by_train.get(train_num, [])
+
+    def __len__(self) -> int:
+        return len(self._entries)
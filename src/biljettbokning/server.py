@@ -0,0 +1,590 @@
+"""Local HTTP/JSON booking API on top of a Fleet, and an async client for it.
+
+The server speaks a small subset of HTTP/1.1 with JSON bodies. Every connection
+is handled in its own asyncio task, so a slow client only ever waits on itself.
+All model operations are run on the event loop thread which makes them atomic
+with respect to each other.
+
+Endpoints (carriage numbers start at 1 as on tickets):
+    GET  /trains?start=&dest=&date=YYYY-MM-DD   search trains
+    GET  /trains/<n>/seatmap                    seat map of train n
+    POST /trains/<n>/book    {"carriage", "seat", "name"}
+                             or {"preference", "name", "carriage"?, "strict"?}
+                             or {"carriage", "seat", "name", "from", "to"} for a leg
+    POST /trains/<n>/group   {"carriage", "start_seat", "names", "allow_separate"}
+    POST /trains/<n>/unbook  {"carriage", "seat"} or {"carriage", "name"}
+                             or {"carriage", "seat", "from"} for a leg
+"""
+
+import argparse
+import asyncio
+from datetime import date
+import json
+import logging
+import random
+from typing import Any, Optional
+from urllib.parse import parse_qs, quote, urlsplit
+
+from biljettbokning.model import PREFERENCES, Bookings, Fleet, Train, TrainVersion
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+}
+
+MAX_BODY_SIZE = 1 << 20
+
+logger = logging.getLogger(__name__)
+
+
+def train_json(train: Train | TrainVersion) -> dict[str, Any]:
+    """JSON representation of a train for search results."""
+    return {
+        "number": train.number,
+        "start": train.start,
+        "dest": train.dest,
+        "departure": train.departure.isoformat(),
+        "arrival": train.arrival.isoformat(),
+        "stops": list(train.stops),
+        "carriages": len(train.carriages),
+        "remaining_seats": sum(car.remaining_seats for car in train.carriages),
+    }
+
+
+class HTTPError(Exception):
+    """Exception that is turned into an error response with the given status."""
+
+    def __init__(self, status: int, message: str):
+        self.status = status
+        self.message = message
+        super().__init__(message)
+
+
+class BookingServer:
+    """Serves a Fleet over HTTP/JSON.
+
+    Attributes:
+        fleet (Fleet): The fleet all requests operate on
+        host (str): Interface to listen on
+        port (int): Port to listen on, 0 picks a free port when started
+        timeout (float): Seconds a connection may be idle before it is closed
+
+    Instance methods:
+        start() -> None: Start listening (port is updated to the bound port)
+        close() -> None: Stop listening and wait for the server to close
+        serve_forever() -> None: Start and serve until cancelled
+    """
+
+    def __init__(
+        self, fleet: Fleet, host: str = "127.0.0.1", port: int = 0, timeout=30.0
+    ):
+        self.fleet = fleet
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        """Start listening for connections."""
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        """Stop accepting connections and wait until the server is closed."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self) -> None:
+        """Start the server and serve until cancelled."""
+        await self.start()
+        assert self._server is not None
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve requests on one connection until it is closed or idles out."""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        self._read_request(reader), self.timeout
+                    )
+                except HTTPError as e:
+                    await self._write_response(
+                        writer, e.status, {"error": e.message}, False
+                    )
+                    break
+
+                # Connection closed by client
+                if request is None:
+                    break
+
+                method, target, body, keep_alive = request
+                status, payload = self._dispatch(method, target, body)
+                await self._write_response(writer, status, payload, keep_alive)
+
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader):
+        """Read one request as (method, target, body, keep_alive), None on EOF.
+
+        Raises:
+            HTTPError: If the request is malformed
+        """
+        request_line = await BookingServer._readline(
+            reader, 400, "Request line too long"
+        )
+        if not request_line:
+            return None
+
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError as e:
+            raise HTTPError(400, "Malformed request line") from e
+
+        headers: dict[str, str] = {}
+        while True:
+            line = await BookingServer._readline(
+                reader, 431, "Request header too large"
+            )
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError as e:
+            raise HTTPError(400, "Invalid Content-Length") from e
+        if length < 0:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(413, "Request body too large")
+
+        body = await reader.readexactly(length) if length else b""
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = (
+            connection != "close"
+            if version == "HTTP/1.1"
+            else connection == "keep-alive"
+        )
+
+        return method, target, body, keep_alive
+
+    @staticmethod
+    async def _readline(
+        reader: asyncio.StreamReader, status: int, message: str
+    ) -> bytes:
+        """Read a line, which must fit in the reader's buffer limit.
+
+        Raises:
+            HTTPError: With status and message if the line is too long
+        """
+        try:
+            return await reader.readline()
+        except (ValueError, asyncio.LimitOverrunError) as e:
+            raise HTTPError(status, message) from e
+
+    @staticmethod
+    async def _write_response(
+        writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool
+    ) -> None:
+        """Write a JSON response and wait until the buffer has drained."""
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    def _dispatch(self, method: str, target: str, body: bytes) -> tuple[int, Any]:
+        """Route a request to its handler and turn errors into status codes."""
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+
+        try:
+            if parts == ["trains"]:
+                if method != "GET":
+                    raise HTTPError(405, "Use GET")
+                return 200, self._search(parse_qs(url.query))
+
+            if len(parts) != 3 or parts[0] != "trains":
+                raise HTTPError(404, f"No such resource {url.path}")
+
+            try:
+                train_num = int(parts[1])
+            except ValueError as e:
+                raise HTTPError(404, f"Invalid train number {parts[1]}") from e
+
+            action = parts[2]
+            if action == "seatmap":
+                if method != "GET":
+                    raise HTTPError(405, "Use GET")
+                return 200, self._seat_map(train_num)
+
+            if action not in ("book", "group", "unbook"):
+                raise HTTPError(404, f"No such resource {url.path}")
+            if method != "POST":
+                raise HTTPError(405, "Use POST")
+
+            try:
+                data = json.loads(body or b"{}")
+                assert isinstance(data, dict)
+            except (ValueError, AssertionError) as e:
+                raise HTTPError(400, "Body must be a JSON object") from e
+
+            return 200, getattr(self, f"_{action}")(train_num, data)
+        except HTTPError as e:
+            return e.status, {"error": e.message}
+        except KeyError as e:
+            return 404, {"error": e.args[0] if e.args else "Not found"}
+        except IndexError as e:
+            return 400, {"error": str(e)}
+        except (ValueError, Bookings.MultipleError) as e:
+            return 409, {"error": str(e)}
+        except Exception:
+            # A bug must not drop the connection without an answer
+            logger.exception("Error handling %s %s", method, target)
+            return 500, {"error": "Internal server error"}
+
+    @staticmethod
+    def _field(data: dict, key: str, kind: type):
+        """Get a required field of the given type from a request body."""
+        value = data.get(key)
+        # bool is a subclass of int but not a valid number here
+        if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+            raise HTTPError(400, f"Field '{key}' must be of type {kind.__name__}")
+        return value
+
+    def _search(self, query: dict[str, list[str]]) -> dict[str, Any]:
+        try:
+            day = date.fromisoformat(query["date"][0]) if "date" in query else None
+        except ValueError as e:
+            raise HTTPError(400, "date must be YYYY-MM-DD") from e
+
+        trains = self.fleet.search(
+            query.get("start", [None])[0], query.get("dest", [None])[0], day
+        )
+        return {"trains": [train_json(train) for train in trains]}
+
+    def _seat_map(self, train_num: int) -> dict[str, Any]:
+        # One consistent version for all parts of the answer
+        train = self.fleet.get_train(train_num).snapshot()
+        return {
+            "train": train_json(train),
+            "seatmap": train.terminal_repr(),
+            "carriages": [
+                {
+                    "carriage": i + 1,
+                    "seating_configuration": car.seating_configuration,
+                    "num_rows": car.num_rows,
+                    "total_seats": car.total_seats,
+                    "booked": [
+                        seat.number for seat in car.flat_seats if seat.is_booked()
+                    ],
+                }
+                for i, car in enumerate(train.carriages)
+            ],
+        }
+
+    def _book(self, train_num: int, data: dict) -> dict[str, Any]:
+        if "seat" not in data and "preference" in data:
+            if data["preference"] not in PREFERENCES:
+                raise HTTPError(400, f"Field 'preference' must be one of {PREFERENCES}")
+            # Carriage is optional, the first with a matching seat is taken
+            booking = self.fleet.book_preferred(
+                train_num,
+                self._field(data, "name", str),
+                self._field(data, "preference", str),
+                self._field(data, "carriage", int) - 1 if "carriage" in data else None,
+                bool(data.get("strict", False)),
+            )
+            return {"carriage": booking.carriage, "seat": booking.seat}
+
+        if "from" in data or "to" in data:
+            booking = self.fleet.book_leg(
+                train_num,
+                self._field(data, "carriage", int) - 1,
+                self._field(data, "seat", int),
+                self._field(data, "name", str),
+                self._field(data, "from", str),
+                self._field(data, "to", str),
+            )
+            return {"carriage": booking.carriage, "seat": booking.seat}
+
+        booking = self.fleet.book(
+            train_num,
+            self._field(data, "carriage", int) - 1,
+            self._field(data, "seat", int),
+            self._field(data, "name", str),
+        )
+        return {"carriage": booking.carriage, "seat": booking.seat}
+
+    def _group(self, train_num: int, data: dict) -> dict[str, Any]:
+        names = self._field(data, "names", list)
+        if not names or not all(isinstance(name, str) and name for name in names):
+            raise HTTPError(400, "Field 'names' must be a list of names")
+
+        bookings = self.fleet.book_group(
+            train_num,
+            self._field(data, "carriage", int) - 1,
+            self._field(data, "start_seat", int),
+            names,
+            bool(data.get("allow_separate", True)),
+        )
+        return {
+            "bookings": [
+                {"name": b.name, "carriage": b.carriage, "seat": b.seat}
+                for b in bookings
+            ]
+        }
+
+    def _unbook(self, train_num: int, data: dict) -> dict[str, Any]:
+        carriage_num = self._field(data, "carriage", int) - 1
+        if "from" in data:
+            seat_num = self._field(data, "seat", int)
+            self.fleet.unbook_leg(
+                train_num, carriage_num, seat_num, self._field(data, "from", str)
+            )
+        elif "seat" in data:
+            seat_num = self._field(data, "seat", int)
+            self.fleet.unbook_seat(train_num, carriage_num, seat_num)
+        else:
+            seat_num = self.fleet.unbook_passenger(
+                train_num, carriage_num, self._field(data, "name", str)
+            )
+        return {"carriage": carriage_num + 1, "seat": seat_num}
+
+
+class BookingClient:
+    """Async client for BookingServer using one keep-alive connection.
+
+    Use as an async context manager:
+        async with BookingClient("127.0.0.1", port) as client:
+            await client.book(152, 1, 4, "Jane Doe")
+
+    Instance methods:
+        search(start, dest, day) -> list[dict]: Search trains
+        seat_map(train_num) -> dict: Seat map of a train
+        book(train_num, carriage, seat, name) -> dict: Book a seat
+        book_preferred(train_num, name, preference, carriage, strict) -> dict: Book a window, aisle or table seat
+        book_group(train_num, carriage, start_seat, names, allow_separate) -> list[dict]: Book a group
+        unbook_seat(train_num, carriage, seat) -> dict: Unbook a seat
+        unbook_passenger(train_num, carriage, name) -> dict: Unbook a passenger by name
+    """  # noqa
+
+    class Error(Exception):
+        """Error response from the server."""
+
+        def __init__(self, status: int, message: str):
+            self.status = status
+            self.message = message
+            super().__init__(f"{status}: {message}")
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8127):
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        # Requests on one connection must not interleave
+        self._lock = asyncio.Lock()
+
+    async def connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._reader = self._writer = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    async def request(self, method: str, path: str, payload: Any = None) -> Any:
+        """Send a request and return the decoded JSON response.
+
+        Raises:
+            BookingClient.Error: If the server responds with an error status
+        """
+        async with self._lock:
+            if self._writer is None:
+                await self.connect()
+            assert self._reader is not None and self._writer is not None
+
+            body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+            head = (
+                f"{method} {path} HTTP/1.1\r\n"
+                f"Host: {self.host}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "\r\n"
+            )
+            self._writer.write(head.encode("latin-1") + body)
+            await self._writer.drain()
+
+            status_line = await self._reader.readline()
+            if not status_line:
+                raise ConnectionError("Server closed the connection")
+            status = int(status_line.split()[1])
+
+            length = 0
+            close = False
+            while True:
+                line = await self._reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                if key.strip().lower() == "content-length":
+                    length = int(value)
+                elif key.strip().lower() == "connection":
+                    close = value.strip().lower() == "close"
+
+            data = json.loads(await self._reader.readexactly(length))
+
+            if close:
+                await self.close()
+
+        if status != 200:
+            raise BookingClient.Error(status, data.get("error", ""))
+        return data
+
+    async def search(
+        self,
+        start: Optional[str] = None,
+        dest: Optional[str] = None,
+        day: Optional[date] = None,
+    ) -> list[dict]:
+        query = {
+            key: value
+            for key, value in (("start", start), ("dest", dest), ("date", day))
+            if value is not None
+        }
+        path = "/trains"
+        if query:
+            path += "?" + "&".join(
+                f"{key}={quote(str(value))}" for key, value in query.items()
+            )
+        return (await self.request("GET", path))["trains"]
+
+    async def seat_map(self, train_num: int) -> dict:
+        return await self.request("GET", f"/trains/{train_num}/seatmap")
+
+    async def book(self, train_num: int, carriage: int, seat: int, name: str) -> dict:
+        return await self.request(
+            "POST",
+            f"/trains/{train_num}/book",
+            {"carriage": carriage, "seat": seat, "name": name},
+        )
+
+    async def book_preferred(
+        self,
+        train_num: int,
+        name: str,
+        preference: str,
+        carriage: Optional[int] = None,
+        strict: bool = False,
+    ) -> dict:
+        payload: dict[str, Any] = {
+            "name": name,
+            "preference": preference,
+            "strict": strict,
+        }
+        if carriage is not None:
+            payload["carriage"] = carriage
+        return await self.request("POST", f"/trains/{train_num}/book", payload)
+
+    async def book_group(
+        self,
+        train_num: int,
+        carriage: int,
+        start_seat: int,
+        names: list[str],
+        allow_separate: bool = True,
+    ) -> list[dict]:
+        data = await self.request(
+            "POST",
+            f"/trains/{train_num}/group",
+            {
+                "carriage": carriage,
+                "start_seat": start_seat,
+                "names": names,
+                "allow_separate": allow_separate,
+            },
+        )
+        return data["bookings"]
+
+    async def unbook_seat(self, train_num: int, carriage: int, seat: int) -> dict:
+        return await self.request(
+            "POST", f"/trains/{train_num}/unbook", {"carriage": carriage, "seat": seat}
+        )
+
+    async def unbook_passenger(self, train_num: int, carriage: int, name: str) -> dict:
+        return await self.request(
+            "POST", f"/trains/{train_num}/unbook", {"carriage": carriage, "name": name}
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokalt boknings-API över HTTP/JSON")
+    parser.add_argument("--trains", help="Katalog med sparade tåg (annars slumpas)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8127)
+    args = parser.parse_args()
+
+    if args.trains:
+        fleet = Fleet.from_directory(args.trains)
+    else:
+        fleet = Fleet([Train.random(num) for num in random.sample(range(1, 1000), 10)])
+
+    server = BookingServer(fleet, args.host, args.port)
+    print(f"Lyssnar på http://{args.host}:{args.port} med {len(fleet)} tåg")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""Fleet partitioned by train number over several worker processes.
+
+Every shard is a process owning a Fleet with the trains where
+train.number % num_shards == shard index. The ShardedFleet router in the
+calling process forwards requests over one pipe per shard. Requests for a
+single train go to its shard only, fleet-wide queries (search) are sent to all
+shards at once and the answers merged (scatter-gather).
+
+The router can be used from several threads, each pipe has its own lock so
+requests for different shards are served in parallel.
+"""
+
+import argparse
+from datetime import date
+import multiprocessing as mp
+from multiprocessing.connection import Connection
+import random
+import threading
+import time
+from typing import Any, Iterable, Optional
+
+from biljettbokning.generator import generate
+from biljettbokning.model import Bookings, Fleet, Train
+from biljettbokning.server import train_json
+
+# Exceptions that are sent back over the pipe and raised again in the router
+ERRORS: dict[str, type[Exception]] = {
+    "KeyError": KeyError,
+    "IndexError": IndexError,
+    "ValueError": ValueError,
+    "MultipleError": Bookings.MultipleError,
+}
+
+
+def shard_of(train_number: int, num_shards: int) -> int:
+    """Index of the shard owning the specified train."""
+    return train_number % num_shards
+
+
+def _book_many(fleet: Fleet, bookings: list[tuple[int, int, int, str]]):
+    """Book several single seats, returning None or an error per booking."""
+    results = []
+    for train_num, carriage_num, seat_num, name in bookings:
+        try:
+            fleet.book(train_num, carriage_num, seat_num, name)
+            results.append(None)
+        except (KeyError, IndexError, ValueError) as e:
+            results.append((type(e).__name__, str(e)))
+    return results
+
+
+def _handle(fleet: Fleet, op: str, args: tuple) -> Any:
+    """Perform one request on the shards fleet and return a picklable result."""
+    match op:
+        case "book":
+            booking = fleet.book(*args)
+            return booking.carriage, booking.seat
+        case "book_many":
+            return _book_many(fleet, *args)
+        case "book_group":
+            return [(b.name, b.carriage, b.seat) for b in fleet.book_group(*args)]
+        case "unbook_seat":
+            return fleet.unbook_seat(*args)
+        case "unbook_passenger":
+            return fleet.unbook_passenger(*args)
+        case "search":
+            return [train_json(train) for train in fleet.search(*args)]
+        case "seat_map":
+            return fleet.get_train(*args).terminal_repr()
+        case "count":
+            return len(fleet), len(fleet.bookings)
+        case _:
+            raise ValueError(f"Unknown operation {op}")
+
+
+def _serve_shard(
+    conn: Connection,
+    trains: Optional[list[Train]],
+    directory: Optional[str],
+    shard: int,
+    num_shards: int,
+) -> None:
+    """Main loop of a shard process, answers requests until None is received."""
+    if directory is not None:
+        fleet = Fleet.from_directory(
+            directory, lambda number: shard_of(number, num_shards) == shard
+        )
+    else:
+        fleet = Fleet(trains)
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+
+        op, args = request
+        try:
+            conn.send(("ok", _handle(fleet, op, args)))
+        except Exception as e:  # pylint: disable=broad-except
+            # Send the error to the router instead of killing the shard
+            conn.send(("error", type(e).__name__, e.args))
+
+    conn.close()
+
+
+class ShardedFleet:
+    """Router in front of a fleet split over several processes.
+
+    Carriage numbers are indices (starting at 0) as in Fleet.
+
+    Attributes:
+        num_shards (int): Number of worker processes
+
+    Instance methods:
+        book(train_num, carriage_num, seat_num, name) -> tuple[int, int]: Book a seat, returns (carriage, seat) of the record
+        book_many(bookings) -> list: Book many seats with one message per shard
+        book_group(train_num, carriage_num, start_seat, names, allow_separate) -> list[tuple[str, int, int]]: Book a group
+        unbook_seat(train_num, carriage_num, seat_num) -> None: Unbook a seat
+        unbook_passenger(train_num, carriage_num, name) -> int: Unbook by name
+        search(start, dest, day) -> list[dict]: Search all shards
+        seat_map(train_num) -> str: Seat map of a train
+        close() -> None: Stop all shard processes
+    """  # noqa
+
+    def __init__(
+        self,
+        trains: Iterable[Train] = (),
+        num_shards: int = 2,
+        directory: Optional[str] = None,
+    ):
+        """Start the shard processes.
+
+        Args:
+            trains (Iterable[Train]): Trains to distribute over the shards
+            num_shards (int): Number of shard processes
+            directory (Optional[str]): Let each shard load its own trains from a
+                directory of serialized trains instead of sending them
+        """
+        if num_shards < 1:
+            raise ValueError("At least one shard is needed")
+
+        self.num_shards = num_shards
+
+        partitions: list[list[Train]] = [[] for _ in range(num_shards)]
+        for train in trains:
+            partitions[shard_of(train.number, num_shards)].append(train)
+
+        self._conns: list[Connection] = []
+        self._locks = [threading.Lock() for _ in range(num_shards)]
+        self._processes: list[mp.Process] = []
+
+        for shard in range(num_shards):
+            router_end, shard_end = mp.Pipe()
+            process = mp.Process(
+                target=_serve_shard,
+                args=(
+                    shard_end,
+                    partitions[shard] if directory is None else None,
+                    directory,
+                    shard,
+                    num_shards,
+                ),
+                daemon=True,
+            )
+            process.start()
+            shard_end.close()
+            self._conns.append(router_end)
+            self._processes.append(process)
+
+    def _send(self, shard: int, op: str, args: tuple) -> None:
+        self._conns[shard].send((op, args))
+
+    def _receive(self, shard: int) -> Any:
+        """Receive the answer of a shard, raising its error if it failed."""
+        return ShardedFleet._unpack(self._conns[shard].recv())
+
+    @staticmethod
+    def _unpack(response: tuple) -> Any:
+        if response[0] == "ok":
+            return response[1]
+
+        _, name, args = response
+        raise ERRORS.get(name, RuntimeError)(*args)
+
+    def _call(self, shard: int, op: str, *args) -> Any:
+        with self._locks[shard]:
+            self._send(shard, op, args)
+            return self._receive(shard)
+
+    def _scatter(self, op: str, *args) -> list[Any]:
+        """Send a request to all shards and gather the answers in shard order."""
+        # Locks are taken in shard order so concurrent scatters can not deadlock
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            for shard in range(self.num_shards):
+                self._send(shard, op, args)
+            # Read every answer before raising, or the pipes get out of step
+            responses = [conn.recv() for conn in self._conns]
+        finally:
+            for lock in self._locks:
+                lock.release()
+
+        return [ShardedFleet._unpack(response) for response in responses]
+
+    def _route(self, train_num: int, op: str, *args) -> Any:
+        return self._call(shard_of(train_num, self.num_shards), op, train_num, *args)
+
+    def book(
+        self, train_num: int, carriage_num: int, seat_num: int, name: str
+    ) -> tuple[int, int]:
+        """Book a seat, see Fleet.book."""
+        return self._route(train_num, "book", carriage_num, seat_num, name)
+
+    def book_many(
+        self, bookings: Iterable[tuple[int, int, int, str]]
+    ) -> list[Optional[tuple[str, str]]]:
+        """Book many (train, carriage, seat, name) at once, one message per shard.
+
+        Returns:
+            list: None for each successful booking, else (error type, message),
+                in the order of the bookings
+        """
+        bookings = list(bookings)
+        per_shard: list[list[int]] = [[] for _ in range(self.num_shards)]
+        for i, booking in enumerate(bookings):
+            per_shard[shard_of(booking[0], self.num_shards)].append(i)
+
+        # Scatter the batches, then gather them back into the original order
+        results: list[Optional[tuple[str, str]]] = [None] * len(bookings)
+        used = [shard for shard in range(self.num_shards) if per_shard[shard]]
+        for shard in used:
+            self._locks[shard].acquire()
+        try:
+            for shard in used:
+                self._send(
+                    shard, "book_many", ([bookings[i] for i in per_shard[shard]],)
+                )
+            for shard in used:
+                for i, result in zip(per_shard[shard], self._receive(shard)):
+                    results[i] = result
+        finally:
+            for shard in used:
+                self._locks[shard].release()
+
+        return results
+
+    def book_group(
+        self,
+        train_num: int,
+        carriage_num: int,
+        start_seat: int,
+        names: list[str],
+        allow_separate: bool = True,
+    ) -> list[tuple[str, int, int]]:
+        """Book a group, see Fleet.book_group. Returns (name, carriage, seat) per passenger."""  # noqa
+        return self._route(
+            train_num, "book_group", carriage_num, start_seat, names, allow_separate
+        )
+
+    def unbook_seat(self, train_num: int, carriage_num: int, seat_num: int) -> None:
+        """Unbook a seat, see Fleet.unbook_seat."""
+        self._route(train_num, "unbook_seat", carriage_num, seat_num)
+
+    def unbook_passenger(self, train_num: int, carriage_num: int, name: str) -> int:
+        """Unbook a passenger by name, see Fleet.unbook_passenger."""
+        return self._route(train_num, "unbook_passenger", carriage_num, name)
+
+    def seat_map(self, train_num: int) -> str:
+        """Terminal representation of the specified train."""
+        return self._route(train_num, "seat_map")
+
+    def search(
+        self,
+        start: Optional[str] = None,
+        dest: Optional[str] = None,
+        day: Optional[date] = None,
+    ) -> list[dict]:
+        """Search all shards and return the merged results in order of departure."""
+        results = [
+            train
+            for part in self._scatter("search", start, dest, day)
+            for train in part
+        ]
+        results.sort(key=lambda train: train["departure"])
+        return results
+
+    def count(self) -> tuple[int, int]:
+        """Total number of (trains, bookings) over all shards."""
+        counts = self._scatter("count")
+        return sum(c[0] for c in counts), sum(c[1] for c in counts)
+
+    def close(self) -> None:
+        """Stop all shard processes."""
+        for shard, conn in enumerate(self._conns):
+            with self._locks[shard]:
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+                conn.close()
+        for process in self._processes:
+            process.join(timeout=5)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def measure(num_shards: int, trains: list[Train], num_ops: int, batch: int) -> float:
+    """Bookings per second with the specified number of shards."""
+    rng = random.Random(num_shards)
+    requests = []
+    for i in range(num_ops):
+        train = rng.choice(trains)
+        car_num = rng.randrange(len(train.carriages))
+        requests.append(
+            (
+                train.number,
+                car_num,
+                rng.randint(1, train.carriages[car_num].total_seats),
+                f"Passagerare {i}",
+            )
+        )
+
+    with ShardedFleet(trains, num_shards) as fleet:
+        started = time.perf_counter()
+        for i in range(0, num_ops, batch):
+            fleet.book_many(requests[i : i + batch])
+        elapsed = time.perf_counter() - started
+
+    return num_ops / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mät bokningar per sekund för olika antal shards"
+    )
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--trains", type=int, default=200)
+    parser.add_argument("--ops", type=int, default=50_000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    trains = list(generate(args.trains))
+    for num_shards in args.shards:
+        rate = measure(num_shards, trains, args.ops, args.batch)
+        print(f"{num_shards} shards: {rate:.0f} bokningar/s")
+
+
+if __name__ == "__main__":
+    main()
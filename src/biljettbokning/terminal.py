@@ -1,13 +1,54 @@
+import argparse
 import os
 import sys
 from time import sleep
-from typing import NoReturn
-from biljettbokning.model import Train
+from typing import IO, Iterable, NoReturn, Optional
+from biljettbokning.model import PREFERENCE_NAMES, Bookings, Fleet, Train
 
 
 class Terminal:
-    def __init__(self, trains: list[Train]):
-        self.trains = trains
+    """Terminal frontend, interactive through menu() or scripted through batch().
+
+    Batch commands, one per line (carriage numbers start at 1, empty lines and
+    lines starting with # are skipped):
+        boka <tåg> <vagn> <stol> <namn>
+        boka <tåg> <vagn> fönster|gång|bord|auto <namn>
+        grupp <tåg> <vagn> <startstol> <namn>;<namn>;...
+        avboka <tåg> <vagn> <stol>
+        avboka-namn <tåg> <vagn> <namn>
+        vänta <tåg> <vagn> <namn>
+        skriv <tåg>
+        ångra
+        gör-om
+    The English names book, group, unbook, unbook-name, wait, print, undo and
+    redo also work. A seat preference books the first free seat of that kind in the
+    carriage, or any free seat if there is none. skriv writes the tickets of the
+    train's booked seats.
+    """
+
+    COMMANDS = {
+        "boka": "book",
+        "book": "book",
+        "grupp": "group",
+        "group": "group",
+        "avboka": "unbook",
+        "unbook": "unbook",
+        "avboka-namn": "unbook_name",
+        "unbook-name": "unbook_name",
+        "vänta": "wait",
+        "wait": "wait",
+        "skriv": "print",
+        "print": "print",
+        "ångra": "undo",
+        "undo": "undo",
+        "gör-om": "redo",
+        "redo": "redo",
+    }
+
+    def __init__(self, trains: list[Train] | Fleet):
+        # A loaded fleet keeps its booking history, a list of trains starts empty
+        self.fleet = trains if isinstance(trains, Fleet) else Fleet(trains)
+        self.trains = self.fleet.trains
 
     @staticmethod
     def clear():
@@ -27,7 +68,123 @@ class Terminal:
         print("avboka")
 
     def skriv_biljetter(self):
-        print("skriv_biljett")
+        print("Välj tåg (tomt för alla):")
+        for i, train in enumerate(self.trains):
+            print(f"{i+1}. Tåg {train.number}: {train.start} -> {train.dest}")
+        choice = input("Val>")
+        train_num = self.trains[int(choice) - 1].number if choice else None
+        print(self.tickets(train_num) or "Inga bokade platser")
+        input()
+        return
+
+    def tickets(self, train_num: Optional[int] = None) -> str:
+        """The tickets of every booked seat of a train, or of all trains if None.
+
+        Raises:
+            KeyError: If the train does not exist
+        """
+        # Only the booked seats are visited, see booked_seats
+        return "\n\n".join(
+            str(seat.booking()) for seat in self.fleet.booked_seats(train_num)
+        )
+
+    def batch(self, lines: Iterable[str], out: IO[str] = sys.stdout) -> tuple[int, int]:
+        """Run batch commands and write one summary line per command.
+
+        Args:
+            lines (Iterable[str]): Commands, e.g. a file object or sys.stdin
+            out (IO[str]): Where summary lines are written
+
+        Returns:
+            tuple[int, int]: Number of (successful, failed) commands
+        """
+        ok = failed = 0
+        for line_num, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            try:
+                result = self.run_command(line)
+            except (KeyError, IndexError, ValueError, Bookings.MultipleError) as e:
+                failed += 1
+                # KeyError wraps its message in quotes
+                message = e.args[0] if isinstance(e, KeyError) and e.args else e
+                out.write(f"FEL {line_num}: {line} -> {message}\n")
+            else:
+                ok += 1
+                out.write(f"OK  {line_num}: {line} -> {result}\n")
+
+        return ok, failed
+
+    def run_command(self, line: str) -> str:
+        """Run a single batch command and return its summary.
+
+        Raises:
+            ValueError: If the command is unknown, malformed or not possible
+            KeyError: If the train or passenger does not exist
+            IndexError: If a carriage or seat number is invalid
+        """
+        word, _, rest = line.partition(" ")
+        command = self.COMMANDS.get(word.lower())
+        if command is None:
+            raise ValueError(f"Okänt kommando {word}")
+
+        if command == "print":
+            tickets = self.tickets(int(rest))
+            return "\n" + tickets if tickets else "inga bokade platser"
+        if command in ("undo", "redo"):
+            changes = self.fleet.undo() if command == "undo" else self.fleet.redo()
+            return ", ".join(
+                f"tåg {t} vagn {c + 1} plats {s}: {old or '-'} -> {new or '-'}"
+                for t, c, s, old, new in changes
+            )
+
+        # Train, carriage and the rest, the rest may contain spaces
+        parts = rest.split(maxsplit=2 if command in ("unbook_name", "wait") else 3)
+        if len(parts) < 3:
+            raise ValueError("För få argument")
+        train_num, carriage_num = int(parts[0]), int(parts[1]) - 1
+
+        match command:
+            case "book":
+                if len(parts) < 4:
+                    raise ValueError("Namn saknas")
+                seat = parts[2].lower()
+                if seat in PREFERENCE_NAMES or seat == "auto":
+                    booking = self.fleet.book_preferred(
+                        train_num, parts[3], PREFERENCE_NAMES.get(seat), carriage_num
+                    )
+                else:
+                    booking = self.fleet.book(
+                        train_num, carriage_num, int(parts[2]), parts[3]
+                    )
+                return f"vagn {booking.carriage} plats {booking.seat}"
+            case "group":
+                if len(parts) < 4:
+                    raise ValueError("Namn saknas")
+                names = [name.strip() for name in parts[3].split(";") if name.strip()]
+                bookings = self.fleet.book_group(
+                    train_num, carriage_num, int(parts[2]), names
+                )
+                return f"vagn {carriage_num + 1} platser " + ", ".join(
+                    str(b.seat) for b in bookings
+                )
+            case "unbook":
+                if len(parts) > 3:
+                    raise ValueError("För många argument")
+                waiting = self.fleet.unbook_seat(train_num, carriage_num, int(parts[2]))
+                summary = f"vagn {carriage_num + 1} plats {parts[2]} avbokad"
+                return summary + (f", går till {waiting} från kön" if waiting else "")
+            case "wait":
+                self.fleet.wait(train_num, parts[2], carriage_num)
+                waiting = len(self.fleet.get_train(train_num).waitlist)
+                return f"{parts[2]} i kö till vagn {carriage_num + 1}, {waiting} i kö"
+            case _:
+                seat_num = self.fleet.unbook_passenger(
+                    train_num, carriage_num, parts[2]
+                )
+                return f"vagn {carriage_num + 1} plats {seat_num} avbokad"
 
     def menu(self) -> NoReturn:
         self.clear()
@@ -57,7 +214,35 @@ class Terminal:
                     continue
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Tågbokning i terminalen")
+    parser.add_argument("--trains", default="./trains", help="Katalog med sparade tåg")
+    parser.add_argument(
+        "--batch", help="Fil med kommandon att köra utan meny, - för stdin"
+    )
+    parser.add_argument("--save", help="Spara tågen hit efter batch-körningen")
+    parser.add_argument(
+        "--codec", choices=["zlib", "lzma"], help="Komprimera de sparade tågen"
+    )
+    args = parser.parse_args()
+
+    term = Terminal(Fleet.from_directory(args.trains))
+
+    if args.batch is None:
+        term.menu()
+
+    if args.batch == "-":
+        ok, failed = term.batch(sys.stdin)
+    else:
+        with open(args.batch, "r", encoding="utf-8") as f:
+            ok, failed = term.batch(f)
+
+    if args.save:
+        term.fleet.save(args.save, codec=args.codec)
+
+    print(f"{ok} lyckades, {failed} misslyckades", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
 if __name__ == "__main__":
-    t = Train.from_file("./trains/train_1")
-    term = Terminal([t])
-    term.menu()
+    main()
@@ -0,0 +1,237 @@
+"""Tracing of slow Tk callbacks and a watchdog for frozen UIs.
+
+Everything a Tk command callback does blocks the main loop. Callbacks decorated
+with traced are timed and, when they take longer than the threshold, logged
+with a breakdown of the time spent in their spans, e.g.
+
+    Slow callback BookingPopup.book_passengers blocked the UI for 812.4 ms:
+    dialog 790.2 ms, terminal_repr 14.8 ms, seat search 6.1 ms, other 1.3 ms
+
+Spans are opened with the span context manager and nest, the time of a span
+excludes its children. Outside of a traced callback span does nothing.
+
+The Watchdog notices when the main loop has not run for a while, no matter
+why, and reports which callback and span it is stuck in.
+
+Thresholds are read from the environment variables
+BILJETTBOKNING_SLOW_CALLBACK_MS (default 100) and BILJETTBOKNING_FREEZE_MS
+(default 500).
+"""
+
+from collections import deque
+from contextlib import contextmanager
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from biljettbokning.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+SLOW_CALLBACK_THRESHOLD = (
+    float(os.environ.get("BILJETTBOKNING_SLOW_CALLBACK_MS", 100)) / 1000
+)
+FREEZE_THRESHOLD = float(os.environ.get("BILJETTBOKNING_FREEZE_MS", 500)) / 1000
+
+# The last slow callbacks as (name, seconds, {span: seconds})
+SLOW_CALLBACKS: deque[tuple[str, float, dict[str, float]]] = deque(maxlen=50)
+
+
+class Trace:
+    """Time spent in spans during one callback.
+
+    Attributes:
+        name (str): Name of the callback
+        started (float): perf_counter() when the callback started
+        spans (dict[str, float]): Exclusive seconds per span name
+        stack (list[list]): Open spans as [name, start, seconds in children]
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: dict[str, float] = {}
+        self.stack: list[list[Any]] = []
+
+    def current_span(self) -> Optional[str]:
+        """Name of the innermost open span, if any."""
+        return self.stack[-1][0] if self.stack else None
+
+    def breakdown(self, total: float) -> str:
+        """Spans in order of time spent, including time outside of any span."""
+        parts = sorted(self.spans.items(), key=lambda item: item[1], reverse=True)
+        other = total - sum(self.spans.values())
+        parts.append(("other", other))
+        return ", ".join(f"{name} {1000 * seconds:.1f} ms" for name, seconds in parts)
+
+
+# Active trace per thread id, readable from the watchdog thread
+_active: dict[int, Trace] = {}
+
+
+@contextmanager
+def span(name: str):
+    """Attribute the time spent in the block to name in the current trace."""
+    trace = _active.get(threading.get_ident())
+    if trace is None:
+        yield
+        return
+
+    frame = [name, time.perf_counter(), 0.0]
+    trace.stack.append(frame)
+    try:
+        yield
+    finally:
+        trace.stack.pop()
+        duration = time.perf_counter() - frame[1]
+        trace.spans[name] = trace.spans.get(name, 0.0) + duration - frame[2]
+        if trace.stack:
+            trace.stack[-1][2] += duration
+
+
+def traced(name: Optional[str] = None, threshold: Optional[float] = None):
+    """Decorator for Tk callbacks, logs calls that block longer than threshold.
+
+    Args:
+        name (Optional[str]): Name in the log (default: qualified function name)
+        threshold (Optional[float]): Seconds (default: SLOW_CALLBACK_THRESHOLD)
+    """
+
+    def decorator(func):
+        trace_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            ident = threading.get_ident()
+            # Callbacks calling other traced callbacks are part of the outer one
+            if ident in _active:
+                with span(trace_name):
+                    return func(*args, **kwargs)
+
+            trace = _active[ident] = Trace(trace_name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                del _active[ident]
+                total = time.perf_counter() - trace.started
+                if METRICS.enabled:
+                    METRICS.observe("ui", trace_name, total)
+
+                limit = SLOW_CALLBACK_THRESHOLD if threshold is None else threshold
+                if total > limit:
+                    SLOW_CALLBACKS.append((trace_name, total, dict(trace.spans)))
+                    logger.warning(
+                        "Slow callback %s blocked the UI for %.1f ms: %s",
+                        trace_name,
+                        1000 * total,
+                        trace.breakdown(total),
+                    )
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_dialogs() -> None:
+    """Count time in tkinter dialogs as the span 'dialog'.
+
+    Dialogs are modal and block the callback that opened them, which is
+    expected and should not be mistaken for slow code. Safe to call repeatedly.
+    """
+    # Imported here to keep this module free of tkinter for headless use
+    from tkinter import filedialog, messagebox  # pylint: disable=C0415
+
+    for module in (messagebox, filedialog):
+        for attr in dir(module):
+            func = getattr(module, attr)
+            if (
+                attr.startswith(("ask", "show"))
+                and callable(func)
+                and not getattr(func, "_dialog_span", False)
+            ):
+                setattr(module, attr, _as_dialog_span(func))
+
+
+def _as_dialog_span(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span("dialog"):
+            return func(*args, **kwargs)
+
+    wrapper._dialog_span = True  # type: ignore  # pylint: disable=W0212
+    return wrapper
+
+
+class Watchdog:
+    """Reports when the Tk main loop stops processing events.
+
+    A heartbeat is scheduled with widget.after() on the main loop, a background
+    thread warns when no heartbeat arrived for longer than the threshold and
+    again when the UI recovers.
+
+    Instance methods:
+        start() -> None: Start the heartbeat and the watching thread
+        stop() -> None: Stop watching
+    """
+
+    def __init__(self, widget, threshold: float = FREEZE_THRESHOLD, interval=0.1):
+        """Make a watchdog for the main loop of widget.
+
+        Args:
+            widget: Any Tk widget, used for after()
+            threshold (float): Seconds without heartbeat counted as a freeze
+            interval (float): Seconds between heartbeats
+        """
+        self.widget = widget
+        self.threshold = threshold
+        self.interval = interval
+        self.freezes = 0
+        self._last_beat = time.perf_counter()
+        self._frozen_since: Optional[float] = None
+        self._main_ident = threading.get_ident()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+
+    def start(self) -> None:
+        self._beat()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _beat(self) -> None:
+        """Runs on the main loop."""
+        self._last_beat = time.perf_counter()
+        if not self._stopped.is_set():
+            self.widget.after(int(1000 * self.interval), self._beat)
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.check(time.perf_counter())
+
+    def check(self, now: float) -> None:
+        """Compare the last heartbeat against now and report changes."""
+        silent = now - self._last_beat
+
+        if silent > self.threshold and self._frozen_since is None:
+            self._frozen_since = self._last_beat
+            self.freezes += 1
+            trace = _active.get(self._main_ident)
+            logger.warning(
+                "UI frozen for %.0f ms in %s",
+                1000 * silent,
+                (
+                    f"{trace.name} (span {trace.current_span()})"
+                    if trace is not None
+                    else "untraced code"
+                ),
+            )
+        elif silent <= self.threshold and self._frozen_since is not None:
+            logger.warning(
+                "UI responsive again after %.0f ms",
+                1000 * (self._last_beat - self._frozen_since),
+            )
+            self._frozen_since = None
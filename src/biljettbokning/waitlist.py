@@ -0,0 +1,142 @@
+"""Waitlist of passengers waiting for a seat on a train.
+
+A passenger waits for a seat in a given carriage or in any carriage of the
+train. Whenever a seat is unbooked through Train.unbook_seat or
+Train.unbook_passenger the train asks its waitlist for the passenger who has
+waited the longest for that carriage and books them into the freed seat at
+once. Finding that passenger only looks at the first entry of two queues, so
+it takes the same time however long the waitlist is.
+
+Undoing an unbooking puts the passenger who got the seat back first in their
+queue with push_front, redoing it takes them off again with take.
+"""
+
+from collections import deque
+import itertools
+import threading
+from typing import Iterator, NamedTuple, Optional
+
+
+class WaitlistEntry(NamedTuple):
+    """A waiting passenger, carriage_num is a carriage index or None for any."""
+
+    order: int
+    name: str
+    carriage_num: Optional[int]
+
+
+class Waitlist:
+    """First come first served queue of passengers per carriage and for any carriage.
+
+    Safe to use from several threads.
+
+    Instance methods:
+        add(name, carriage_num) -> None: Put a passenger last in the queue
+        pop_for(carriage_num) -> Optional[str]: Take the passenger who gets a freed seat in a carriage
+        pop_entry_for(carriage_num) -> Optional[WaitlistEntry]: Like pop_for, with the queue they were in
+        push_front(name, carriage_num) -> None: Put a passenger first in the queue
+        take(name, carriage_num) -> None: Remove the passenger first in the queue
+        cancel(name) -> bool: Remove a waiting passenger
+        to_json() -> list: Entries in order, for saving
+    """  # noqa
+
+    def __init__(self, entries: Optional[list] = None):
+        """Make a waitlist, optionally from entries saved with to_json."""
+        self._any: deque[WaitlistEntry] = deque()
+        self._by_carriage: dict[int, deque[WaitlistEntry]] = {}
+        self._order = itertools.count()
+        # Entries put back first get orders below every added entry
+        self._front_order = itertools.count(-1, -1)
+        self._lock = threading.Lock()
+
+        for name, carriage_num in entries if entries is not None else []:
+            self.add(name, carriage_num)
+
+    def add(self, name: str, carriage_num: Optional[int] = None) -> None:
+        """Put a passenger last in the queue for a carriage index, or any carriage if None."""  # noqa
+        with self._lock:
+            entry = WaitlistEntry(next(self._order), name, carriage_num)
+            self._queue(carriage_num).append(entry)
+
+    def pop_for(self, carriage_num: int) -> Optional[str]:
+        """Take the passenger who has waited longest for the carriage or for any carriage.
+
+        Returns:
+            Optional[str]: Their name, None if nobody waits for the carriage
+        """  # noqa
+        entry = self.pop_entry_for(carriage_num)
+        return entry.name if entry is not None else None
+
+    def pop_entry_for(self, carriage_num: int) -> Optional[WaitlistEntry]:
+        """Like pop_for, but return the whole entry, None if nobody waits."""
+        with self._lock:
+            queue = self._by_carriage.get(carriage_num)
+            if queue and (not self._any or queue[0].order < self._any[0].order):
+                return queue.popleft()
+            if self._any:
+                return self._any.popleft()
+            return None
+
+    def push_front(self, name: str, carriage_num: Optional[int] = None) -> None:
+        """Put a passenger first in the queue for a carriage index, or any carriage if None.
+
+        They are also ahead of everyone in the other queues, as if they had
+        waited the longest.
+        """  # noqa
+        with self._lock:
+            entry = WaitlistEntry(next(self._front_order), name, carriage_num)
+            self._queue(carriage_num).appendleft(entry)
+
+    def take(self, name: str, carriage_num: Optional[int] = None) -> None:
+        """Remove the passenger first in the queue for a carriage index, or any carriage if None.
+
+        Raises:
+            ValueError: If the passenger is not first in the queue
+        """  # noqa
+        with self._lock:
+            queue = self._queue(carriage_num)
+            if not queue or queue[0].name != name:
+                raise ValueError(f"{name} is not first in the waitlist")
+            queue.popleft()
+
+    def _queue(self, carriage_num: Optional[int]) -> deque[WaitlistEntry]:
+        """The queue for a carriage index or any carriage, must hold the lock."""
+        if carriage_num is None:
+            return self._any
+        return self._by_carriage.setdefault(carriage_num, deque())
+
+    def cancel(self, name: str) -> bool:
+        """Remove the first waiting passenger with the name, return if there was one."""
+        with self._lock:
+            for queue in (self._any, *self._by_carriage.values()):
+                for entry in queue:
+                    if entry.name == name:
+                        queue.remove(entry)
+                        return True
+        return False
+
+    def entries(self) -> list[WaitlistEntry]:
+        """All waiting passengers in the order they were added."""
+        with self._lock:
+            queued = list(self._any)
+            for queue in self._by_carriage.values():
+                queued.extend(queue)
+        return sorted(queued)
+
+    def to_json(self) -> list[tuple[str, Optional[int]]]:
+        """[name, carriage index or None] of every entry in order."""
+        return [(entry.name, entry.carriage_num) for entry in self.entries()]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._any) + sum(len(q) for q in self._by_carriage.values())
+
+    def __iter__(self) -> Iterator[WaitlistEntry]:
+        return iter(self.entries())
+
+    def __getstate__(self):
+        """The lock can not be pickled, keep the entries only."""
+        return {"entries": self.to_json()}
+
+    def __setstate__(self, state):
+        self.__init__(state["entries"])  # pylint: disable=unnecessary-dunder-call
@@ -1,7 +1,14 @@
-from copy import deepcopy
 import tkinter as tk
-from tkinter import ttk, messagebox, font
-from biljettbokning.model import Booking, Train
+from tkinter import ttk, messagebox
+from biljettbokning.commandlog import Change
+from biljettbokning.model import PREFERENCE_NAMES, Booking, Train
+from biljettbokning.tracing import span, traced
+from biljettbokning.widgets.seatmap import SeatMap
+
+
+# Preference choices in the popup, the first means no preference
+ANY_SEAT = "Valfri"
+PREFERENCE_CHOICES = [ANY_SEAT] + [name.capitalize() for name in PREFERENCE_NAMES]
 
 
 class BookingPopup(tk.Toplevel):
@@ -30,22 +37,13 @@ class BookingPopup(tk.Toplevel):
         )
         self.title.grid(column=0, row=0, columnspan=2, sticky="nesw", pady=15)
 
-        # Create the train visualisation
-        # load font
-        mono_font = font.nametofont("TkFixedFont")
-        mono_font.config(size=10)
-        # label for train visualisation
-        self.vis_label_var = tk.StringVar(value=train.terminal_repr())
-        self.vis_label = ttk.Label(
-            self,
-            textvariable=self.vis_label_var,
-            anchor="center",
-            font=mono_font,
-        )
-        self.vis_label.grid(column=0, row=1, columnspan=2, sticky="ew")
+        # Create the train visualisation, clicking a seat selects it
+        self.seat_map = SeatMap(self, train, on_select=self.on_seat_selected)
+        self.seat_map.grid(column=0, row=1, columnspan=2, padx=10)
 
         self.starting_seat = tk.StringVar()
         self.carriage_num = tk.StringVar()
+        self.preference = tk.StringVar(value=ANY_SEAT)
 
         # Frame for picking seat
         self.select_frame = SelectFrame(self)
@@ -58,8 +56,66 @@ class BookingPopup(tk.Toplevel):
         # Gets called in passenger addition to force resize
         self.pax_frame.listbox.bind("<Configure>", self._on_listbox_configure)
 
+    def on_seat_selected(self, carriage_num: int, seat_num: int):
+        """Use a seat clicked in the seat map as carriage and starting seat."""
+        self.carriage_num.set(str(carriage_num))
+        self.starting_seat.set(str(seat_num))
+
+    def suggest_seat(self):
+        """Pick the first free seat of the chosen kind as carriage and starting seat.
+
+        The carriage entered is searched first, then the whole train.
+        """
+        preference = PREFERENCE_NAMES.get(self.preference.get().lower())
+        cars = list(enumerate(self.train.carriages, 1))
+        try:
+            chosen = int(self.carriage_num.get())
+            cars.sort(key=lambda item: item[0] != chosen)
+        except ValueError:
+            pass
+
+        for carriage_num, car in cars:
+            mask = car.free_mask(preference)
+            if mask:
+                seat_num = (mask & -mask).bit_length()
+                self.on_seat_selected(carriage_num, seat_num)
+                self.seat_map.select(carriage_num, seat_num)
+                return
+
+        messagebox.showinfo(
+            "Ingen ledig plats", "Det finns ingen ledig plats av det slaget i tåget."
+        )
+        self.focus()
+
+    @traced()
     def book_passengers(self):
-        """Book the passengers currently in the listbox starting at the seat given."""
+        """Book the passengers currently in the listbox starting at the seat given.
+
+        All seats booked are logged as one operation, so they are undone together.
+        """
+        self._changes: list[Change] = []
+        try:
+            self._book_passengers()
+        finally:
+            self.master.command_log.record(self._changes)  # type: ignore
+
+    def _book(self, carriage_num: int, seat_num: int, name: str):
+        """Book one passenger, store the booking and remember the change.
+
+        Raises:
+            IndexError: If the seat number is invalid
+            ValueError: If the seat is already booked
+        """
+        with span("book"):
+            self.train.book_passenger(carriage_num, seat_num, name)
+        # If sucessful, load into booking stack
+        with span("snapshot"):
+            self.master.bookings.append(  # type: ignore
+                Booking(name, seat_num, carriage_num + 1, self.train.snapshot())
+            )
+        self._changes.append((self.train.number, carriage_num, seat_num, None, name))
+
+    def _book_passengers(self):
         # region ErrorCheck
         # Testa läs vagnnr
         try:
@@ -89,10 +145,20 @@ class BookingPopup(tk.Toplevel):
             self.train.carriages[carriage_num].remaining_seats
             < self.pax_frame.listbox.size()
         ):
-            messagebox.showerror(
+            wait = messagebox.askyesno(
                 "Inte nog med stolar!",
-                "Det finns inte tillräckligt med stolar i denna vagn för att genomföra bokningen.",
+                "Det finns inte tillräckligt med stolar i denna vagn för att genomföra bokningen. "  # noqa
+                "Vill du ställa passagerarna i kö? De får platser i vagnen när någon avbokar.",  # noqa
             )
+            if wait:
+                for name in self.pax_frame.listbox.get(0, tk.END):
+                    self.train.waitlist.add(name, carriage_num)
+                messagebox.showinfo(
+                    "I kö",
+                    f"{self.pax_frame.listbox.size()} passagerare står nu i kö. "
+                    f"Totalt väntar {len(self.train.waitlist)} på tåg {self.train.number}.",  # noqa
+                )
+                self.booking_complete(True)
             self.focus()
             return
 
@@ -104,18 +170,7 @@ class BookingPopup(tk.Toplevel):
         # With only one passenger, no checks for adjacent seats are neccesary
         if self.pax_frame.listbox.size() == 1:
             try:
-                self.train.book_passenger(
-                    carriage_num, start_seat, self.pax_frame.listbox.get(0)
-                )
-                # If sucessful, load into booking stack
-                self.master.bookings.append(  # type: ignore
-                    Booking(
-                        self.pax_frame.listbox.get(0),
-                        start_seat,
-                        carriage_num + 1,
-                        deepcopy(self.train),
-                    )
-                )
+                self._book(carriage_num, start_seat, self.pax_frame.listbox.get(0))
             except ValueError:
                 messagebox.showerror(
                     "Redan bokad plats!", "Den platsen är redan bokad av någon annan!"
@@ -137,13 +192,7 @@ class BookingPopup(tk.Toplevel):
             # Flag for booking separate seats, givet user agreement
             book_separate = False
             try:
-                self.train.book_passenger(carriage_num, start_seat + i, name)
-                # If above sucessful, append to stack
-                self.master.bookings.append(  # type: ignore
-                    Booking(
-                        name, start_seat + i, carriage_num + 1, deepcopy(self.train)
-                    )
-                )
+                self._book(carriage_num, start_seat + i, name)
             except (ValueError, IndexError):
                 book_separate = messagebox.askokcancel(
                     "Inga intilliggande platser tillgängliga!",
@@ -203,12 +252,7 @@ class BookingPopup(tk.Toplevel):
 
                 # Try to book the passenger. If fail, try next seat in seats_to_check
                 try:
-                    self.train.book_passenger(carriage_num, current_seat, name)
-                    self.master.bookings.append(  # type: ignore
-                        Booking(
-                            name, current_seat, carriage_num + 1, deepcopy(self.train)
-                        )
-                    )
+                    self._book(carriage_num, current_seat, name)
                     # Set flag to stop iteration
                     is_booked = True
                 except (ValueError, IndexError):
@@ -235,8 +279,10 @@ class BookingPopup(tk.Toplevel):
         """
         if not nopopup:
             messagebox.showinfo("Slutfört", "Bokning slutförd!")
-        # Update train visualisation
-        self.vis_label_var.set(self.train.terminal_repr())
+        # Update the changed seats in the train visualisation
+        with span("seat map"):
+            self.seat_map.refresh()
+            self.seat_map.select(None, None)
         # Clear inputs
         self.carriage_num.set("")
         self.starting_seat.set("")
@@ -320,6 +366,7 @@ class SelectFrame(ttk.Frame):
         self.rowconfigure(0, weight=1)
         self.rowconfigure(1, weight=1)
         self.rowconfigure(2, weight=1)
+        self.rowconfigure(3, weight=1)
         self.columnconfigure(0, weight=1)
         self.columnconfigure(1, weight=1)
 
@@ -343,16 +390,30 @@ class SelectFrame(ttk.Frame):
         self.carriage_entry = ttk.Entry(self, textvariable=self.master.carriage_num)  # type: ignore
         self.carriage_entry.grid(column=1, row=1, sticky="w")
 
+        # Seat preference, fills in the first matching free seat
+        self.preference_box = ttk.Combobox(
+            self,
+            textvariable=self.master.preference,  # type: ignore
+            values=PREFERENCE_CHOICES,
+            state="readonly",
+            width=10,
+        )
+        self.preference_box.grid(column=0, row=2, sticky="e", padx=5)
+        self.suggest_button = ttk.Button(
+            self, text="Föreslå plats", command=self.master.suggest_seat  # type: ignore
+        )
+        self.suggest_button.grid(column=1, row=2, sticky="w")
+
         # Book button
         self.book_passenger_button = ttk.Button(
             self, text="Boka", command=self.master.book_passengers  # type: ignore
         )
         self.book_passenger_button.grid(
-            column=0, row=2, sticky="e", padx=5, pady=(10, 0)
+            column=0, row=3, sticky="e", padx=5, pady=(10, 0)
         )
 
         # Finish button
         self.finish_button = ttk.Button(
             self, text="Tillbaka", command=self.master.destroy
         )
-        self.finish_button.grid(column=1, row=2, sticky="w", padx=5, pady=(10, 0))
+        self.finish_button.grid(column=1, row=3, sticky="w", padx=5, pady=(10, 0))
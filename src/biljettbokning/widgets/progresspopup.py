@@ -0,0 +1,46 @@
+import tkinter as tk
+from tkinter import ttk
+from typing import Optional
+
+from biljettbokning.worker import Job
+
+
+class ProgressPopup(tk.Toplevel):
+    """Shows the progress of a background job and lets the user cancel it."""
+
+    def __init__(self, master, title: str, *args, **kwargs):
+        super().__init__(master, *args, **kwargs)
+        self.title(title)
+        self.resizable(False, False)
+        self.job: Optional[Job] = None
+
+        self.label = ttk.Label(self, text=title, anchor="center", justify="center")
+        self.label.grid(column=0, row=0, padx=10, pady=(15, 5), sticky="ew")
+
+        # Indeterminate until the job knows how much work there is
+        self.bar = ttk.Progressbar(self, length=300, mode="indeterminate")
+        self.bar.grid(column=0, row=1, padx=10, pady=5)
+        self.bar.start()
+
+        self.cancel_button = ttk.Button(self, text="Avbryt", command=self.cancel)
+        self.cancel_button.grid(column=0, row=2, padx=10, pady=(5, 10))
+        # Closing the window is the same as cancelling
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+
+        self.grab_set()
+
+    def update_progress(self, job: Job):
+        """Show the progress of the job, used as Worker.submit on_progress."""
+        self.job = job
+        if job.total:
+            if str(self.bar["mode"]) != "determinate":
+                self.bar.stop()
+                self.bar.configure(mode="determinate")
+            self.bar.configure(maximum=job.total, value=job.done)
+            self.label.configure(text=f"{job.description} ({job.done}/{job.total})")
+
+    def cancel(self):
+        """Ask the job to stop, the popup is closed when it has."""
+        if self.job is not None:
+            self.job.cancel()
+        self.cancel_button.configure(state="disabled", text="Avbryter...")
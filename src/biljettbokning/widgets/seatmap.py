@@ -0,0 +1,176 @@
+import tkinter as tk
+from tkinter import ttk
+from typing import Callable, Optional
+
+from biljettbokning.model import Carriage, Train, seats_in_mask
+
+# Pixels per seat, between seats and around carriages
+CELL = 24
+GAP = 3
+AISLE = 12
+CARRIAGE_GAP = 20
+TITLE = 18
+
+FREE_COLOR = "#dfe8d8"
+BOOKED_COLOR = "#c0504d"
+SELECTED_OUTLINE = "#1f5fbf"
+
+
+def seat_box(car: Carriage, seat_num: int, x: int) -> tuple[int, int, int, int]:
+    """Rectangle of a seat in a carriage drawn from x, rows run left to right.
+
+    Seats on the left side of the aisle are drawn above it like in
+    Train.terminal_repr.
+    """
+    row, col = divmod(seat_num - 1, car.total_seats_in_row)
+    y = TITLE + GAP + col * (CELL + GAP)
+    if col >= car.num_left_seats:
+        y += AISLE
+    x0 = x + GAP + row * (CELL + GAP)
+    return x0, y, x0 + CELL, y + CELL
+
+
+def carriage_width(car: Carriage) -> int:
+    return GAP + car.num_rows * (CELL + GAP)
+
+
+def changed_seats(shown: int, occupied: int) -> list[int]:
+    """Seat numbers whose booked bit differs between two occupancy masks."""
+    return seats_in_mask(shown ^ occupied)
+
+
+class SeatMap(ttk.Frame):
+    """Seat map of a train on a canvas, one rectangle and one text per seat.
+
+    Only the seats whose booking changed since the last refresh are redrawn,
+    found by comparing Carriage.occupied against the mask that was drawn.
+    Clicking a seat selects it.
+
+    Instance methods:
+        refresh() -> None: Redraw the seats that changed since the last refresh
+        select(carriage_num, seat_num) -> None: Highlight a seat, 1 based numbers
+    """
+
+    def __init__(
+        self,
+        master,
+        train: Train,
+        on_select: Optional[Callable[[int, int], None]] = None,
+        max_width: int = 900,
+        *args,
+        **kwargs,
+    ):
+        """Draw the seat map of a train.
+
+        Args:
+            master: Parent widget
+            train (Train): Train to show
+            on_select (Optional[Callable[[int, int], None]]): Called with the
+                carriage and seat number (both starting at 1) of a clicked seat
+            max_width (int): Widest the canvas gets before it scrolls
+        """
+        super().__init__(master, *args, **kwargs)
+        self.train = train
+        self.on_select = on_select
+
+        self.columnconfigure(0, weight=1)
+        self.canvas = tk.Canvas(self, highlightthickness=0)
+        self.canvas.grid(column=0, row=0, sticky="nesw")
+        self.scrollbar = ttk.Scrollbar(
+            self, orient="horizontal", command=self.canvas.xview
+        )
+        self.canvas.configure(xscrollcommand=self.scrollbar.set)
+
+        # Canvas item of every seat's rectangle, indexed [carriage][seat - 1]
+        self._rects: list[list[int]] = []
+        # The seat of every rectangle and text, for clicks
+        self._seat_of_item: dict[int, tuple[int, int]] = {}
+        # Occupancy mask per carriage as currently drawn
+        self._shown: list[int] = []
+        self._selected: Optional[tuple[int, int]] = None
+
+        self._draw(max_width)
+        self.canvas.bind("<Button-1>", self._on_click)
+
+    def _draw(self, max_width: int) -> None:
+        x = 0
+        height = 0
+        for car_index, car in enumerate(self.train.carriages):
+            width = carriage_width(car)
+            self.canvas.create_text(
+                x + width // 2, TITLE // 2, text=f"{car_index + 1}.", anchor="center"
+            )
+
+            rects = []
+            for seat_num in range(1, car.total_seats + 1):
+                box = seat_box(car, seat_num, x)
+                rect = self.canvas.create_rectangle(*box, fill=FREE_COLOR)
+                text = self.canvas.create_text(
+                    (box[0] + box[2]) // 2,
+                    (box[1] + box[3]) // 2,
+                    text=str(seat_num),
+                    font=("TkSmallCaptionFont", 8),
+                )
+                self._seat_of_item[rect] = self._seat_of_item[text] = (
+                    car_index,
+                    seat_num,
+                )
+                rects.append(rect)
+                height = max(height, box[3])
+
+            # Carriage outline
+            self.canvas.create_rectangle(x, TITLE, x + width, height + GAP)
+            self._rects.append(rects)
+            self._shown.append(0)
+            x += width + CARRIAGE_GAP
+
+        self.canvas.configure(
+            scrollregion=(0, 0, x, height + 2 * GAP),
+            width=min(x, max_width),
+            height=height + 2 * GAP,
+        )
+        if x > max_width:
+            self.scrollbar.grid(column=0, row=1, sticky="ew")
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Redraw the seats that were booked or unbooked since the last refresh."""
+        for car_index, car in enumerate(self.train.carriages):
+            occupied = car.occupied
+            if occupied == self._shown[car_index]:
+                continue
+            for seat_num in changed_seats(self._shown[car_index], occupied):
+                booked = bool(occupied >> (seat_num - 1) & 1)
+                self.canvas.itemconfigure(
+                    self._rects[car_index][seat_num - 1],
+                    fill=BOOKED_COLOR if booked else FREE_COLOR,
+                )
+            self._shown[car_index] = occupied
+
+    def select(self, carriage_num: Optional[int], seat_num: Optional[int]) -> None:
+        """Highlight a seat, or remove the highlight if either number is None."""
+        if self._selected is not None:
+            car_index, old_seat = self._selected
+            self.canvas.itemconfigure(
+                self._rects[car_index][old_seat - 1], outline="black", width=1
+            )
+            self._selected = None
+
+        if carriage_num is None or seat_num is None:
+            return
+        self._selected = (carriage_num - 1, seat_num)
+        self.canvas.itemconfigure(
+            self._rects[carriage_num - 1][seat_num - 1],
+            outline=SELECTED_OUTLINE,
+            width=3,
+        )
+
+    def _on_click(self, event) -> None:
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        for item in self.canvas.find_overlapping(x, y, x, y):
+            if item in self._seat_of_item:
+                car_index, seat_num = self._seat_of_item[item]
+                self.select(car_index + 1, seat_num)
+                if self.on_select is not None:
+                    self.on_select(car_index + 1, seat_num)
+                return
@@ -1,8 +1,16 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, font
-from typing import Literal
+from tkinter import ttk, messagebox
+from typing import Literal, Optional
 
-from biljettbokning.model import Bookings, Train
+from biljettbokning.commandlog import unbooking
+from biljettbokning.model import Booking, Bookings, Train
+from biljettbokning.passengers import PassengerHit
+from biljettbokning.tracing import span, traced
+from biljettbokning.waitlist import WaitlistEntry
+from biljettbokning.widgets.seatmap import SeatMap
+
+# Names shown while typing a name
+MAX_SUGGESTIONS = 8
 
 
 class UnbookingPopup(tk.Toplevel):
@@ -30,25 +38,58 @@ class UnbookingPopup(tk.Toplevel):
         )
         self.title.grid(column=0, row=0, columnspan=2, sticky="nesw", pady=15)
 
-        # Create the train visualisation
-        # Load and config font
-        mono_font = font.nametofont("TkFixedFont")
-        mono_font.config(size=10)
-
-        # Label to hold the train visualisation
-        self.vis_label_var = tk.StringVar(value=train.terminal_repr())
-        self.vis_label = ttk.Label(
-            self,
-            textvariable=self.vis_label_var,
-            anchor="center",
-            font=mono_font,
-        )
-        self.vis_label.grid(column=0, row=1, columnspan=2, sticky="ew", pady=10)
+        # Create the train visualisation, clicking a seat selects it
+        self.seat_map = SeatMap(self, train, on_select=self.on_seat_selected)
+        self.seat_map.grid(column=0, row=1, columnspan=2, pady=10, padx=10)
 
         # Frame for selection things to be unbooked
         self.selection_frame = SelectionFrame(self)
         self.selection_frame.grid(column=0, row=2, sticky="nesw")
 
+    def on_seat_selected(self, carriage_num: int, seat_num: int):
+        """Unbook by seat number for a seat clicked in the seat map."""
+        self.selection_frame.car_num.set(str(carriage_num))
+        # Changing the type clears the entry, so set it first
+        self.selection_frame.selection_type.set("num")
+        self.selection_frame.multi_entry_var.set(str(seat_num))
+
+    def suggest(self, prefix: str) -> list[PassengerHit]:
+        """Passengers on the train whose name starts with prefix, from the app's index."""
+        passengers = getattr(self.master, "passengers", None)
+        if passengers is None or not prefix:
+            return []
+        return passengers.search(prefix, MAX_SUGGESTIONS, self.train.number)
+
+    def on_suggestion_selected(self, hit: PassengerHit):
+        """Fill in and show the seat of a suggested passenger."""
+        self.selection_frame.car_num.set(str(hit.carriage + 1))
+        self.selection_frame.multi_entry_var.set(hit.name)
+        self.seat_map.select(hit.carriage + 1, hit.seat)
+
+    def find_carriage(self, name: str) -> Optional[str]:
+        """Number of the carriage of the only passenger with the name, from the app's index.
+
+        Shows an error and returns None if there is not exactly one.
+        """  # noqa
+        passengers = getattr(self.master, "passengers", None)
+        hits = passengers.find(name, self.train.number) if passengers else []
+        if len(hits) == 1:
+            return str(hits[0].carriage + 1)
+
+        if hits:
+            messagebox.showerror(
+                "Flera med samma namn!",
+                "Det finns fler än en med detta namn på tåget, ange vagnsnummer.",
+            )
+        else:
+            messagebox.showerror(
+                "Ingen med detta namn!",
+                "Det finns ingen med detta namn på tåget. Försök igen.",
+            )
+        self.focus()
+        return None
+
+    @traced()
     def unbook_passenger(
         self, car_num: str, selection_type: Literal["num", "name"], to_be_unbooked: str
     ):
@@ -60,6 +101,13 @@ class UnbookingPopup(tk.Toplevel):
             to_be_unbooked (str): seat number or passenger name
         """
 
+        # By name the carriage can be left out, the passenger index knows it
+        if selection_type == "name" and not car_num.strip():
+            found = self.find_carriage(to_be_unbooked)
+            if found is None:
+                return
+            car_num = found
+
         # Try casting the carriage number to a nubmer and offset for list indexing
         try:
             carriage_num = int(car_num) - 1
@@ -83,7 +131,7 @@ class UnbookingPopup(tk.Toplevel):
         # try making a valid int
         try:
             seat_num = int(seat_num_str)
-            assert 0 <= seat_num < self.train.carriages[carriage_num].total_seats
+            assert 1 <= seat_num <= self.train.carriages[carriage_num].total_seats
         except (ValueError, AssertionError):
             messagebox.showerror(
                 "Ogiltigt stolsnummer!",
@@ -107,14 +155,17 @@ class UnbookingPopup(tk.Toplevel):
             return
 
         # Cant raise error since it works with empty seats: so unbook
-        self.train.unbook_seat(carriage_num, seat_num)
+        name = self.train.carriages[carriage_num].get_seat_num(seat_num).passenger_name
+        waiting = self.train.free_seat(carriage_num, seat_num)
+        self._record(carriage_num, seat_num, name, waiting)
         self.unbooking_complete()
 
     def unbook_name(self, carriage_num: int, name: str):
         """Unbook the passenger with the specified name in the specified carriage for the popups train."""
         # Try to unbook and brach for different errors
         try:
-            seat = self.train.carriages[carriage_num].get_seat_name(name)
+            with span("seat search"):
+                seat = self.train.carriages[carriage_num].get_seat_name(name)
         except ValueError:
             messagebox.showerror(
                 "Flera med samma namn!",
@@ -145,9 +196,34 @@ class UnbookingPopup(tk.Toplevel):
             return
 
         # After no more errors, unbook
-        self.train.unbook_seat(carriage_num, seat.number)
+        waiting = self.train.free_seat(carriage_num, seat.number)
+        self._record(carriage_num, seat.number, name, waiting)
         self.unbooking_complete()
 
+    def _record(
+        self,
+        carriage_num: int,
+        seat_num: int,
+        name: Optional[str],
+        waiting: Optional[WaitlistEntry],
+    ):
+        """Log an unbooking, and book the passenger from the waitlist who got the seat.
+
+        Both are one operation in the command log, so they are undone together
+        and undo puts the waiting passenger back first in the waitlist.
+        """  # noqa
+        if waiting is not None:
+            self.master.bookings.append(  # type: ignore
+                Booking(waiting.name, seat_num, carriage_num + 1, self.train.snapshot())
+            )
+            messagebox.showinfo(
+                "Plats från väntelistan",
+                f"Platsen har gått till {waiting.name} som stod i kö.",
+            )
+        self.master.command_log.record(  # type: ignore
+            unbooking(self.train.number, carriage_num, seat_num, name, waiting)
+        )
+
     def unbooking_complete(self, nopopup=False):
         """Cleanup after unbooking.
 
@@ -156,8 +232,10 @@ class UnbookingPopup(tk.Toplevel):
         """
         if not nopopup:
             messagebox.showinfo("Slutfört", "Avbokning slutförd!")
-        # Update train visualisation
-        self.vis_label_var.set(self.train.terminal_repr())
+        # Update the changed seats in the train visualisation
+        with span("seat map"):
+            self.seat_map.refresh()
+            self.seat_map.select(None, None)
         # Clear inputs
         self.selection_frame.car_num.set("")
         self.selection_frame.multi_entry_var.set("")
@@ -178,6 +256,7 @@ class SelectionFrame(ttk.Frame):
         self.rowconfigure(1, weight=1)
         self.rowconfigure(2, weight=1)
         self.rowconfigure(3, weight=1)
+        self.rowconfigure(4, weight=1)
 
         # Car number input
         self.car_num_label = ttk.Label(self, text="Vagnnummer:")
@@ -209,6 +288,13 @@ class SelectionFrame(ttk.Frame):
         )
         self.name_button.grid(column=2, row=2, sticky="w", padx=5, pady=5)
 
+        # Passengers matching the name typed so far, click to pick one
+        self.hits: list[PassengerHit] = []
+        self.suggestions = tk.Listbox(self, height=4, activestyle="none")
+        self.suggestions.grid(column=0, row=3, columnspan=3, padx=5, sticky="ew")
+        self.suggestions.bind("<<ListboxSelect>>", self.on_pick_suggestion)
+        self.multi_entry_var.trace_add("write", self.on_entry_change)
+
         # Add buttons
         self.button_frame = ttk.Frame(self)
         self.button_frame.columnconfigure(0, weight=1)
@@ -230,7 +316,7 @@ class SelectionFrame(ttk.Frame):
         )
         self.finish_button.grid(column=1, row=0)
         self.button_frame.grid(
-            column=0, row=3, columnspan=3, padx=5, pady=5, sticky="nesw"
+            column=0, row=4, columnspan=3, padx=5, pady=5, sticky="nesw"
         )
 
     def on_change_type_selection(self, *_):
@@ -241,3 +327,22 @@ class SelectionFrame(ttk.Frame):
             self.multi_label_var.set("Namn:")
 
         self.multi_entry_var.set("")
+
+    def on_entry_change(self, *_):
+        """Suggest passengers while a name is typed."""
+        if self.selection_type.get() == "name":
+            prefix = self.multi_entry_var.get().strip()
+            self.hits = self.master.suggest(prefix)  # type: ignore
+        else:
+            self.hits = []
+
+        self.suggestions.delete(0, "end")
+        for hit in self.hits:
+            self.suggestions.insert(
+                "end", f"{hit.name} (vagn {hit.carriage + 1}, stol {hit.seat})"
+            )
+
+    def on_pick_suggestion(self, _):
+        selection = self.suggestions.curselection()
+        if selection:
+            self.master.on_suggestion_selected(self.hits[selection[0]])  # type: ignore
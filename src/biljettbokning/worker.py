@@ -0,0 +1,148 @@
+"""Runs file I/O and heavy model work off the Tk main loop.
+
+Tk may only be used from the thread running the main loop, so a job never
+touches widgets itself. It reports progress through its Job, and its result
+or exception is handed back to the main loop, which polls a queue with
+widget.after() and calls the job's callbacks there.
+
+Example:
+    def write(job: Job, paths: list[str]) -> int:
+        for done, path in enumerate(paths, 1):
+            ...
+            job.progress(done, len(paths))  # raises Cancelled if cancelled
+        return len(paths)
+
+    worker = Worker(app)
+    worker.submit(write, paths, on_done=lambda n: print(n, "skrivna"))
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+from typing import Any, Callable, Optional
+
+
+class Cancelled(Exception):
+    """Raised in a job by Job.progress once the job has been cancelled."""
+
+
+class Job:
+    """A task submitted to a Worker, shared by the worker thread and the main loop.
+
+    Attributes:
+        description (str): What the job does, for progress windows
+        done (int): Units of work finished so far
+        total (int): Units of work in all, 0 while unknown
+
+    Instance methods:
+        progress(done, total) -> None: Report progress, raises Cancelled if cancelled
+        cancel() -> None: Ask the job to stop at its next progress report
+        cancelled() -> bool: If cancel has been called
+    """  # noqa
+
+    def __init__(self, description: str = ""):
+        self.description = description
+        self.done = 0
+        self.total = 0
+        self._cancelled = threading.Event()
+
+    def progress(self, done: int, total: int) -> None:
+        """Called by the job as it works.
+
+        Raises:
+            Cancelled: If the job was cancelled
+        """
+        self.done = done
+        self.total = total
+        if self._cancelled.is_set():
+            raise Cancelled()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+
+class Worker:
+    """Background thread(s) for jobs whose callbacks run on the Tk main loop.
+
+    Instance methods:
+        submit(func, *args, description, on_done, on_error, on_progress) -> Job: Run func(job, *args) in the background
+        shutdown(cancel) -> None: Cancel the running jobs if asked and stop the threads
+    """  # noqa
+
+    def __init__(self, widget, poll_interval: int = 50, max_workers: int = 1):
+        """Make a worker reporting back to the main loop of widget.
+
+        Args:
+            widget: Any Tk widget, used for after()
+            poll_interval (int): Milliseconds between checks for finished jobs
+            max_workers (int): Jobs run at the same time, the rest wait (default: 1)
+        """  # noqa
+        self.widget = widget
+        self.poll_interval = poll_interval
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="worker")
+        self._results: queue.Queue = queue.Queue()
+        # Job -> its (on_done, on_error, on_progress), only used on the main loop
+        self._running: dict[Job, tuple[Optional[Callable], ...]] = {}
+        self._polling = False
+
+    def submit(
+        self,
+        func: Callable[..., Any],
+        *args,
+        description: str = "",
+        on_done: Optional[Callable[[Any], Any]] = None,
+        on_error: Optional[Callable[[BaseException], Any]] = None,
+        on_progress: Optional[Callable[[Job], Any]] = None,
+    ) -> Job:
+        """Run func(job, *args) in the background, call from the main loop.
+
+        The callbacks are called on the main loop: on_progress with the job
+        every poll while it runs, then on_done with the result or on_error
+        with the exception (Cancelled if the job was cancelled).
+        """
+        job = Job(description)
+
+        def run():
+            try:
+                self._results.put((job, func(job, *args), None))
+            except BaseException as e:  # pylint: disable=broad-exception-caught
+                self._results.put((job, None, e))
+
+        self._running[job] = (on_done, on_error, on_progress)
+        self._pool.submit(run)
+        if not self._polling:
+            self._polling = True
+            self.widget.after(self.poll_interval, self._poll)
+        return job
+
+    def _poll(self) -> None:
+        """Runs on the main loop, hands back finished jobs and reports progress."""
+        while True:
+            try:
+                job, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            on_done, on_error, _ = self._running.pop(job)
+            if error is None:
+                if on_done is not None:
+                    on_done(result)
+            elif on_error is not None:
+                on_error(error)
+
+        for job, (_, _, on_progress) in list(self._running.items()):
+            if on_progress is not None:
+                on_progress(job)
+
+        self._polling = bool(self._running)
+        if self._polling:
+            self.widget.after(self.poll_interval, self._poll)
+
+    def shutdown(self, cancel: bool = True) -> None:
+        """Stop the threads once the running jobs are done, cancelling them if asked."""
+        if cancel:
+            for job in self._running:
+                job.cancel()
+        self._pool.shutdown(wait=True, cancel_futures=cancel)
@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import Optional
+import pytest
+from biljettbokning.model import Carriage, Train
+
+
+@pytest.fixture
+def make_train():
+    """Factory for the test train, by default 152 sthlm -> gbg with two 2+2 carriages of 5 rows."""  # noqa
+
+    def make(
+        number: int = 152,
+        layout: str = "2+2",
+        rows: int = 5,
+        carriages: int = 2,
+        stops: Optional[list[str]] = None,
+        arrival: datetime = datetime(2024, 5, 22, 16, 45),
+    ) -> Train:
+        return Train(
+            number,
+            datetime(2024, 5, 22, 15, 32),
+            arrival,
+            "sthlm",
+            "gbg",
+            [Carriage(layout, rows, i + 1) for i in range(carriages)],
+            stops,
+        )
+
+    return make
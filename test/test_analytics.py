@@ -0,0 +1,61 @@
+import pickle
+import pytest
+from biljettbokning import analytics
+from biljettbokning.analytics import Occupancy, occupancy_report
+from biljettbokning.generator import FleetConfig, generate
+
+
+def naive_load(trains) -> dict[int, float]:
+    return {
+        t.number: sum(s.is_booked() for c in t.carriages for s in c._flat_seats)
+        / sum(c.total_seats for c in t.carriages)
+        for t in trains
+    }
+
+
+class TestAnalytics:
+    def test_bitmask_follows_seats(self):
+        car = next(generate(1)).carriages[0]
+        car.book_passenger("a", 1)
+        car.book_passenger("b", 5)
+        car.unbook_seat(1)
+        assert car.occupied == 1 << 4
+        assert car.remaining_seats == car.total_seats - 1
+
+        # Rebuilt when unpickled
+        copy = pickle.loads(pickle.dumps(car))
+        assert copy.occupied == 1 << 4
+        copy.get_seat_num(2).passenger_name = "c"
+        assert copy.occupied == 0b10010 and car.occupied == 1 << 4
+
+    def test_matches_seat_loop(self):
+        trains = list(generate(30, FleetConfig(seed=2, occupancy=0.4)))
+        report = occupancy_report(trains, use_numpy=False)
+
+        assert report["trains"] == pytest.approx(naive_load(trains))
+        assert report["fleet"]["booked"] == sum(
+            c.total_seats - c.remaining_seats for t in trains for c in t.carriages
+        )
+        assert set(report["hours"]) == {t.departure.hour for t in trains}
+
+    def test_heatmap(self):
+        trains = list(generate(10, FleetConfig(layouts=("2+2",), rows=(3, 5))))
+        for train in trains:
+            for car in train.carriages:
+                car.book_passenger("Fönster", 1)
+        (rows,) = occupancy_report(trains, use_numpy=False)["heatmaps"].values()
+        assert len(rows) == 5
+        assert [row[0] for row in rows] == [1.0, 0, 0, 0, 0]
+        assert rows[0][1:] == [0, 0, 0]
+
+    @pytest.mark.skipif(analytics.np is None, reason="NumPy is not installed")
+    def test_numpy_same_result(self):
+        trains = list(generate(30, FleetConfig(seed=5, occupancy=0.3)))
+        assert occupancy_report(trains, use_numpy=True) == pytest.approx(
+            occupancy_report(trains, use_numpy=False)
+        )
+
+    def test_numpy_forced_without_numpy(self, monkeypatch):
+        monkeypatch.setattr(analytics, "np", None)
+        with pytest.raises(ImportError):
+            Occupancy([], use_numpy=True)
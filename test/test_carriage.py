@@ -1,6 +1,6 @@
 import itertools
 import pytest
-from biljettbokning.model import Carriage
+from biljettbokning.model import AISLE, TABLE, WINDOW, Carriage, seats_in_mask
 
 
 class TestCarriage:
@@ -96,3 +96,30 @@ class TestCarriage:
         for letter in letters:
             seat = carriage.get_seat_name(letter)
             assert seat.passenger_name == letter
+
+    def test_seat_attributes(self):
+        carriage = Carriage("2+2", 5)
+        attributes = carriage.attributes
+
+        assert seats_in_mask(attributes.window) == [1, 4, 5, 8, 9, 12, 13, 16, 17, 20]
+        assert seats_in_mask(attributes.aisle) == [2, 3, 6, 7, 10, 11, 14, 15, 18, 19]
+        # The two middle rows
+        assert seats_in_mask(attributes.table) == list(range(5, 13))
+        assert attributes.of_seat(5) == [WINDOW, TABLE]
+        # Computed once per layout
+        assert Carriage("2+2", 5, 2).attributes is attributes
+
+        narrow = Carriage("1+2", 2).attributes
+        assert seats_in_mask(narrow.window) == [1, 3, 4, 6]
+        assert seats_in_mask(narrow.aisle) == [1, 2, 4, 5]
+
+    def test_free_seats(self):
+        carriage = Carriage("2+2", 5)
+        carriage.book_passenger("John Doe", 1)
+        carriage.book_passenger("Jane Doe", 6)
+
+        assert carriage.free_seats(WINDOW)[:3] == [4, 5, 8]
+        assert carriage.free_seats(AISLE)[:2] == [2, 3]
+        assert len(carriage.free_seats()) == 18
+        with pytest.raises(ValueError):
+            carriage.free_mask("balcony")
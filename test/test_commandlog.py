@@ -0,0 +1,98 @@
+import io
+import threading
+import pytest
+from biljettbokning.commandlog import CommandLog, JsonLinesWriter, replay
+from biljettbokning.model import Fleet
+
+
+@pytest.fixture
+def make_fleet(make_train):
+    return lambda: Fleet([make_train()])
+
+
+def names(fleet: Fleet, carriage: int = 0) -> list:
+    car = fleet.get_train(152).carriages[carriage]
+    return [seat.passenger_name for seat in car._flat_seats[:5]]
+
+
+class TestCommandLog:
+    def test_undo_redo(self, make_fleet):
+        fleet = make_fleet()
+        fleet.book(152, 0, 1, "a")
+        fleet.book_group(152, 0, 3, ["b", "c"])
+        fleet.unbook_seat(152, 0, 1)
+        fleet.unbook_seat(152, 0, 2)  # Empty seat, nothing to log
+        assert len(fleet.log) == 3
+
+        fleet.undo()
+        assert names(fleet) == ["a", None, "b", "c", None]
+        fleet.undo()
+        assert names(fleet) == ["a", None, None, None, None]
+        assert len(fleet.bookings) == 1
+
+        assert fleet.redo() == ((152, 0, 3, None, "b"), (152, 0, 4, None, "c"))
+        assert names(fleet) == ["a", None, "b", "c", None]
+        assert len(fleet.bookings) == 3
+
+        # A new operation clears the redo stack
+        fleet.book(152, 1, 1, "d")
+        with pytest.raises(IndexError):
+            fleet.redo()
+
+    def test_conflict_keeps_operation(self, make_fleet):
+        fleet = make_fleet()
+        fleet.book_group(152, 0, 1, ["a", "b"])
+        fleet.undo()
+        # Someone else takes seat 2 without going through the log
+        fleet.get_train(152).book_passenger(0, 2, "x")
+
+        with pytest.raises(ValueError):
+            fleet.redo()
+        # Seat 1 was rolled back, the operation can be redone later
+        assert names(fleet)[:2] == [None, "x"]
+        assert fleet.log.can_redo
+
+    def test_limit(self):
+        log = CommandLog(limit=2)
+        for seat in range(1, 5):
+            log.record([(1, 0, seat, None, "a")])
+        assert len(log) == 2
+
+    def test_listeners_called_without_carriage_lock(self, make_fleet):
+        fleet = make_fleet()
+        car = fleet.get_train(152).carriages[0]
+        free = []
+
+        def listener(*_):
+            # Another thread can take the lock only if nobody holds it
+            def try_lock():
+                if car.lock.acquire(blocking=False):
+                    free.append(True)
+                    car.lock.release()
+
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+
+        fleet.log.subscribe(listener)
+        fleet.book(152, 0, 1, "a")
+        fleet.unbook_passenger(152, 0, "a")
+        fleet.undo()
+        fleet.book_preferred(152, "b")
+        assert len(free) == 4
+
+    def test_replication_stream(self, make_fleet):
+        fleet = make_fleet()
+        replica = make_fleet()
+        stream = io.StringIO()
+        fleet.log.subscribe(JsonLinesWriter(stream))
+
+        fleet.book(152, 0, 1, "Åsa")
+        fleet.book_group(152, 1, 2, ["b", "c"])
+        fleet.undo()
+        fleet.unbook_passenger(152, 0, "Åsa")
+        fleet.undo()
+
+        assert replay(replica, io.StringIO(stream.getvalue())) == 5
+        assert names(replica) == names(fleet) == ["Åsa", None, None, None, None]
+        assert names(replica, 1) == names(fleet, 1)
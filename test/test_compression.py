@@ -0,0 +1,89 @@
+import functools
+import pytest
+from biljettbokning.compression import compress, open_stream
+from biljettbokning.metrics import METRICS
+from biljettbokning.model import Bookings, Fleet, Train
+
+
+@pytest.fixture
+def make_train(make_train):
+    # Larger carriages than the default, so there is something to compress
+    return functools.partial(make_train, layout="3+3", rows=10, carriages=3)
+
+
+class TestCompression:
+    @pytest.mark.parametrize("codec", [None, "zlib", "lzma"])
+    def test_stream(self, tmp_path, codec):
+        data = b"tomma platser " * 1000
+        (tmp_path / "f").write_bytes(compress(data, codec))
+        with open_stream(tmp_path / "f", codec) as f:
+            assert f.read(5) == b"tomma"
+            assert f.read() == data[5:]
+
+    @pytest.mark.parametrize("codec", ["zlib", "lzma"])
+    def test_train(self, tmp_path, codec, make_train):
+        train = make_train()
+        train.book_passenger(1, 3, "Jane Doe")
+        train.serialize(str(tmp_path / "raw"))
+        train.serialize(str(tmp_path / "packed"), codec)
+
+        raw = tmp_path / "raw" / "train_152" / "carriage_1.pickle"
+        packed = list((tmp_path / "packed" / "train_152").glob("carriage_1.*"))
+        assert len(packed) == 1 and packed[0].name != "carriage_1.pickle"
+        assert packed[0].stat().st_size < raw.stat().st_size
+
+        loaded = Train.from_file(str(tmp_path / "packed" / "train_152"))
+        assert loaded.carriages[1].get_seat_num(3).passenger_name == "Jane Doe"
+        assert not loaded.needs_save(str(tmp_path / "packed"), codec)
+
+    def test_change_codec(self, tmp_path, make_train):
+        train = make_train()
+        train.serialize(str(tmp_path), "lzma")
+        # Every carriage is rewritten and the old files removed
+        assert train.needs_save(str(tmp_path), "zlib")
+        train.serialize(str(tmp_path), "zlib")
+        names = sorted(p.name for p in (tmp_path / "train_152").iterdir())
+        assert names == [f"carriage_{i}.pickle.gz" for i in range(3)] + ["train.json"]
+        assert len(Train.from_file(str(tmp_path / "train_152")).carriages) == 3
+
+    def test_unknown_codec(self, tmp_path, make_train):
+        with pytest.raises(ValueError):
+            make_train().serialize(str(tmp_path), "zip")
+
+    def test_bookings(self, tmp_path, make_train):
+        fleet = Fleet([make_train(1), make_train(2)])
+        fleet.book(1, 0, 1, "Jane Doe")
+        fleet.book_leg(2, 1, 2, "John Doe", "sthlm", "gbg")
+        fleet.save(str(tmp_path), codec="lzma")
+        fleet.save(str(tmp_path), codec="zlib")
+        assert not (tmp_path / "bookings.jsonl.xz").exists()
+
+        loaded = Fleet.from_directory(str(tmp_path))
+        assert [
+            (b.train.number, b.carriage, b.seat, b.name) for b in loaded.bookings
+        ] == [
+            (1, 1, 1, "Jane Doe"),
+            (2, 2, 2, "John Doe"),
+        ]
+        assert loaded.bookings[1].from_stop == "sthlm"
+        assert loaded.bookings[0].train is loaded.get_train(1)
+
+        # Bookings on trains that are not loaded are left out
+        assert len(Bookings.load(str(tmp_path), [loaded.get_train(2)])) == 1
+
+    def test_metrics(self, tmp_path, make_train):
+        METRICS.reset()
+        METRICS.enable()
+        try:
+            make_train().serialize(str(tmp_path), "zlib")
+            Train.from_file(str(tmp_path / "train_152"))
+            snapshot = METRICS.snapshot()
+        finally:
+            METRICS.disable()
+            METRICS.reset()
+
+        ratios = snapshot["values"]["compression_ratio"]
+        assert ratios["train_152/carriage_0.pickle.gz"] > 1
+        reads = snapshot["operations"]["read"]
+        assert reads["train_152/carriage_0.pickle.gz"]["count"] == 1
+        assert len(reads) == 3
@@ -0,0 +1,146 @@
+from collections import Counter
+import functools
+import random
+import sys
+import threading
+import pytest
+from biljettbokning.model import Fleet
+
+
+@pytest.fixture(autouse=True)
+def frequent_switching():
+    # Switch threads as often as possible to provoke races
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+@pytest.fixture
+def make_train(make_train):
+    # Three carriages of 40 seats for the threads to compete over
+    return functools.partial(make_train, rows=10, carriages=3)
+
+
+def run_threads(target, amount: int):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(amount)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class TestConcurrency:
+    def test_no_double_booking(self, make_train):
+        train = make_train(1)
+        successes: list[tuple[int, int, str]] = []
+
+        def worker(thread_num: int):
+            rng = random.Random(thread_num)
+            for attempt in range(400):
+                car_num, seat_num = rng.randrange(3), rng.randint(1, 40)
+                name = f"{thread_num}-{attempt}"
+                try:
+                    train.book_passenger(car_num, seat_num, name)
+                except ValueError:
+                    continue
+                successes.append((car_num, seat_num, name))
+
+        run_threads(worker, 8)
+
+        # Each seat was won by exactly one thread, and that thread is in the seat
+        counts = Counter((car_num, seat_num) for car_num, seat_num, _ in successes)
+        assert all(count == 1 for count in counts.values())
+        for car_num, seat_num, name in successes:
+            assert (
+                train.carriages[car_num].get_seat_num(seat_num).passenger_name == name
+            )
+
+        booked = sum(car.total_seats - car.remaining_seats for car in train.carriages)
+        assert booked == len(successes)
+
+    def test_group_bookings_across_carriages(self, make_train):
+        train = make_train(1)
+        won: list[list[tuple[int, int, str]]] = []
+
+        def worker(thread_num: int):
+            rng = random.Random(thread_num)
+            for attempt in range(200):
+                # Opposite carriage orders provoke deadlocks without a lock order
+                cars = [0, 2] if thread_num % 2 else [2, 0]
+                seats = [
+                    (car, rng.randint(1, 40), f"{thread_num}-{attempt}-{car}")
+                    for car in cars
+                ]
+                try:
+                    train.book_passengers(seats)
+                except ValueError:
+                    continue
+                won.append(seats)
+
+        run_threads(worker, 8)
+
+        flat = [seat for group in won for seat in group]
+        assert len({(car, seat) for car, seat, _ in flat}) == len(flat)
+        for car, seat, name in flat:
+            assert train.carriages[car].get_seat_num(seat).passenger_name == name
+        # All or nothing, no carriage has half of a group
+        assert train.carriages[0].remaining_seats == train.carriages[2].remaining_seats
+
+    def test_fleet_records_match_seats(self, make_train):
+        fleet = Fleet([make_train(1), make_train(2)])
+
+        def worker(thread_num: int):
+            rng = random.Random(thread_num)
+            for attempt in range(300):
+                train_num, car_num, seat_num = (
+                    rng.randint(1, 2),
+                    rng.randrange(3),
+                    rng.randint(1, 40),
+                )
+                try:
+                    if rng.random() < 0.7:
+                        fleet.book(
+                            train_num, car_num, seat_num, f"{thread_num}-{attempt}"
+                        )
+                    else:
+                        fleet.unbook_seat(train_num, car_num, seat_num)
+                except ValueError:
+                    continue
+
+        run_threads(worker, 8)
+
+        booked = {
+            (train.number, car_num + 1, seat.number, seat.passenger_name)
+            for train in fleet
+            for car_num, car in enumerate(train.carriages)
+            for seat in car._flat_seats  # pylint: disable=protected-access
+            if seat.is_booked()
+        }
+        records = [(b.train.number, b.carriage, b.seat, b.name) for b in fleet.bookings]
+        assert len(records) == len(set(records))
+        assert set(records) == booked
+
+    def test_undo_redo_with_snapshots(self, make_train):
+        fleet = Fleet([make_train(1)])
+        train = fleet.get_train(1)
+        fleet.book(1, 1, 1, "a")
+        fleet.undo()
+
+        def worker(thread_num: int):
+            for _ in range(300):
+                if thread_num == 0:
+                    fleet.redo()
+                    fleet.undo()
+                else:
+                    train.snapshot()
+
+        # A lock order violation deadlocks, so never wait forever
+        threads = [
+            threading.Thread(target=worker, args=(i,), daemon=True) for i in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+        assert not any(thread.is_alive() for thread in threads)
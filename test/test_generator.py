@@ -0,0 +1,45 @@
+import os
+from biljettbokning.generator import FleetConfig, RUSH_HOURS, generate, write_fleet
+from biljettbokning.model import Fleet
+
+
+def summary(trains) -> list:
+    return [
+        (
+            t.number,
+            t.departure,
+            t.dest,
+            [(c.seating_configuration, c.num_rows) for c in t.carriages],
+            [s.passenger_name for c in t.carriages for s in c._flat_seats],
+        )
+        for t in trains
+    ]
+
+
+class TestGenerator:
+    def test_deterministic(self):
+        config = FleetConfig(seed=7, occupancy=0.5)
+        first = summary(generate(50, config, chunk_size=8))
+        assert first == summary(generate(50, config, chunk_size=8))
+        assert first != summary(generate(50, FleetConfig(seed=8), chunk_size=8))
+        assert [t[0] for t in first] == list(range(1, 51))
+
+    def test_config(self):
+        config = FleetConfig(
+            layouts=("2+2",), rows=(4, 4), occupancy=0.25, hour_weights=RUSH_HOURS
+        )
+        for train in generate(20, config):
+            assert train.departure.hour >= 5
+            for car in train.carriages:
+                assert car.seating_configuration == "2+2"
+                assert car.total_seats - car.remaining_seats == 4
+
+    def test_write_fleet(self, tmp_path):
+        config = FleetConfig(seed=3, occupancy=0.3)
+        assert write_fleet(str(tmp_path), 25, config, chunk_size=10, processes=2) == 25
+        assert len(os.listdir(tmp_path)) == 25
+
+        # Same trains as generated in this process
+        loaded = Fleet.from_directory(str(tmp_path))
+        loaded = sorted(loaded, key=lambda t: t.number)
+        assert summary(loaded) == summary(generate(25, config, chunk_size=10))
@@ -0,0 +1,101 @@
+import io
+import threading
+import pytest
+from biljettbokning.importer import import_rows, import_csv
+from biljettbokning.model import Fleet, Train
+
+
+@pytest.fixture
+def make_fleet(make_train):
+    # Carriages of 8 seats, trains 1 and 2
+    return lambda: Fleet([make_train(num, rows=2) for num in (1, 2)])
+
+
+class TestImport:
+    def test_rows_and_errors(self, make_fleet):
+        fleet = make_fleet()
+        manifest = io.StringIO(
+            "train,carriage,seat,name\n"
+            "1,1,3,Jane Doe\n"
+            "2,2,auto,A\n"
+            "1,1,3,John Doe\n"
+            "1,1,auto,B\n"
+            "3,1,1,Nobody\n"
+            "1,5,1,Lost\n"
+            "1,x,1,Bad\n"
+            "2,2,auto,C\n"
+        )
+        report = import_rows(fleet, manifest, batch_size=2)
+
+        assert report.rows == 8
+        assert report.booked == 4
+        assert [row for row, _ in report.errors] == [4, 6, 7, 8]
+        assert report.trains == {1, 2}
+        assert len(fleet.bookings) == 4
+
+        car = fleet.get_train(1).carriages[0]
+        assert car.get_seat_num(3).passenger_name == "Jane Doe"
+        assert car.get_seat_num(1).passenger_name == "B"
+        seats = fleet.get_train(2).carriages[1]._flat_seats
+        assert [s.passenger_name for s in seats[:2]] == ["A", "C"]
+
+    def test_bounded_buffer(self, make_fleet):
+        fleet = make_fleet()
+        lines = [f"{1 + i % 2},1,auto,P{i}" for i in range(20)]
+        report = import_rows(fleet, lines, batch_size=100, max_buffered=3)
+
+        # 10 rows per train, but a carriage only has 8 seats
+        assert report.booked == 16
+        assert len(report.errors) == 4
+
+    def test_single_flush(self, tmp_path, monkeypatch, make_fleet):
+        fleet = make_fleet()
+        manifest = tmp_path / "manifest.csv"
+        manifest.write_text(
+            "".join(f"1,{c},auto,P{c}{i}\n" for c in (1, 2) for i in range(4))
+        )
+        # Only the touched train is written again
+        fleet.save(str(tmp_path))
+        saved = []
+        monkeypatch.setattr(
+            Train, "serialize", lambda self, root, codec=None: saved.append(self.number)
+        )
+
+        report = import_csv(fleet, str(manifest), str(tmp_path), batch_size=2)
+        assert report.booked == 8
+        assert saved == [1]
+        loaded = Fleet.from_directory(str(tmp_path))
+        assert len(loaded.bookings) == 8
+
+    def test_listeners_called_without_locks(self, make_fleet):
+        fleet = make_fleet()
+        car = fleet.get_train(1).carriages[0]
+        free = []
+
+        def listener(*_):
+            def try_lock():
+                if car.lock.acquire(blocking=False):
+                    free.append(True)
+                    car.lock.release()
+
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+
+        fleet.log.subscribe(listener)
+        report = import_rows(fleet, [f"1,1,auto,P{i}" for i in range(4)], batch_size=2)
+        assert report.booked == 4
+        assert len(free) == 4
+
+    def test_preference(self, make_fleet):
+        fleet = make_fleet()
+        car = fleet.get_train(1).carriages[0]
+        car.book_passenger("Taken", 1)
+        report = import_rows(
+            fleet,
+            ["1,1,fönster,A", "1,1,window,B", "1,1,gång,C", "1,1,fönster,D"],
+        )
+
+        assert report.booked == 4
+        # Windows are 1, 4, 5 and 8, then the first free seat
+        assert [car.get_seat_name(name).number for name in "ABCD"] == [4, 5, 2, 8]
@@ -0,0 +1,28 @@
+import subprocess
+import sys
+
+HEADLESS = (
+    "biljettbokning",
+    "biljettbokning.model",
+    "biljettbokning.terminal",
+    "biljettbokning.importer",
+    "biljettbokning.generator",
+    "biljettbokning.server",
+    "biljettbokning.memory",
+    "biljettbokning.worker",
+    "biljettbokning.passengers",
+)
+
+
+class TestImports:
+    def test_headless_without_tkinter(self):
+        code = f"import sys, {', '.join(HEADLESS)}; print('tkinter' in sys.modules)"
+        out = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        assert out.stdout.strip() == "False"
+
+    def test_app_still_importable(self):
+        import biljettbokning
+
+        assert biljettbokning.App.__name__ == "App"
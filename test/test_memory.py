@@ -0,0 +1,35 @@
+import sys
+from biljettbokning.memory import deep_sizeof, fleet_report, top_allocations
+from biljettbokning.model import Booking
+
+
+class TestMemory:
+    def test_shared_objects_counted_once(self):
+        inner = [1.5] * 3
+        outer = [inner, inner]
+        assert deep_sizeof(outer) == (
+            sys.getsizeof(outer) + sys.getsizeof(inner) + sys.getsizeof(1.5)
+        )
+
+    def test_fleet_report(self, make_train):
+        train = make_train(1)
+        train.book_passenger(0, 1, "John Doe")
+        bookings = [Booking("John Doe", 1, 1, train)]
+
+        report = fleet_report([train], bookings)
+        assert report["per_object"]["Seat"]["count"] == 40
+        assert report["per_object"]["Carriage"]["count"] == 2
+        assert report["per_object"]["Train"]["count"] == 1
+        # Booking holds the live train, only the booking itself is extra
+        assert 0 < report["totals"]["bookings_bytes"] < 1000
+        assert (
+            report["per_object"]["Train"]["mean_bytes"]
+            > report["per_object"]["Carriage"]["mean_bytes"]
+            > report["per_object"]["Seat"]["mean_bytes"]
+        )
+
+    def test_top_allocations(self, make_train):
+        result, sites = top_allocations(lambda: [make_train(i) for i in range(20)], 5)
+        assert len(result) == 20
+        assert 0 < len(sites) <= 5
+        assert sites[0]["bytes"] >= sites[-1]["bytes"]
@@ -0,0 +1,94 @@
+import json
+import pytest
+from biljettbokning.metrics import METRICS, Histogram, timed, timer
+from biljettbokning.model import Carriage, Fleet
+
+
+@pytest.fixture
+def metrics():
+    METRICS.reset()
+    METRICS.enable()
+    yield METRICS
+    METRICS.disable()
+    METRICS.reset()
+
+
+class TestMetrics:
+    def test_disabled_records_nothing(self):
+        METRICS.reset()
+        carriage = Carriage("2+2", 5)
+        carriage.book_passenger("John Doe", 1)
+        assert METRICS.snapshot()["operations"] == {}
+
+    def test_records_model_calls(self, metrics):
+        carriage = Carriage("2+2", 5)
+        carriage.book_passenger("John Doe", 1)
+        with pytest.raises(ValueError):
+            carriage.book_passenger("Jane Doe", 1)
+        carriage.get_seat_name("John Doe")
+
+        ops = metrics.snapshot()["operations"]
+        book = ops["book"]["Carriage.book_passenger"]
+        assert book["count"] == 2
+        assert book["errors"] == 1
+        assert sum(book["buckets"].values()) == 2
+        assert ops["lookup"]["Carriage.get_seat_name"]["count"] == 1
+
+    def test_nested_calls_counted_once(self, metrics, make_train):
+        fleet = Fleet([make_train(carriages=1)])
+        fleet.book_preferred(152, "a")
+        fleet.book_group(152, 0, 2, ["b", "c"])
+        fleet.unbook_seat(152, 0, 1)
+
+        ops = metrics.snapshot()["operations"]
+        assert {op: data["count"] for op, data in ops["book"].items()} == {
+            "Fleet.book_preferred": 1,
+            "Fleet.book_group": 1,
+        }
+        assert {op: data["count"] for op, data in ops["unbook"].items()} == {
+            "Fleet.unbook_seat": 1
+        }
+
+    def test_decorator_and_timer(self, metrics):
+        @timed("render", "custom")
+        def work(x):
+            return x * 2
+
+        assert work(2) == 4
+        with timer("save", "block"):
+            pass
+
+        ops = metrics.snapshot()["operations"]
+        assert ops["render"]["custom"]["count"] == 1
+        assert ops["save"]["block"]["count"] == 1
+
+    def test_histogram_quantile(self):
+        h = Histogram()
+        for _ in range(99):
+            h.observe(0.000_001)
+        h.observe(3.0)
+        assert h.quantile(0.5) == 0.000_005
+        assert h.quantile(1.0) == 5.0
+
+    def test_dump(self, metrics, tmp_path):
+        Carriage("2+2", 5).book_passenger("John Doe", 1)
+
+        metrics.dump(str(tmp_path / "m.json"))
+        data = json.loads((tmp_path / "m.json").read_text(encoding="utf-8"))
+        assert data["operations"]["book"]["Carriage.book_passenger"]["count"] == 1
+
+        metrics.dump(str(tmp_path / "m.prom"))
+        text = (tmp_path / "m.prom").read_text(encoding="utf-8")
+        assert (
+            'biljettbokning_operation_seconds_count{category="book",'
+            'operation="Carriage.book_passenger"} 1'
+        ) in text
+        assert "# TYPE biljettbokning_operation_seconds histogram" in text
+
+    def test_values(self, metrics):
+        metrics.set_value("compression_ratio", "a.gz", 2.0)
+        metrics.set_value("compression_ratio", "a.gz", 4.0)
+        assert metrics.snapshot()["values"] == {"compression_ratio": {"a.gz": 4.0}}
+        text = metrics.to_prometheus()
+        assert "# TYPE biljettbokning_compression_ratio gauge" in text
+        assert 'biljettbokning_compression_ratio{key="a.gz"} 4.0' in text
@@ -0,0 +1,56 @@
+import pickle
+import pytest
+from biljettbokning.model import Booking, Carriage
+from biljettbokning.names import NAMES, NameTable
+
+
+class TestNameTable:
+    def test_intern(self):
+        table = NameTable()
+        assert table.intern(None) == table.intern("") == 0
+        first = table.intern("John Doe")
+        assert first != 0
+        assert table.intern("John Doe") == first
+        assert table.intern("Jane Doe") not in (0, first)
+        assert table.name(first) == "John Doe"
+        assert table.name(0) is None
+        assert len(table) == 2
+
+    def test_lookup_does_not_add(self):
+        table = NameTable()
+        assert table.lookup("Nobody") is None
+        assert "Nobody" not in table
+        assert table.lookup(None) == 0
+
+
+class TestInternedNames:
+    def test_seats_and_bookings_share_ids(self):
+        car = Carriage("2+2", 2)
+        car.book_passenger("Anna Andersson", 1)
+        car.book_passenger("Anna Andersson", 2)
+        first, second = car.get_seat_num(1), car.get_seat_num(2)
+
+        assert first.name_id == second.name_id == NAMES.lookup("Anna Andersson")
+        assert first.passenger_name == "Anna Andersson"
+        booking = Booking("Anna Andersson", 1, 1, None)  # type: ignore
+        assert booking.name_id == first.name_id
+        assert booking.name == "Anna Andersson"
+
+    def test_get_seat_name(self):
+        car = Carriage("2+2", 2)
+        car.book_passenger("Bertil Berg", 3)
+        assert car.get_seat_name("Bertil Berg").number == 3
+        with pytest.raises(KeyError):
+            car.get_seat_name("Never Booked Anywhere")
+        with pytest.raises(KeyError):
+            car.get_seat_name("")
+
+    def test_pickle_stores_names(self):
+        car = Carriage("2+2", 2)
+        car.book_passenger("Cecilia Ceder", 4)
+        data = pickle.dumps(car)
+        assert "Cecilia Ceder".encode() in data
+
+        loaded = pickle.loads(data)
+        assert loaded.get_seat_num(4).passenger_name == "Cecilia Ceder"
+        assert loaded.get_seat_num(4).name_id == car.get_seat_num(4).name_id
@@ -0,0 +1,92 @@
+import pickle
+from biljettbokning.model import Fleet
+from biljettbokning.passengers import PassengerHit, PassengerIndex
+
+
+class TestPassengerIndex:
+    def test_search(self):
+        index = PassengerIndex()
+        index.add("Anna Andersson", 1, 0, 3)
+        index.add("anders Berg", 2, 1, 4)
+        index.add("Bertil Ek", 1, 0, 5)
+        index.add("Annika Lind", 2, 0, 1)
+
+        assert [hit.name for hit in index.search("an")] == [
+            "anders Berg",
+            "Anna Andersson",
+            "Annika Lind",
+        ]
+        assert index.search("ANN", limit=1) == [PassengerHit("Anna Andersson", 1, 0, 3)]
+        assert [hit.name for hit in index.search("an", train_num=2)] == [
+            "anders Berg",
+            "Annika Lind",
+        ]
+        assert index.search("c") == []
+        assert len(index.search("")) == 4
+
+        index.remove("Anna Andersson", 1, 0, 3)
+        index.remove("Anna Andersson", 1, 0, 3)
+        assert [hit.name for hit in index.search("anna")] == []
+        assert index.search("", train_num=1) == [PassengerHit("Bertil Ek", 1, 0, 5)]
+        assert index.search("", train_num=3) == []
+        assert len(index) == 3
+
+    def test_find(self):
+        index = PassengerIndex()
+        index.add("Anna", 1, 0, 3)
+        index.add("Anna Berg", 1, 0, 4)
+        index.add("Anna", 2, 1, 1)
+        assert index.find("Anna") == [
+            PassengerHit("Anna", 1, 0, 3),
+            PassengerHit("Anna", 2, 1, 1),
+        ]
+        assert index.find("Anna", train_num=2) == [PassengerHit("Anna", 2, 1, 1)]
+        assert index.find("anna") == []
+
+    def test_follows_bookings(self, make_train):
+        train = make_train(1)
+        train.book_passenger(1, 2, "Jane Doe")
+        fleet = Fleet([train, make_train(2)])
+        index = fleet.passengers
+        assert index.find("Jane Doe") == [PassengerHit("Jane Doe", 1, 1, 2)]
+
+        fleet.book(2, 0, 1, "Jane Roe")
+        assert [hit.train for hit in index.search("jane")] == [1, 2]
+
+        fleet.unbook_seat(1, 1, 2)
+        assert [hit.name for hit in index.search("jane")] == ["Jane Roe"]
+
+        # Rebooking a seat replaces the name
+        fleet.get_train(2).carriages[0].get_seat_num(1).passenger_name = "John"
+        assert index.search("j") == [PassengerHit("John", 2, 0, 1)]
+
+    def test_watch_all(self, make_train):
+        trains = [make_train(num) for num in (1, 2, 3)]
+        for num, train in enumerate(trains):
+            train.book_passenger(0, 1, f"b{num}")
+            train.book_passenger(1, 2, f"a{num}")
+        fleet = Fleet(trains[:2])
+        fleet.add(trains[2])
+        index = fleet.passengers
+
+        assert [hit.name for hit in index.search("")] == [
+            "a0",
+            "a1",
+            "a2",
+            "b0",
+            "b1",
+            "b2",
+        ]
+        assert index.search("", train_num=3) == [
+            PassengerHit("a2", 3, 1, 2),
+            PassengerHit("b2", 3, 0, 1),
+        ]
+        fleet.book(1, 0, 2, "c")
+        assert index.find("c") == [PassengerHit("c", 1, 0, 2)]
+
+    def test_pickle_drops_observer(self, make_train):
+        fleet = Fleet([make_train(1)])
+        car = pickle.loads(pickle.dumps(fleet.get_train(1).carriages[0]))
+        assert car.name_observer is None
+        car.book_passenger("Jane Doe", 1)
+        assert len(fleet.passengers) == 0
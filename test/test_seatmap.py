@@ -0,0 +1,41 @@
+import tkinter as tk
+import pytest
+from biljettbokning.model import Carriage
+from biljettbokning.widgets.seatmap import CELL, SeatMap, changed_seats, seat_box
+from biljettbokning.generator import generate
+
+
+class TestSeatMap:
+    def test_changed_seats(self):
+        assert changed_seats(0b1010, 0b1010) == []
+        assert changed_seats(0b1010, 0b0110) == [3, 4]
+
+    def test_seat_box(self):
+        car = Carriage("2+3", 4)
+        boxes = [seat_box(car, num, 0) for num in range(1, car.total_seats + 1)]
+        # No two seats overlap
+        for i, a in enumerate(boxes):
+            assert a[2] - a[0] == CELL
+            for b in boxes[i + 1 :]:
+                assert a[2] <= b[0] or b[2] <= a[0] or a[3] <= b[1] or b[3] <= a[1]
+        # Seat 6 starts the second row, to the right of seat 1
+        assert boxes[5][1] == boxes[0][1] and boxes[5][0] > boxes[0][0]
+
+    def test_refresh_only_changed(self):
+        try:
+            root = tk.Tk()
+        except tk.TclError:
+            pytest.skip("No display")
+        train = next(generate(1))
+        seat_map = SeatMap(root, train)
+        updated = []
+        original = seat_map.canvas.itemconfigure
+        seat_map.canvas.itemconfigure = lambda *a, **k: (
+            updated.append(a[0]),
+            original(*a, **k),
+        )
+
+        train.carriages[1].book_passenger("a", 3)
+        seat_map.refresh()
+        assert updated == [seat_map._rects[1][2]]
+        root.destroy()
@@ -0,0 +1,156 @@
+import asyncio
+from datetime import datetime
+import pytest
+from biljettbokning.model import Carriage, Fleet, Train
+from biljettbokning.server import BookingClient, BookingServer
+
+
+@pytest.fixture
+def make_fleet(make_train):
+    def make() -> Fleet:
+        return Fleet(
+            [
+                make_train(),
+                Train(
+                    153,
+                    datetime(2024, 5, 23, 15, 32),
+                    datetime(2024, 5, 23, 16, 45),
+                    "gbg",
+                    "sthlm",
+                    [Carriage("3+2", 5)],
+                ),
+            ]
+        )
+
+    return make
+
+
+def run_with_server(fleet, coro_func):
+    async def runner():
+        async with BookingServer(fleet) as server:
+            async with BookingClient(server.host, server.port) as client:
+                return await coro_func(client, server)
+
+    return asyncio.run(runner())
+
+
+class TestServer:
+    def test_search(self, make_fleet):
+        async def scenario(client, _):
+            assert [t["number"] for t in await client.search()] == [152, 153]
+            assert [t["number"] for t in await client.search(start="gbg")] == [153]
+            assert await client.search(dest="malmö") == []
+
+        run_with_server(make_fleet(), scenario)
+
+    def test_book_and_unbook(self, make_fleet):
+        fleet = make_fleet()
+
+        async def scenario(client, _):
+            await client.book(152, 2, 4, "Jane Doe")
+            with pytest.raises(BookingClient.Error) as e:
+                await client.book(152, 2, 4, "John Doe")
+            assert e.value.status == 409
+
+            seat_map = await client.seat_map(152)
+            assert seat_map["carriages"][1]["booked"] == [4]
+
+            assert (await client.unbook_passenger(152, 2, "Jane Doe"))["seat"] == 4
+            with pytest.raises(BookingClient.Error) as e:
+                await client.unbook_passenger(152, 2, "Jane Doe")
+            assert e.value.status == 404
+
+        run_with_server(fleet, scenario)
+        assert not fleet.get_train(152).carriages[1].get_seat_num(4).is_booked()
+        assert len(fleet.bookings) == 0
+
+    def test_group_booking(self, make_fleet):
+        fleet = make_fleet()
+
+        async def scenario(client, _):
+            await client.book(152, 1, 3, "Blocker")
+            bookings = await client.book_group(152, 1, 1, ["a", "b", "c"])
+            assert [b["seat"] for b in bookings] == [1, 2, 4]
+
+            with pytest.raises(BookingClient.Error) as e:
+                await client.book_group(152, 1, 4, ["d", "e"], allow_separate=False)
+            assert e.value.status == 409
+
+        run_with_server(fleet, scenario)
+        assert len(fleet.bookings) == 4
+
+    def test_bad_requests(self, make_fleet):
+        async def scenario(client, _):
+            for method, path, payload, status in [
+                ("GET", "/trains/999/seatmap", None, 404),
+                ("GET", "/nothing", None, 404),
+                ("GET", "/trains/152/book", None, 405),
+                ("POST", "/trains/152/book", {"carriage": 1}, 400),
+                (
+                    "POST",
+                    "/trains/152/book",
+                    {"carriage": 9, "seat": 1, "name": "a"},
+                    400,
+                ),
+            ]:
+                with pytest.raises(BookingClient.Error) as e:
+                    await client.request(method, path, payload)
+                assert e.value.status == status
+
+        run_with_server(make_fleet(), scenario)
+
+    def test_internal_error(self, monkeypatch, make_fleet):
+        fleet = make_fleet()
+
+        def broken(*_):
+            raise RuntimeError("bug")
+
+        monkeypatch.setattr(fleet, "search", broken)
+
+        async def scenario(client, _):
+            with pytest.raises(BookingClient.Error) as e:
+                await client.search()
+            assert e.value.status == 500
+            # The connection still answers
+            assert (await client.seat_map(153))["train"]["number"] == 153
+
+        run_with_server(fleet, scenario)
+
+    def test_malformed_requests(self, make_fleet):
+        async def send(server, raw: bytes) -> bytes:
+            reader, writer = await asyncio.open_connection(server.host, server.port)
+            writer.write(raw)
+            await writer.drain()
+            status_line = await reader.readline()
+            writer.close()
+            return status_line
+
+        async def scenario(_, server):
+            negative = b"POST /trains/152/book HTTP/1.1\r\nContent-Length: -1\r\n\r\n"
+            assert b" 400 " in await send(server, negative)
+            long_line = b"GET /" + b"a" * 100_000 + b" HTTP/1.1\r\n\r\n"
+            assert b" 400 " in await send(server, long_line)
+            long_header = b"GET / HTTP/1.1\r\nX: " + b"a" * 100_000 + b"\r\n\r\n"
+            assert b" 431 " in await send(server, long_header)
+
+        run_with_server(make_fleet(), scenario)
+
+    def test_slow_client_does_not_block(self, make_fleet):
+        async def scenario(client, server):
+            # Half a request which is never finished
+            _, slow_writer = await asyncio.open_connection(server.host, server.port)
+            slow_writer.write(
+                b"POST /trains/152/book HTTP/1.1\r\nContent-Length: 100\r\n"
+            )
+            await slow_writer.drain()
+
+            results = await asyncio.wait_for(
+                asyncio.gather(
+                    *(client.book(152, 1, seat, f"p{seat}") for seat in range(1, 11))
+                ),
+                timeout=5,
+            )
+            assert len(results) == 10
+            slow_writer.close()
+
+        run_with_server(make_fleet(), scenario)
@@ -0,0 +1,64 @@
+from datetime import datetime
+import pytest
+from biljettbokning.model import Carriage, Train
+from biljettbokning.shard import ShardedFleet, shard_of
+
+
+def make_trains(amount: int) -> list[Train]:
+    return [
+        Train(
+            number,
+            datetime(2024, 5, 22, 15, number % 60),
+            datetime(2024, 5, 22, 17, 0),
+            "sthlm" if number % 2 else "gbg",
+            "gbg" if number % 2 else "sthlm",
+            [Carriage("2+2", 5, i + 1) for i in range(2)],
+        )
+        for number in range(1, amount + 1)
+    ]
+
+
+class TestShard:
+    def test_partition(self):
+        assert {shard_of(n, 3) for n in range(100)} == {0, 1, 2}
+
+    def test_routing_and_errors(self):
+        with ShardedFleet(make_trains(6), 3) as fleet:
+            assert fleet.book(4, 0, 1, "Jane Doe") == (1, 1)
+            with pytest.raises(ValueError):
+                fleet.book(4, 0, 1, "John Doe")
+            with pytest.raises(KeyError):
+                fleet.book(99, 0, 1, "John Doe")
+            with pytest.raises(IndexError):
+                fleet.book(4, 5, 1, "John Doe")
+
+            assert fleet.unbook_passenger(4, 0, "Jane Doe") == 1
+            assert "*" not in fleet.seat_map(4)
+
+            names = [n for n, _, _ in fleet.book_group(5, 1, 1, ["a", "b"])]
+            assert names == ["a", "b"]
+            assert fleet.count() == (6, 2)
+
+    def test_scatter_gather_search(self):
+        with ShardedFleet(make_trains(8), 3) as fleet:
+            found = fleet.search(start="sthlm")
+            assert sorted(t["number"] for t in found) == [1, 3, 5, 7]
+            departures = [t["departure"] for t in found]
+            assert departures == sorted(departures)
+
+    def test_book_many_keeps_order(self):
+        with ShardedFleet(make_trains(4), 2) as fleet:
+            results = fleet.book_many(
+                [(1, 0, 1, "a"), (2, 0, 1, "b"), (1, 0, 1, "c"), (9, 0, 1, "d")]
+            )
+            assert results[0] is None and results[1] is None
+            assert results[2][0] == "ValueError"
+            assert results[3][0] == "KeyError"
+
+    def test_load_from_directory(self, tmp_path):
+        for train in make_trains(4):
+            train.serialize(str(tmp_path))
+
+        with ShardedFleet(num_shards=2, directory=str(tmp_path)) as fleet:
+            assert fleet.count() == (4, 0)
+            fleet.book(3, 1, 2, "Jane Doe")
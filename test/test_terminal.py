@@ -0,0 +1,98 @@
+import io
+import pytest
+from biljettbokning.model import Fleet
+from biljettbokning.terminal import Terminal
+
+
+@pytest.fixture
+def make_terminal(make_train):
+    return lambda: Terminal([make_train()])
+
+
+class TestBatch:
+    def test_commands(self, make_terminal):
+        term = make_terminal()
+        out = io.StringIO()
+        script = """
+        # comment
+        boka 152 1 4 Jane Doe
+        book 152 1 4 John Doe
+        grupp 152 2 1 a; b ;c
+        avboka-namn 152 1 Jane Doe
+        unbook 152 2 2
+        skriv 152
+        flyg 1 2 3
+        boka 999 1 1 Nobody
+        """
+        ok, failed = term.batch(io.StringIO(script), out)
+
+        assert (ok, failed) == (5, 3)
+        lines = [
+            line for line in out.getvalue().splitlines() if line[:3] in ("OK ", "FEL")
+        ]
+        assert lines[0].startswith("OK  3:") and lines[0].endswith("vagn 1 plats 4")
+        assert lines[1].startswith("FEL 4:")
+        assert lines[2].endswith("vagn 2 platser 1, 2, 3")
+        assert lines[6].startswith("FEL 9:")
+        # The tickets of the two booked seats
+        assert lines[5].startswith("OK  8:")
+        assert out.getvalue().count("Platsbiljett") == 2
+        assert "Plats 3, vagn 2" in out.getvalue()
+
+        car = term.fleet.get_train(152).carriages[1]
+        assert [s.passenger_name for s in car._flat_seats[:3]] == ["a", None, "c"]
+        assert len(term.fleet.bookings) == 2
+
+    def test_long_batch(self, make_terminal):
+        # Throughput is measured by bench/bench_model.py (Terminal.batch)
+        term = make_terminal()
+        script = [f"boka 152 {c} {s} P{c}-{s}" for c in (1, 2) for s in range(1, 21)]
+        script += [f"avboka 152 {c} {s}" for c in (1, 2) for s in range(1, 21)]
+        script *= 25
+
+        ok, failed = term.batch(script, io.StringIO())
+        assert (ok, failed) == (2000, 0)
+
+    def test_undo_redo(self, make_terminal):
+        term = make_terminal()
+        ok, failed = term.batch(
+            ["boka 152 1 1 a", "ångra", "ångra", "gör-om"], io.StringIO()
+        )
+        assert (ok, failed) == (3, 1)
+        assert (
+            term.fleet.get_train(152).carriages[0].get_seat_num(1).passenger_name == "a"
+        )
+
+    def test_saves_bookings(self, tmp_path, make_terminal):
+        fleet = make_terminal().fleet
+        fleet.book(152, 0, 1, "Anna")
+        fleet.save(str(tmp_path))
+
+        term = Terminal(Fleet.from_directory(str(tmp_path)))
+        ok, failed = term.batch(
+            ["avboka 152 1 1", "boka 152 1 2 Bertil"], io.StringIO()
+        )
+        assert (ok, failed) == (2, 0)
+        term.fleet.save(str(tmp_path))
+
+        loaded = Fleet.from_directory(str(tmp_path))
+        assert [(b.seat, b.name) for b in loaded.bookings] == [(2, "Bertil")]
+
+    def test_preference(self, make_terminal):
+        term = make_terminal()
+        out = io.StringIO()
+        ok, failed = term.batch(
+            ["boka 152 1 fönster a", "boka 152 1 gång b", "boka 152 1 balkong c"], out
+        )
+        assert (ok, failed) == (2, 1)
+        assert "vagn 1 plats 1" in out.getvalue()
+        assert "vagn 1 plats 2" in out.getvalue()
+
+        # Without free window seats any seat is taken, or none if strict
+        fleet = term.fleet
+        for seat in fleet.get_train(152).carriages[1].free_seats("window"):
+            fleet.book(152, 1, seat, f"w{seat}")
+        assert fleet.book_preferred(152, "d", "window", 1).seat == 2
+        assert fleet.book_preferred(152, "e", "window").carriage == 1
+        with pytest.raises(ValueError):
+            fleet.book_preferred(152, "f", "window", 1, strict=True)
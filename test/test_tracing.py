@@ -0,0 +1,64 @@
+import logging
+import time
+from biljettbokning import tracing
+from biljettbokning.tracing import SLOW_CALLBACKS, Watchdog, span, traced
+
+
+class FakeWidget:
+    """Stands in for a Tk widget whose main loop never runs."""
+
+    def after(self, *_):
+        pass
+
+
+class TestTracing:
+    def test_span_outside_trace_is_noop(self):
+        with span("nothing"):
+            pass
+        assert not tracing._active  # pylint: disable=protected-access
+
+    def test_slow_callback_breakdown(self, caplog):
+        @traced("callback", threshold=0.01)
+        def callback():
+            with span("outer"):
+                time.sleep(0.02)
+                with span("inner"):
+                    time.sleep(0.03)
+
+        with caplog.at_level(logging.WARNING, logger="biljettbokning.tracing"):
+            callback()
+
+        name, total, spans = SLOW_CALLBACKS[-1]
+        assert name == "callback"
+        assert spans["inner"] >= 0.03
+        assert spans["outer"] >= 0.02
+        # Time of inner is not counted in outer, counted twice they would
+        # add up to more than the whole callback
+        assert spans["outer"] + spans["inner"] <= total
+        assert "Slow callback callback" in caplog.text
+        assert "inner" in caplog.text and "other" in caplog.text
+
+    def test_fast_callback_not_logged(self, caplog):
+        @traced("fast", threshold=1.0)
+        def callback():
+            return 5
+
+        with caplog.at_level(logging.WARNING, logger="biljettbokning.tracing"):
+            assert callback() == 5
+        assert "fast" not in caplog.text
+
+    def test_watchdog_reports_freeze(self, caplog):
+        watchdog = Watchdog(FakeWidget(), threshold=0.05)
+
+        @traced("frozen", threshold=10)
+        def callback():
+            with span("work"):
+                # The main loop would be blocked here
+                watchdog.check(time.perf_counter() + 0.1)
+
+        with caplog.at_level(logging.WARNING, logger="biljettbokning.tracing"):
+            callback()
+
+        assert watchdog.freezes == 1
+        assert "UI frozen" in caplog.text
+        assert "frozen (span work)" in caplog.text
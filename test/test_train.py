@@ -1,31 +1,22 @@
-from datetime import datetime, time, timedelta
+from datetime import date, datetime, time, timedelta
+import functools
 import random
-from biljettbokning.model import Train
+import threading
+import pytest
+from biljettbokning.model import Carriage, Fleet, Train, save_trains
 
 
 class TestTrain:
-    def test_create(self):
-        t = Train(
-            152,
-            datetime(2024, 5, 22, 15, 32),
-            datetime(2024, 5, 22, 16, 45),
-            "sthlm",
-            "gbg",
-        )
+    def test_create(self, make_train):
+        t = make_train(carriages=0)
         assert t.number == 152
         assert t.departure == datetime(2024, 5, 22, 15, 32)
         assert t.arrival == datetime(2024, 5, 22, 16, 45)
         assert t.start == "sthlm"
         assert t.dest == "gbg"
 
-    def test_compare(self):
-        t1 = Train(
-            152,
-            datetime(2024, 5, 22, 15, 32),
-            datetime(2024, 5, 22, 16, 45),
-            "sthlm",
-            "gbg",
-        )
+    def test_compare(self, make_train):
+        t1 = make_train(carriages=0)
         t2 = Train(
             152,
             datetime(2024, 5, 22, 16, 32),
@@ -53,3 +44,283 @@ class TestTrain:
         assert not all(ts[i] < ts[i + 1] for i in range(len(ts) - 1))
         ts.sort()
         assert all(ts[i] < ts[i + 1] for i in range(len(ts) - 1))
+
+    def test_fleet_order(self):
+        def make(number: int, hour: int) -> Train:
+            return Train(
+                number,
+                datetime(2024, 5, 22, hour),
+                datetime(2024, 5, 22, hour + 1),
+                "sthlm",
+                "gbg",
+            )
+
+        fleet = Fleet([make(1, 12), make(2, 10), make(3, 12)])
+        fleet.add(make(4, 11))
+        fleet.add(make(5, 12))
+        fleet.add(make(6, 9))
+        assert [t.number for t in fleet.trains] == [6, 2, 4, 1, 3, 5]
+        with pytest.raises(ValueError):
+            fleet.add(make(4, 8))
+
+
+class TestSnapshot:
+    @pytest.fixture
+    def make_train(self, make_train):
+        return functools.partial(make_train, carriages=3)
+
+    def test_shares_unchanged_carriages(self, make_train):
+        train = make_train()
+        first = train.snapshot()
+        assert train.snapshot() is first
+
+        train.book_passenger(1, 3, "Jane Doe")
+        second = train.snapshot()
+        assert second is not first
+        assert second.carriages[0] is first.carriages[0]
+        assert second.carriages[2] is first.carriages[2]
+        assert second.carriages[1] is not first.carriages[1]
+
+        # The pinned version does not see later changes
+        assert first.carriages[1].get_seat_num(3).passenger_name is None
+        assert second.carriages[1].get_seat_num(3).passenger_name == "Jane Doe"
+        assert second.carriages[1].remaining_seats == 19
+
+    def test_terminal_repr(self, make_train):
+        train = make_train()
+        empty = train.terminal_repr()
+        train.book_passenger(0, 12, "Jane Doe")
+        assert "**" not in empty and "**" in train.terminal_repr()
+        version = train.snapshot()
+        assert version.terminal_repr() is version.terminal_repr()
+
+    def test_consistent_while_booking(self, make_train):
+        train = make_train()
+        stop = threading.Event()
+
+        def book():
+            while not stop.is_set():
+                # Whole carriage booked and unbooked at once
+                train.book_passengers((1, seat, "x") for seat in range(1, 21))
+                with train.locked([1]):
+                    for seat in range(1, 21):
+                        train.unbook_seat(1, seat)
+
+        writer = threading.Thread(target=book)
+        writer.start()
+        try:
+            for _ in range(300):
+                booked = train.snapshot().carriages[1].remaining_seats
+                assert booked in (0, 20)
+        finally:
+            stop.set()
+            writer.join()
+
+
+class TestLegs:
+    @pytest.fixture
+    def make_train(self, make_train):
+        return functools.partial(
+            make_train,
+            rows=2,
+            stops=["sthlm", "södertälje", "skövde", "gbg"],
+            arrival=datetime(2024, 5, 22, 19, 45),
+        )
+
+    def test_stops(self, make_train):
+        train = make_train()
+        assert train.leg("södertälje", "gbg") == (1, 3)
+        with pytest.raises(ValueError):
+            train.leg("skövde", "sthlm")
+        with pytest.raises(ValueError):
+            train.leg("sthlm", "malmö")
+        with pytest.raises(ValueError):
+            Train(1, datetime.now(), datetime.now(), "a", "b", stops=["a", "c"])
+        assert Train(1, datetime.now(), datetime.now(), "a", "b").stops == ["a", "b"]
+
+    def test_resell_seat(self, make_train):
+        train = make_train()
+        car = train.carriages[0]
+        train.book_leg(0, 1, "a", "sthlm", "södertälje")
+        train.book_leg(0, 1, "b", "södertälje", "gbg")
+        with pytest.raises(ValueError):
+            train.book_leg(0, 1, "c", "skövde", "gbg")
+        # Partly booked seats can not be booked for the whole trip
+        with pytest.raises(ValueError):
+            train.book_passenger(0, 1, "d")
+
+        train.book_leg(0, 2, "e", "södertälje", "skövde")
+        assert car.remaining_seats == 6
+        assert (0, 2) in train.free_seats_for("sthlm", "södertälje")
+        assert (0, 2) not in train.free_seats_for("sthlm", "skövde")
+        assert (0, 1) not in train.free_seats_for("skövde", "gbg")
+
+        assert car.unbook_leg(1, 0) == "a"
+        assert (0, 1) in train.free_seats_for("sthlm", "södertälje")
+        assert car.get_seat_num(1).is_booked()
+
+    def test_whole_trip_blocks_legs(self, make_train):
+        train = make_train()
+        train.book_passenger(1, 3, "a")
+        assert (1, 3) not in train.free_seats_for("skövde", "gbg")
+        with pytest.raises(ValueError):
+            train.book_leg(1, 3, "b", "skövde", "gbg")
+
+    def test_saved(self, tmp_path, make_train):
+        train = make_train()
+        train.book_leg(0, 4, "a", "sthlm", "skövde")
+        train.serialize(str(tmp_path))
+
+        loaded = Train.from_file(str(tmp_path / "train_152"))
+        assert loaded.stops == train.stops
+        car = loaded.carriages[0]
+        assert car.get_seat_num(4).legs[0][:2] == (0, 2)
+        assert car.leg_occupied == [1 << 3, 1 << 3]
+        assert (0, 4) in loaded.free_seats_for("skövde", "gbg")
+
+    def test_fleet_booking(self, make_train):
+        fleet = Fleet([make_train()])
+        booking = fleet.book_leg(152, 0, 1, "Jane Doe", "södertälje", "gbg")
+        text = str(booking)
+        assert "södertälje" in text and "19:45 gbg" in text
+
+        assert fleet.unbook_leg(152, 0, 1, "södertälje") == "Jane Doe"
+        assert len(fleet.bookings) == 0
+        with pytest.raises(KeyError):
+            fleet.unbook_leg(152, 0, 1, "södertälje")
+
+
+class TestSave:
+    @pytest.fixture
+    def make_train(self, make_train):
+        return functools.partial(make_train, carriages=3)
+
+    def test_dirty(self, tmp_path, make_train):
+        train = make_train()
+        assert train.dirty
+        train.serialize(str(tmp_path))
+        assert not train.dirty
+
+        train.book_passenger(1, 3, "a")
+        assert train.dirty
+        assert [car.dirty for car in train.carriages] == [False, True, False]
+
+        loaded = Train.from_file(str(tmp_path / "train_152"))
+        assert not loaded.dirty
+        loaded.waitlist.add("b")
+        assert loaded.dirty
+
+    def test_only_changed_written(self, tmp_path, make_train):
+        make_train().serialize(str(tmp_path))
+        train_dir = tmp_path / "train_152"
+        train = Train.from_file(str(train_dir))
+        inodes = [(train_dir / f"carriage_{i}.pickle").stat().st_ino for i in range(3)]
+
+        assert save_trains([train], str(tmp_path)) == 0
+        train.book_passenger(1, 3, "a")
+        assert save_trains([train], str(tmp_path)) == 1
+
+        # Written files are replaced by a new file, the others are untouched
+        after = [(train_dir / f"carriage_{i}.pickle").stat().st_ino for i in range(3)]
+        assert after[0] == inodes[0] and after[2] == inodes[2]
+        assert after[1] != inodes[1]
+        assert not list(train_dir.glob("*.tmp"))
+        loaded = Train.from_file(str(train_dir))
+        assert loaded.carriages[1].get_seat_num(3).passenger_name == "a"
+
+    def test_new_directory(self, tmp_path, make_train):
+        train = make_train()
+        train.serialize(str(tmp_path / "a"))
+        # Clean, but not saved there
+        assert save_trains([train], str(tmp_path / "b")) == 1
+        assert len(Train.from_file(str(tmp_path / "b" / "train_152")).carriages) == 3
+
+    def test_fleet_save(self, tmp_path, make_train):
+        fleet = Fleet([make_train(num) for num in range(1, 6)])
+        assert fleet.save(str(tmp_path), max_workers=3) == 5
+        fleet.book(2, 0, 1, "Jane Doe")
+        assert fleet.save(str(tmp_path), max_workers=3) == 1
+
+        loaded = Fleet.from_directory(str(tmp_path))
+        assert loaded.get_train(2).carriages[0].get_seat_num(1).is_booked()
+
+    def test_save_cancelled(self, tmp_path, make_train):
+        trains = [make_train(num) for num in range(1, 11)]
+
+        def progress(saved: int, _total: int):
+            if saved == 2:
+                raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            save_trains(trains, str(tmp_path), max_workers=1, progress=progress)
+        # Trains not started are left dirty for the next save
+        saved = [train for train in trains if not train.dirty]
+        assert 2 <= len(saved) < 10
+        assert save_trains(trains, str(tmp_path)) == 10 - len(saved)
+
+
+class TestBookedSeats:
+    def make_fleet(self) -> Fleet:
+        trains = [
+            Train(
+                num,
+                datetime(2024, 5, 20 + num, 15, 32),
+                datetime(2024, 5, 20 + num, 19, 45),
+                "sthlm",
+                "gbg" if num < 3 else "malmö",
+                [Carriage("2+2", 3, i + 1) for i in range(2)],
+                ["sthlm", "skövde", "gbg" if num < 3 else "malmö"],
+            )
+            for num in range(1, 4)
+        ]
+        fleet = Fleet(trains)
+        fleet.book(1, 0, 2, "Jane Doe")
+        fleet.book(1, 1, 5, "John Doe")
+        fleet.book(2, 1, 1, "Jane Doe")
+        fleet.book(3, 0, 3, "Jane Doe")
+        fleet.book_leg(2, 0, 4, "Ada", "sthlm", "skövde")
+        return fleet
+
+    def test_all(self):
+        seats = [
+            (s.train.number, s.carriage, s.seat, s.name, s.from_stop)
+            for s in self.make_fleet().booked_seats()
+        ]
+        assert seats == [
+            (1, 0, 2, "Jane Doe", None),
+            (1, 1, 5, "John Doe", None),
+            (2, 0, 4, "Ada", "sthlm"),
+            (2, 1, 1, "Jane Doe", None),
+            (3, 0, 3, "Jane Doe", None),
+        ]
+
+    def test_filters(self):
+        fleet = self.make_fleet()
+
+        def trains(**kwargs):
+            return [s.train.number for s in fleet.booked_seats(**kwargs)]
+
+        assert trains(train_num=2) == [2, 2]
+        assert trains(dest="malmö") == [3]
+        assert trains(start="sthlm", dest="gbg", name="Jane Doe") == [1, 2]
+        assert trains(first_day=date(2024, 5, 22), last_day=date(2024, 5, 22)) == [2, 2]
+        assert trains(name="Ada") == [2]
+        assert trains(name="Nobody at all") == []
+        with pytest.raises(KeyError):
+            fleet.booked_seats(train_num=9)
+
+    def test_tickets(self, tmp_path):
+        from biljettbokning.app import App  # pylint: disable=import-outside-toplevel
+        from biljettbokning.worker import Job  # pylint: disable=C0415
+
+        fleet = self.make_fleet()
+        App.write_all_tickets(Job(), str(tmp_path), fleet.trains)
+        names = sorted(path.name for path in tmp_path.iterdir())
+        assert len(names) == 5
+        assert "Tåg 1 - 2024-05-21 1532 - John Doe - 5 2.txt" in names
+        assert "Tåg 2 - 2024-05-22 1532 - Ada - 4 1 sthlm-skövde.txt" in names
+        # Carriage numbers start at 1 on the ticket too
+        text = (tmp_path / "Tåg 1 - 2024-05-21 1532 - John Doe - 5 2.txt").read_text(
+            encoding="utf-8"
+        )
+        assert "Plats 5, vagn 2" in text
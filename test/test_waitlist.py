@@ -0,0 +1,138 @@
+import functools
+import io
+import pickle
+
+import pytest
+
+from biljettbokning.model import Fleet, Train
+from biljettbokning.terminal import Terminal
+from biljettbokning.waitlist import Waitlist
+
+
+@pytest.fixture
+def make_train(make_train):
+    # Carriages of one row, so a few bookings fill them
+    return functools.partial(make_train, rows=1)
+
+
+class TestWaitlist:
+    def test_order(self):
+        waitlist = Waitlist()
+        waitlist.add("a", 0)
+        waitlist.add("b")
+        waitlist.add("c", 1)
+        waitlist.add("d", 0)
+
+        assert len(waitlist) == 4
+        # Longest waiting for the carriage or for any carriage
+        assert waitlist.pop_for(1) == "b"
+        assert waitlist.pop_for(1) == "c"
+        assert waitlist.pop_for(1) is None
+        assert waitlist.pop_for(0) == "a"
+        assert waitlist.to_json() == [("d", 0)]
+
+    def test_cancel_and_pickle(self):
+        waitlist = Waitlist([("a", None), ("b", 1)])
+        assert waitlist.cancel("a")
+        assert not waitlist.cancel("a")
+
+        loaded = pickle.loads(pickle.dumps(waitlist))
+        assert loaded.to_json() == [("b", 1)]
+        assert loaded.pop_for(1) == "b"
+
+    def test_push_front_and_take(self):
+        waitlist = Waitlist([("a", 0), ("b", None)])
+        waitlist.push_front("c", 0)
+
+        assert waitlist.to_json() == [("c", 0), ("a", 0), ("b", None)]
+        with pytest.raises(ValueError):
+            waitlist.take("a", 0)
+        waitlist.take("c", 0)
+        assert waitlist.pop_for(0) == "a"
+
+
+class TestTrainWaitlist:
+    def test_unbook_fills_seat(self, make_train):
+        train = make_train()
+        for seat in range(1, 5):
+            train.book_passenger(0, seat, f"p{seat}")
+        train.waitlist.add("waiting", 0)
+        train.waitlist.add("other car", 1)
+
+        assert train.unbook_seat(0, 2) == "waiting"
+        assert train.carriages[0].get_seat_num(2).passenger_name == "waiting"
+        assert train.unbook_passenger(0, "p3") is None
+        assert len(train.waitlist) == 1
+
+    def test_unbook_empty_seat_keeps_waitlist(self, make_train):
+        train = make_train()
+        train.waitlist.add("waiting", 0)
+
+        assert train.unbook_seat(0, 1) is None
+        assert not train.carriages[0].get_seat_num(1).is_booked()
+        assert len(train.waitlist) == 1
+
+    def test_saved(self, tmp_path, make_train):
+        train = make_train()
+        train.waitlist.add("a", 1)
+        train.waitlist.add("b")
+        train.serialize(str(tmp_path))
+
+        loaded = Train.from_file(str(tmp_path / "train_152"))
+        assert loaded.waitlist.to_json() == [("a", 1), ("b", None)]
+
+    def test_fleet_logs_one_operation(self, make_train):
+        fleet = Fleet([make_train()])
+        fleet.book(152, 0, 1, "leaving")
+        fleet.wait(152, "waiting", 0)
+
+        assert fleet.unbook_seat(152, 0, 1) == "waiting"
+        assert [b.name for b in fleet.bookings] == ["waiting"]
+
+        # Undone together, the seat goes back to the first passenger and the
+        # waiting passenger back first in the waitlist
+        fleet.wait(152, "later", 0)
+        fleet.undo()
+        train = fleet.get_train(152)
+        seat = train.carriages[0].get_seat_num(1)
+        assert seat.passenger_name == "leaving"
+        assert train.waitlist.to_json() == [("waiting", 0), ("later", 0)]
+        assert [b.name for b in fleet.bookings] == ["leaving"]
+
+        fleet.redo()
+        assert seat.passenger_name == "waiting"
+        assert train.waitlist.to_json() == [("later", 0)]
+        assert [b.name for b in fleet.bookings] == ["waiting"]
+
+    def test_undo_any_carriage(self, make_train):
+        fleet = Fleet([make_train()])
+        fleet.book(152, 1, 3, "leaving")
+        fleet.wait(152, "waiting")
+
+        fleet.unbook_seat(152, 1, 3)
+        fleet.undo()
+        assert fleet.get_train(152).waitlist.to_json() == [("waiting", None)]
+        fleet.redo()
+        assert len(fleet.get_train(152).waitlist) == 0
+
+    def test_unbook_leg(self, make_train):
+        train = make_train(stops=["sthlm", "norrk", "gbg"])
+        fleet = Fleet([train])
+        fleet.book_leg(152, 0, 1, "leg", "sthlm", "norrk")
+        fleet.wait(152, "waiting", 0)
+
+        assert fleet.unbook_leg(152, 0, 1, "sthlm") == "leg"
+        seat = train.carriages[0].get_seat_num(1)
+        assert seat.passenger_name == "waiting"
+        fleet.undo()
+        assert not seat.is_booked()
+        assert train.waitlist.to_json() == [("waiting", 0)]
+
+    def test_terminal(self, make_train):
+        term = Terminal([make_train()])
+        out = io.StringIO()
+        ok, failed = term.batch(
+            ["boka 152 2 1 a", "vänta 152 2 Jane Doe", "avboka 152 2 1"], out
+        )
+        assert (ok, failed) == (3, 0)
+        assert "går till Jane Doe från kön" in out.getvalue()
@@ -0,0 +1,86 @@
+import threading
+import time
+import pytest
+from biljettbokning.worker import Cancelled, Job, Worker
+
+
+class FakeWidget:
+    """Stands in for Tk, after() callbacks are run by run_until."""
+
+    def __init__(self):
+        self.pending = []
+
+    def after(self, _ms, callback):
+        self.pending.append(callback)
+
+    def run_until(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "timed out"
+            time.sleep(0.005)
+            pending, self.pending = self.pending, []
+            for callback in pending:
+                callback()
+
+
+class TestWorker:
+    def test_result_on_main_loop(self):
+        widget = FakeWidget()
+        worker = Worker(widget)
+        results = []
+        threads = []
+
+        def work(job: Job, n: int) -> int:
+            for i in range(n):
+                job.progress(i + 1, n)
+            return n * 2
+
+        def done(result):
+            threads.append(threading.current_thread())
+            results.append(result)
+
+        worker.submit(work, 3, on_done=done)
+        widget.run_until(lambda: results)
+        assert results == [6]
+        # Callbacks run in the thread polling, not in the worker
+        assert threads == [threading.current_thread()]
+        # Nothing left to poll
+        assert not widget.pending
+        worker.shutdown()
+
+    def test_cancel(self):
+        widget = FakeWidget()
+        worker = Worker(widget)
+        started = threading.Event()
+        errors = []
+        progress = []
+
+        def work(job: Job):
+            started.set()
+            while True:
+                job.progress(1, 2)
+                time.sleep(0.001)
+
+        job = worker.submit(
+            work, on_error=errors.append, on_progress=lambda j: progress.append(j.done)
+        )
+        started.wait()
+        widget.run_until(lambda: progress)
+        job.cancel()
+        widget.run_until(lambda: errors)
+        assert isinstance(errors[0], Cancelled)
+        worker.shutdown()
+
+    def test_error(self):
+        widget = FakeWidget()
+        worker = Worker(widget)
+        errors = []
+
+        def work(_job: Job):
+            raise OSError("disk full")
+
+        worker.submit(work, on_error=errors.append)
+        widget.run_until(lambda: errors)
+        with pytest.raises(OSError):
+            raise errors[0]
+        worker.shutdown()